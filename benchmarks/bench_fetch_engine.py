@@ -0,0 +1,85 @@
+"""スレッドプール版と asyncio 版の詳細取得をローカル代替サーバー上で比較する。
+
+    python benchmarks/bench_fetch_engine.py --people 500 --latency 0.1
+"""
+import argparse
+import concurrent.futures
+import os
+import sys
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from scraper import async_fetch  # noqa: E402
+from standin_server import start_server  # noqa: E402
+
+HEADERS = {'User-Agent': 'bench'}
+
+
+def review_url_for(profile_url):
+    shop, girl_id = profile_url.rsplit('girlid-', 1)
+    return f"{shop}reviews/?girlid={girl_id.strip('/')}"
+
+
+def resolve_review(profile_url):
+    return review_url_for(profile_url), None
+
+
+def build_details(profile_url, profile_body, review_body, review_count=None):
+    return (profile_body is not None, review_body is not None)
+
+
+def run_thread_pool(profile_urls, workers):
+    """ScrapeRun と同じ構成 (Session + Retry + ThreadPoolExecutor) で取得する。"""
+    def fetch_person(session, url):
+        res = session.get(url, timeout=30, headers=HEADERS)
+        if res.status_code != 200:
+            return build_details(url, None, None)
+        review = session.get(review_url_for(url), timeout=10, headers=HEADERS)
+        return build_details(url, res.content, review.content if review.status_code == 200 else None)
+
+    with requests.Session() as session:
+        adapter = HTTPAdapter(max_retries=Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504]))
+        session.mount("http://", adapter)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda url: fetch_person(session, url), profile_urls))
+
+
+def run_asyncio(profile_urls, concurrency, per_host):
+    engine = async_fetch.AsyncFetchEngine(HEADERS, max_concurrency=concurrency, per_host_limit=per_host)
+    return engine.fetch_details(profile_urls, resolve_review, build_details)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--people', type=int, default=300)
+    parser.add_argument('--latency', type=float, default=0.1, help='1レスポンスあたりの遅延 (秒)')
+    parser.add_argument('--workers', type=int, default=10, help='スレッドプールのワーカー数')
+    parser.add_argument('--concurrency', type=int, default=50, help='asyncio 版のグローバル同時接続数')
+    parser.add_argument('--per-host', type=int, default=50, help='asyncio 版のホスト単位同時接続数')
+    args = parser.parse_args()
+
+    if not async_fetch.is_available():
+        sys.exit("aiohttp がインストールされていません")
+
+    server, base_url = start_server(latency=args.latency)
+    profile_urls = [f"{base_url}shop{i % 20}/girlid-{i}/" for i in range(args.people)]
+    try:
+        for name, run in [("thread", lambda: run_thread_pool(profile_urls, args.workers)),
+                          ("asyncio", lambda: run_asyncio(profile_urls, args.concurrency, args.per_host))]:
+            started = time.perf_counter()
+            results = run()
+            elapsed = time.perf_counter() - started
+            ok = sum(1 for profile_ok, review_ok in results if profile_ok and review_ok)
+            print(f"{name:8s} {elapsed:7.2f}s  {args.people / elapsed:8.1f} 人/秒  成功 {ok}/{args.people}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""詳細ページの解析を、スレッドとプロセスプールでそれぞれ 1/2/4/8 並列にしたときの処理速度を比べる。
+
+    python benchmarks/bench_parse_processes.py [--pages 400] [--workers 1 2 4 8] [--parser lxml]
+
+保存済みのプロフィール/口コミページを get_girl_details で解析する (通信はしない)。
+スレッドは GIL で解析が直列になるので、並列数を増やしても速くならないのが普通。
+プロセスは CPU の数まで伸びる。どちらも結果が 1 スレッドで解析した場合と同じかを確かめる。
+"""
+import argparse
+import concurrent.futures
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from run_benchmarks import StubSession, read_fixture  # noqa: E402
+from scraper import parsing  # noqa: E402
+from scraper.core import _parse_pool  # noqa: E402
+from scraper.details import get_girl_details  # noqa: E402
+
+PROFILE_FIXTURES = ('profile_full.html', 'profile_long.html', 'profile_minimal.html', 'profile_no_today.html')
+
+
+def parse_all(sessions, pages, parser, workers, parse_pool=None):
+    def parse(i):
+        url = f'https://www.cityheaven.net/tokyo/A1/shop/girlid-{i}/'
+        return get_girl_details(url, sessions[i % len(sessions)], {}, parser=parser, parse_pool=parse_pool)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(parse, range(pages)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=400)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--parser', choices=parsing.available_backends(), default=parsing.default_backend())
+    args = parser.parse_args()
+
+    review = read_fixture('review_page.html')
+    sessions = [StubSession(read_fixture(name), review) for name in PROFILE_FIXTURES]
+    pages = args.pages
+    expected = parse_all(sessions, pages, args.parser, 1)
+
+    print(f"CPU: {os.cpu_count()} / parser: {args.parser} / {pages} pages")
+    print(f"{'mode':<10s} {'workers':>7s} {'seconds':>8s} {'pages/s':>8s} {'same':>5s}")
+    for workers in args.workers:
+        started = time.perf_counter()
+        result = parse_all(sessions, pages, args.parser, workers)
+        seconds = time.perf_counter() - started
+        print(f"{'threads':<10s} {workers:7d} {seconds:8.2f} {pages / seconds:8.0f} {'OK' if result == expected else 'NG':>5s}")
+
+        pool = _parse_pool(workers)
+        # プロセスの起動は計測に含めない
+        list(pool.map(int, range(workers * 2)))
+        started = time.perf_counter()
+        # I/O 側のスレッドは結果を待つだけなので、プロセス数の 4 倍用意する
+        result = parse_all(sessions, pages, args.parser, workers * 4, parse_pool=pool)
+        seconds = time.perf_counter() - started
+        pool.shutdown()
+        print(f"{'processes':<10s} {workers:7d} {seconds:8.2f} {pages / seconds:8.0f} {'OK' if result == expected else 'NG':>5s}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""HTML レポートのサイズと生成時間、ブラウザでの表示時間を計測する。
+
+    python benchmarks/bench_report.py [--sizes 1000 10000] [--repeat 3]
+
+ブラウザでの計測は playwright (と `playwright install chromium`) がある場合だけ行う。
+DataTables などは CDN から読むのでネットワークが必要。表示時間はページ読み込み開始から
+表の最初の行が描画されるまで。
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd  # noqa: E402
+
+from run_benchmarks import report_rows  # noqa: E402
+from scraper.report import generate_html_report  # noqa: E402
+
+try:
+    from playwright.sync_api import sync_playwright
+except ImportError:
+    sync_playwright = None
+
+
+def measure_generate(df, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        html = generate_html_report(df, 'bench')
+        samples.append(time.perf_counter() - started)
+    return html, statistics.median(samples)
+
+
+def measure_render(browser, html, repeat):
+    samples = []
+    for _ in range(repeat):
+        page = browser.new_page()
+        started = time.perf_counter()
+        page.set_content(html, wait_until='domcontentloaded')
+        page.wait_for_function("document.querySelector('#resultsTable tbody tr') !== null", timeout=120000)
+        samples.append(time.perf_counter() - started)
+        page.close()
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    reports = []
+    print(f"{'rows':>7s} {'size KB':>9s} {'generate ms':>12s}")
+    for size in args.sizes:
+        html, seconds = measure_generate(pd.DataFrame(report_rows(size)), args.repeat)
+        reports.append((size, html))
+        print(f"{size:7d} {len(html.encode('utf-8')) / 1024:9.0f} {seconds * 1000:12.1f}")
+
+    if sync_playwright is None:
+        print("playwright が未インストールのため、ブラウザでの表示時間は省略")
+        return
+    print(f"\n{'rows':>7s} {'render ms':>10s}")
+    with sync_playwright() as p:
+        browser = p.chromium.launch()
+        for size, html in reports:
+            print(f"{size:7d} {measure_render(browser, html, args.repeat) * 1000:10.0f}")
+        browser.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""取得結果の DataFrame のメモリ使用量を、そのままの DataFrame と build_result_frame で比べる。
+
+    python benchmarks/bench_result_frame.py [--size 10000] [--columns]
+
+メモリは ResultCache と同じ dataframe_nbytes で数える (リストの列は中の文字列も含む)。
+あわせて、どちらから作っても HTML レポートが同じになることを確かめる。
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd  # noqa: E402
+
+from run_benchmarks import report_rows  # noqa: E402
+from scraper.frame import build_result_frame  # noqa: E402
+from scraper.report import generate_html_report  # noqa: E402
+from scraper.result_cache import dataframe_nbytes  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=10000)
+    parser.add_argument('--columns', action='store_true', help='列ごとの内訳も表示する')
+    args = parser.parse_args()
+
+    rows = report_rows(args.size)
+    started = time.perf_counter()
+    plain = pd.DataFrame(rows)
+    plain_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    compact = build_result_frame(rows)
+    compact_seconds = time.perf_counter() - started
+
+    plain_bytes = pd.Series({column: dataframe_nbytes(plain[[column]]) for column in plain.columns})
+    compact_bytes = pd.Series({column: dataframe_nbytes(compact[[column]]) for column in compact.columns})
+    if args.columns:
+        print(f"{'column':<16s} {'dtype':>10s} {'before KB':>10s} {'after KB':>10s}")
+        for column in plain.columns:
+            print(f"{column:<16s} {str(compact[column].dtype):>10s} {plain_bytes[column] / 1024:10.0f} {compact_bytes[column] / 1024:10.0f}")
+        print()
+    print(f"{'rows':>7s} {'before MB':>10s} {'after MB':>9s} {'ratio':>6s} {'build ms (before/after)':>24s}")
+    print(f"{args.size:7d} {plain_bytes.sum() / 2**20:10.2f} {compact_bytes.sum() / 2**20:9.2f} {compact_bytes.sum() / plain_bytes.sum():6.0%}"
+          f" {plain_seconds * 1000:11.1f} / {compact_seconds * 1000:.1f}")
+    same = generate_html_report(plain, 'bench') == generate_html_report(compact, 'bench')
+    print(f"レポートの一致: {'OK' if same else 'NG'}")
+    if not same:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""詳細ページを逐次読み込みして途中でやめる場合と、全体を読む場合の通信量・ピークメモリを比べる。
+
+    python benchmarks/bench_streaming.py [--pages 20] [--per-page 50] [--padding 200000] [--engine asyncio] [--gzip] [--chunked]
+
+代替サーバー (standin_server.py) の プロフィール/口コミページに、解析に使わない部分を --padding バイト足して
+実サイトに近い大きさにする。--gzip を付けると実サイトと同じく圧縮して返し、--chunked を付けると
+Content-Length を付けずに返す。取得は設定ごとに別プロセスで行い (ピーク RSS を分けて測るため)、
+サーバーはこのプロセスで動かす。受け取ったバイト数、読まずに済んだバイト数、取得中の本文の合計の最大値、
+ピーク RSS (ru_maxrss) を表示し、結果の行が同じかを確かめる。
+"""
+import argparse
+import hashlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from scraper import parsing  # noqa: E402
+from scraper.streaming import DEFAULT_MEMORY_LIMIT  # noqa: E402
+
+
+def run_child(args):
+    from scraper.conditions import build_targets
+    from scraper.core import ScrapeRun
+    run = ScrapeRun(build_targets(['東京'], [()]), hide_inactive=False, fetch_engine=args.engine, parser=args.parser, base_url=args.base_url,
+                    stream_pages=args.stream, memory_limit=args.memory_limit)
+    started = time.perf_counter()
+    rows = sorted(run.rows(), key=lambda row: row['プロフィールリンク'])
+    seconds = time.perf_counter() - started
+    metrics = run.metrics.to_dict()
+    print(json.dumps({
+        'rows': len(rows),
+        'seconds': round(seconds, 2),
+        'bytes_downloaded': metrics['bytes_downloaded'],
+        'bytes_unread': (metrics['streaming'] or {}).get('bytes_unread', 0),
+        'peak_body_bytes': (metrics['memory'] or {}).get('peak_bytes'),
+        # Linux の ru_maxrss は KB
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'digest': hashlib.sha256(json.dumps(rows, ensure_ascii=False, default=str).encode('utf-8')).hexdigest(),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--per-page', type=int, default=50)
+    parser.add_argument('--padding', type=int, default=200_000)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--engine', choices=['thread', 'asyncio'], default='thread')
+    parser.add_argument('--parser', choices=parsing.available_backends(), default=parsing.default_backend())
+    parser.add_argument('--memory-limit', type=int, default=DEFAULT_MEMORY_LIMIT)
+    parser.add_argument('--gzip', action='store_true', help='本文を gzip で圧縮して返す')
+    parser.add_argument('--chunked', action='store_true', help='Content-Length を付けずに chunked で返す')
+    # 以下は子プロセス用
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--base-url', help=argparse.SUPPRESS)
+    parser.add_argument('--no-stream', dest='stream', action='store_false', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return run_child(args)
+
+    from standin_server import start_server
+    server, base_url = start_server(latency=args.latency, pages=args.pages, per_page=args.per_page, padding=args.padding,
+                                    gzip=args.gzip, chunked=args.chunked)
+    encoding = ' / '.join(name for name, enabled in (('gzip', args.gzip), ('chunked', args.chunked)) if enabled)
+    print(f"{args.pages}ページ × {args.per_page}人 / padding {args.padding:,} バイト{' / ' + encoding if encoding else ''} / engine {args.engine} / parser {args.parser}")
+    print(f"{'mode':<8s} {'rows':>5s} {'seconds':>8s} {'downloaded':>13s} {'unread':>13s} {'peak body':>11s} {'peak RSS':>9s}")
+    results = {}
+    try:
+        for mode, flags in (('full', ['--no-stream']), ('stream', [])):
+            command = [sys.executable, os.path.abspath(__file__), '--child', '--base-url', base_url, '--engine', args.engine,
+                       '--parser', args.parser, '--memory-limit', str(args.memory_limit), *flags]
+            result = results[mode] = json.loads(subprocess.run(command, check=True, capture_output=True, text=True).stdout)
+            print(f"{mode:<8s} {result['rows']:5d} {result['seconds']:8.2f} {result['bytes_downloaded']:13,d} {result['bytes_unread']:13,d} "
+                  f"{result['peak_body_bytes'] or 0:11,d} {result['peak_rss_mb']:7.1f}MB")
+    finally:
+        server.shutdown()
+    full, stream = results['full'], results['stream']
+    print(f"\n受信バイト数: {stream['bytes_downloaded'] / full['bytes_downloaded']:.1%}  "
+          f"ピーク RSS: {stream['peak_rss_mb'] - full['peak_rss_mb']:+.1f}MB  結果: {'同じ' if full['digest'] == stream['digest'] else '異なる'}")
+
+
+if __name__ == '__main__':
+    main()
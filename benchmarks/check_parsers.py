@@ -0,0 +1,88 @@
+"""保存済みのページで各解析エンジンの出力が golden.json と一致するかを確認し、解析時間を表示する。
+
+    python benchmarks/check_parsers.py [--repeat 20]
+
+不一致があれば終了コード 1 で終わる。golden.json は従来の html.parser による
+全体解析の出力で、本日の日付は golden.json の "today" に固定して比較する。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scraper import parsing  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        return f.read()
+
+
+def check_golden(parser, golden):
+    today = datetime.strptime(golden['today'], '%Y-%m-%d')
+    failures = []
+    for key, expected in golden['details'].items():
+        profile_name, review_name = key.split('|')
+        review = read_fixture(review_name) if review_name else None
+        actual = parsing.extract_girl_details('', read_fixture(profile_name), review, parser=parser, today=today)
+        if actual != expected:
+            failures.append((key, expected, actual))
+    for name, expected in golden['list_pages'].items():
+        actual = parsing.parse_list_page(read_fixture(name), golden['base_url'], parser=parser)._asdict()
+        if actual != expected:
+            failures.append((name, expected, actual))
+    for name, expected in golden['shop_review_counts'].items():
+        actual = parsing.parse_shop_review_counts(read_fixture(name), parser=parser)
+        if actual != expected:
+            failures.append((name, expected, actual))
+    return failures
+
+
+def time_parse(parser, repeat):
+    """ページ種別ごとの 1 ページあたり解析時間 (ミリ秒) を返す。"""
+    pages = {
+        'list': ('list_page.html', lambda c: parsing.parse_list_page(c, parsing.BASE_SITE_URL, parser=parser)),
+        'profile': ('profile_long.html', lambda c: parsing.extract_girl_details('', c, None, parser=parser)),
+        'review': ('review_page.html', lambda c: parsing.parse_review_count(c, parser=parser)),
+    }
+    timings = {}
+    for kind, (name, parse) in pages.items():
+        content = read_fixture(name)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            parse(content)
+        timings[kind] = (time.perf_counter() - started) / repeat * 1000
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with open(os.path.join(FIXTURES, 'golden.json'), encoding='utf-8') as f:
+        golden = json.load(f)
+
+    ok = True
+    print(f"{'parser':12s} {'golden':>7s} {'list ms':>9s} {'profile ms':>11s} {'review ms':>10s}")
+    for backend in parsing.available_backends():
+        failures = check_golden(backend, golden)
+        timings = time_parse(backend, args.repeat)
+        print(f"{backend:12s} {'OK' if not failures else 'NG':>7s} {timings['list']:9.2f} {timings['profile']:11.2f} {timings['review']:10.2f}")
+        for key, expected, actual in failures:
+            ok = False
+            print(f"  {key}:\n    expected {expected}\n    actual   {actual}")
+    skipped = [backend for backend in parsing.PARSER_BACKENDS if backend not in parsing.available_backends()]
+    if skipped:
+        print(f"未インストールのため省略: {', '.join(skipped)}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
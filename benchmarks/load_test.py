@@ -0,0 +1,89 @@
+"""ローカル代替サーバーに対してスクレイピング全体を実行する負荷試験。
+
+    python benchmarks/load_test.py --pages 100 --per-page 50 --latency 0.05 --jitter 0.05 --throttle-rate 0.02
+    python benchmarks/load_test.py --engine asyncio --output new.json --compare old.json
+
+一覧・詳細・口コミの取得から解析までを ScrapeRun (base_url を代替サーバーに向ける) で行い、
+行数/秒、リクエストの応答時間 (p50/p95)、リトライと 429 の回数、代替サーバーが返した障害の数を表示する。
+--compare を付けると前回結果との比率を表示し、--fail-below を下回ったら終了コード 1 を返す
+(スループットの回帰検知に使う)。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from scraper import parsing  # noqa: E402
+from scraper.conditions import build_targets  # noqa: E402
+from scraper.core import MAX_CONCURRENCY, ScrapeRun  # noqa: E402
+from standin_server import add_server_arguments, server_options, start_server  # noqa: E402
+
+
+def run_load_test(args):
+    server, base_url = start_server(**server_options(args))
+    run = ScrapeRun(build_targets(['東京'], [()]), hide_inactive=False, fetch_engine=args.engine, parser=args.parser,
+                    max_concurrency=args.max_concurrency, parse_processes=args.parse_processes, base_url=base_url)
+    try:
+        started = time.perf_counter()
+        rows = sum(1 for _ in run.rows())
+        seconds = time.perf_counter() - started
+    finally:
+        server.shutdown()
+    metrics = run.metrics.to_dict()
+    return {
+        'rows': rows,
+        'seconds': round(seconds, 3),
+        'rows_per_sec': round(rows / seconds, 1),
+        'requests': metrics['requests'],
+        'latency_p50_ms': metrics['request_latency']['p50_ms'],
+        'latency_p95_ms': metrics['request_latency']['p95_ms'],
+        'retries': metrics['retries'],
+        'http_429': metrics['http_429'],
+        'concurrency': metrics['concurrency'],
+        'connections': metrics['connections'],
+        'server': server.stats,
+        'settings': {**server_options(args), 'engine': args.engine, 'parser': args.parser, 'max_concurrency': args.max_concurrency, 'parse_processes': args.parse_processes},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_server_arguments(parser)
+    parser.add_argument('--engine', choices=['thread', 'asyncio'], default='thread')
+    parser.add_argument('--parser', choices=parsing.available_backends(), default=parsing.default_backend())
+    parser.add_argument('--max-concurrency', type=int, default=MAX_CONCURRENCY)
+    parser.add_argument('--parse-processes', type=int, default=0)
+    parser.add_argument('--output', help='結果を書き出す JSON ファイル')
+    parser.add_argument('--compare', help='比較対象の過去の結果 JSON')
+    parser.add_argument('--fail-below', type=float, metavar='RATIO', help='行数/秒が比較対象のこの比率を下回ったら失敗にする (例: 0.8)')
+    args = parser.parse_args()
+
+    result = run_load_test(args)
+    concurrency = result['concurrency'] or {}
+    print(f"{result['rows']}行 / {result['seconds']:.2f}秒 = {result['rows_per_sec']:.1f} 行/秒")
+    print(f"リクエスト {result['requests']}件  p50 {result['latency_p50_ms']}ms  p95 {result['latency_p95_ms']}ms")
+    print(f"リトライ {result['retries']}回  429 {result['http_429']}件  同時接続 最大{concurrency.get('peak')}・終了時{concurrency.get('limit')} ({concurrency.get('decreases')}回減少)")
+    if result['connections']:
+        print(f"接続: 新規 {result['connections']['new_connections']}  再利用 {result['connections']['reused_connections']}")
+    print(f"代替サーバー: {result['server']}")
+
+    failed = False
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        ratio = result['rows_per_sec'] / baseline['rows_per_sec']
+        print(f"\n比較対象: {args.compare} ({baseline['rows_per_sec']:.1f} 行/秒) に対して {ratio:.2f} 倍")
+        failed = args.fail_below is not None and ratio < args.fail_below
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if failed:
+        sys.exit(f"行数/秒が比較対象の {args.fail_below:.0%} を下回りました")
+
+
+if __name__ == '__main__':
+    main()
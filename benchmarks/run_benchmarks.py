@@ -0,0 +1,136 @@
+"""保存済みページを使ったオフラインのマイクロベンチマーク。
+
+    python benchmarks/run_benchmarks.py --output bench.json
+    python benchmarks/run_benchmarks.py --output new.json --compare bench.json
+
+結果は JSON (ベンチマーク名ごとの min/median/mean 秒) で書き出すので、
+コミット間で比較できる。--compare を付けると前回結果との比率も表示する。
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+
+from scraper import parsing  # noqa: E402
+from scraper.details import get_girl_details  # noqa: E402
+from scraper.report import generate_html_report  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+REPORT_SIZES = (100, 1000, 10000)
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        return f.read()
+
+
+class StubResponse:
+    def __init__(self, content):
+        self.status_code = 200
+        self.content = content
+
+
+class StubSession:
+    """URL の種類に応じて保存済みページを返す requests.Session の代わり。"""
+
+    def __init__(self, profile, review):
+        self.profile = StubResponse(profile)
+        self.review = StubResponse(review)
+
+    def get(self, url, **kwargs):
+        return self.review if 'reviews/' in url else self.profile
+
+
+def measure(func, repeat, number=1):
+    """func を number 回呼ぶ時間を repeat 回計測し、1 回あたりの秒数の統計を返す。"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - started) / number)
+    return {'min': min(samples), 'median': statistics.median(samples), 'mean': statistics.mean(samples), 'repeat': repeat, 'number': number}
+
+
+def report_rows(size):
+    """一覧と詳細の fixture 出力を組み合わせて size 行のデータを作る。"""
+    list_rows = parsing.parse_list_page(read_fixture('list_page.html'), parsing.BASE_SITE_URL).rows
+    details = [parsing.extract_girl_details('', read_fixture(name), read_fixture('review_page.html'))
+               for name in ('profile_full.html', 'profile_long.html', 'profile_minimal.html', 'profile_no_today.html')]
+    return [{**list_rows[i % len(list_rows)], **details[i % len(details)]} for i in range(size)]
+
+
+def benchmarks(parser, repeat):
+    list_content = read_fixture('list_page.html')
+    profile_session = StubSession(read_fixture('profile_long.html'), read_fixture('review_page.html'))
+    profile_url = 'https://www.cityheaven.net/tokyo/A1/shop/girlid-1/'
+    style_texts = ['T155･83(C)･56･84', 'T---', '', 'T149 ･ 80(B)･55･82'] * 250
+    age_texts = ['(21歳)', '', '年齢非公開'] * 333
+    time_texts = ['次回 18:00～', '待機中', '-', '10:30～翌05:00'] * 250
+
+    yield f'get_girl_details[{parser}]', {}, lambda: measure(lambda: get_girl_details(profile_url, profile_session, {}, parser=parser), repeat)
+    yield f'parse_list_page[{parser}]', {}, lambda: measure(lambda: parsing.parse_list_page(list_content, parsing.BASE_SITE_URL, parser=parser), repeat)
+    yield 'parse_style', {'calls': len(style_texts)}, lambda: measure(lambda: [parsing.parse_style(t) for t in style_texts], repeat)
+    yield 'parse_age', {'calls': len(age_texts)}, lambda: measure(lambda: [parsing.parse_age(t) for t in age_texts], repeat)
+    yield 'parse_sortable_time', {'calls': len(time_texts)}, lambda: measure(lambda: [parsing.parse_sortable_time(t) for t in time_texts], repeat)
+    for size in REPORT_SIZES:
+        def run_report(size=size):
+            df = pd.DataFrame(report_rows(size))
+            return measure(lambda: generate_html_report(df, 'bench'), max(3, repeat // 10))
+        yield f'generate_html_report[{size}]', {'rows': size}, run_report
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help='結果を書き出す JSON ファイル')
+    parser.add_argument('--compare', help='比較対象の過去の結果 JSON')
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--parser', action='append', help='計測する HTML パーサー (複数指定可。既定は利用可能な全て)')
+    parser.add_argument('--filter', help='名前にこの文字列を含むベンチマークだけを実行する')
+    args = parser.parse_args()
+
+    results = {}
+    seen = set()
+    for backend in args.parser or parsing.available_backends():
+        for name, params, run in benchmarks(backend, args.repeat):
+            if name in seen or (args.filter and args.filter not in name):
+                continue
+            seen.add(name)
+            results[name] = {**params, **run()}
+            print(f"{name:36s} median {results[name]['median'] * 1000:10.3f} ms", flush=True)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        print(f"\n比較対象: {args.compare}")
+        for name, result in results.items():
+            if name in baseline:
+                ratio = result['median'] / baseline[name]['median']
+                print(f"{name:36s} {ratio:6.2f}x")
+
+    if args.output:
+        document = {'created_at': datetime.now().isoformat(timespec='seconds'), 'commit': git_commit(),
+                    'python': platform.python_version(), 'results': results}
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(document, f, ensure_ascii=False, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+"""ベンチマーク・負荷試験用のローカル代替サーバー。
+
+実サイトと同じマークアップ構造の一覧ページ、プロフィールページ、口コミページを返す。
+規模 (pages × per_page 人) は自由に変えられ、次の障害を模擬できる。
+
+- latency / jitter: レスポンスごとに latency + [0, jitter) 秒待つ
+- throttle_rate / error_rate: その割合のリクエストに 429 / 5xx (500/502/503) を返す
+- trickle: 本文を少しずつ (合計 trickle 秒かけて) 送る
+- padding: プロフィール/口コミページの解析に使う部分の後ろに、約 padding バイトの
+  関係ない要素 (口コミ本文やおすすめの一覧など、実サイトのページの大半を占める部分) を付ける
+- gzip: Accept-Encoding に gzip があれば本文を gzip で圧縮して返す (Content-Length は圧縮後の長さ)
+- chunked: Content-Length を付けずに Transfer-Encoding: chunked で返す
+- fail_pattern: パスがこの正規表現に一致するリクエストには常に 500 を返す (特定のページだけの障害)
+
+単体でも起動できるので、CLI から代替サーバーに向けて取得できる。
+
+    python benchmarks/standin_server.py --port 8000 --pages 100 --per-page 50 --latency 0.05 --throttle-rate 0.02
+    python -m scraper -p 東京 --base-url http://127.0.0.1:8000/ > /dev/null
+"""
+import argparse
+import gzip
+import hashlib
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ERROR_STATUS_CODES = (500, 502, 503)
+TRICKLE_CHUNKS = 8
+
+
+def filler(nbytes):
+    """解析に使わない要素を約 nbytes バイト分。
+
+    同じ文字列の繰り返しだと gzip で極端に縮むので、要素ごとに ID を変えて実際のページ程度の圧縮率にする。
+    """
+    items, size = [], 0
+    while size < nbytes:
+        review_id = hashlib.md5(str(len(items)).encode()).hexdigest()
+        item = (f'<div class="review-item" data-review="{review_id}"><p class="review-body">とても丁寧な接客でした。また指名したいと思います。</p>'
+                f'<ul class="tags"><li>癒し系</li><li>スレンダー</li></ul><a href="/reviews/{review_id}/">続きを読む</a></div>')
+        items.append(item)
+        size += len(item.encode('utf-8'))
+    return ''.join(items)
+
+
+def profile_page(girl_id, padding=0):
+    shifts = ['10:00<br>18:00', '12:00<br>22:00', '20:00<br>05:00', 'お休み']
+    schedule = ''.join(f'<li><dt>1/{day}(月)</dt><dd>{shifts[(girl_id + day) % len(shifts)]}</dd></li>' for day in range(1, 8))
+    slider = ''.join(f'<li data-thumb="//img.example.com/girls/{girl_id}/{n}.jpg?cache={n}"></li>' for n in range(4))
+    diary = ''.join(f'<div class="thm"><img src="/diary/{girl_id}/{n}.jpg"></div>' for n in range(4))
+    return (f'<html><body><ul id="girl_sukkin">{schedule}</ul>'
+            f'<table><tr><td class="shukkin-sugunavitext">次回 18:00～</td></tr></table>'
+            f'<img class="yoyaku_girlmark" src="/img/yoyaku_{21 + girl_id % 3}.png">'
+            f'<ul id="slider">{slider}</ul><div id="girlprofile_diary">{diary}</div>{filler(padding)}</body></html>')
+
+
+def list_page(page, pages, per_page):
+    """一覧ページ。girl_id は (page - 1) * per_page から連番で振る。"""
+    items = []
+    for n in range(per_page):
+        girl_id = (page - 1) * per_page + n
+        shop = f"shop{girl_id % 20}"
+        status = '<span class="soku">待機中</span>' if girl_id % 3 == 0 else (f'<span class="soku">{12 + girl_id % 10}:00～</span>' if girl_id % 3 == 1 else '')
+        items.append(f'<li class="girls-list"><div class="maingirl"><a class="shopimg" href="/tokyo/A1/{shop}/girlid-{girl_id}/"></a>'
+                     f'<p class="girlname"><a>girl{girl_id}</a><span>({18 + girl_id % 15}歳)</span></p>{status}'
+                     f'<p class="girlstyle">T{150 + girl_id % 20}･{80 + girl_id % 10}({"ABCDEFG"[girl_id % 7]})･{52 + girl_id % 10}･{82 + girl_id % 8}</p>'
+                     f'<p class="shopname"><a>{shop}</a></p></div></li>')
+    nav = ''.join(f'<a href="{n}/">{n}</a>' for n in range(1, pages + 1))
+    return f'<html><body><ul>{"".join(items)}</ul><div class="shop_nav_list">{nav}</div></body></html>'
+
+
+def review_count(girl_id):
+    return girl_id % 40
+
+
+def review_page(girl_id, padding=0):
+    return f'<html><body><div class="review-total">口コミ {review_count(girl_id)}件</div>{filler(padding)}</body></html>'
+
+
+def shop_review_page(shop, total_girls):
+    """店舗の口コミ一覧。口コミのあるキャストだけを絞り込みの選択肢に並べる。"""
+    options = ''.join(f'<option value="reviews/?girlid={girl_id}">girl{girl_id} ({review_count(girl_id)}件)</option>'
+                      for girl_id in range(shop, total_girls, 20) if review_count(girl_id))
+    return f'<html><body><select name="girl"><option value="">全員</option>{options}</select></body></html>'
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+    jitter = 0.0
+    pages = 5
+    per_page = 20
+    throttle_rate = 0.0
+    error_rate = 0.0
+    retry_after = None
+    trickle = 0.0
+    padding = 0
+    gzip = False
+    chunked = False
+    fail_pattern = None
+    rng = random.Random(0)
+    stats = None
+
+    def _count(self, key):
+        with self.stats['lock']:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def _roll(self):
+        with self.stats['lock']:
+            return self.rng.random(), self.rng.random()
+
+    def do_GET(self):
+        # 同時に処理中のリクエスト数 (本文の送信中も含む) の最大値を数える
+        with self.stats['lock']:
+            self.stats['_in_flight'] = in_flight = self.stats.get('_in_flight', 0) + 1
+            self.stats['peak_in_flight'] = max(self.stats.get('peak_in_flight', 0), in_flight)
+        try:
+            self._respond()
+        finally:
+            with self.stats['lock']:
+                self.stats['_in_flight'] -= 1
+
+    def _respond(self):
+        self._count('requests')
+        fault, jitter = self._roll()
+        time.sleep(self.latency + self.jitter * jitter)
+        if self.fail_pattern and re.search(self.fail_pattern, self.path):
+            self._count('5xx')
+            self._send_error_status(500)
+            return
+        if fault < self.throttle_rate:
+            self._count('429')
+            self._send_error_status(429)
+            return
+        if fault < self.throttle_rate + self.error_rate:
+            self._count('5xx')
+            self._send_error_status(ERROR_STATUS_CODES[int(jitter * len(ERROR_STATUS_CODES))])
+            return
+        if match := re.search(r'reviews/\?girlid=(\d+)', self.path):
+            body = review_page(int(match.group(1)), self.padding)
+        elif match := re.search(r'shop(\d+)/reviews/$', self.path):
+            body = shop_review_page(int(match.group(1)), self.pages * self.per_page)
+        elif match := re.search(r'girlid-(\d+)', self.path):
+            body = profile_page(int(match.group(1)), self.padding)
+        elif match := re.search(r'girl-list/(?:typ[\w-]+/)?(?:(\d+)/)?$', self.path):
+            page = int(match.group(1) or 1)
+            body = list_page(page, self.pages, self.per_page) if page <= self.pages else '<html><body></body></html>'
+        else:
+            self.send_error(404); return
+        data = body.encode('utf-8')
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        if self.gzip and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            data = gzip.compress(data, mtime=0)
+            self.send_header('Content-Encoding', 'gzip')
+        if self.chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        chunk_size = max(-(-len(data) // TRICKLE_CHUNKS) if self.trickle else len(data), 1)
+        for start in range(0, len(data), chunk_size):
+            if start:
+                time.sleep(self.trickle / TRICKLE_CHUNKS)
+            self._write(data[start:start + chunk_size])
+        if self.chunked:
+            self.wfile.write(b'0\r\n\r\n')
+
+    def _write(self, data):
+        if self.chunked:
+            data = b'%x\r\n%s\r\n' % (len(data), data)
+        self.wfile.write(data)
+        self.wfile.flush()
+
+    def _send_error_status(self, status):
+        self.send_response(status)
+        if status == 429 and self.retry_after is not None:
+            self.send_header('Retry-After', str(self.retry_after))
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # 本文を途中まで読んで接続を閉じるクライアントがいるので、切断は記録しない
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    @property
+    def stats(self):
+        """リクエスト数、返した 429 / 5xx の件数、同時に処理したリクエスト数の最大値 (peak_in_flight)。
+
+        peak_in_flight はサーバー側から見た値なので、クライアントが本文の途中で接続を閉じても
+        次に書き込んで失敗するまでは処理中に数える。
+        """
+        stats = self.RequestHandlerClass.stats
+        with stats['lock']:
+            return {key: value for key, value in stats.items() if key != 'lock' and not key.startswith('_')}
+
+
+def start_server(latency=0.05, pages=5, per_page=20, port=0, jitter=0.0, throttle_rate=0.0, error_rate=0.0, retry_after=None, trickle=0.0, padding=0, gzip=False, chunked=False, fail_pattern=None, seed=0):
+    """別スレッドでサーバーを起動し、(server, base_url) を返す。"""
+    handler = type('Handler', (StandinHandler,), {
+        'latency': latency, 'pages': pages, 'per_page': per_page, 'jitter': jitter, 'throttle_rate': throttle_rate, 'error_rate': error_rate,
+        'retry_after': retry_after, 'trickle': trickle, 'padding': padding, 'gzip': gzip, 'chunked': chunked, 'fail_pattern': fail_pattern, 'rng': random.Random(seed), 'stats': {'lock': threading.Lock()},
+    })
+    server = StandinServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def add_server_arguments(parser):
+    """start_server の設定をコマンドライン引数として追加する (load_test.py と共用)。"""
+    parser.add_argument('--pages', type=int, default=5, help='一覧のページ数')
+    parser.add_argument('--per-page', type=int, default=20, help='1 ページあたりの人数')
+    parser.add_argument('--latency', type=float, default=0.05, help='1 レスポンスあたりの遅延 (秒)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='遅延に加える [0, jitter) 秒のばらつき')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='429 を返す割合')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='5xx を返す割合')
+    parser.add_argument('--retry-after', type=int, help='429 に付ける Retry-After (秒)')
+    parser.add_argument('--trickle', type=float, default=0.0, help='本文を送り終えるまでにかける秒数')
+    parser.add_argument('--padding', type=int, default=0, help='プロフィール/口コミページに足す解析に使わない部分のバイト数')
+    parser.add_argument('--gzip', action='store_true', help='Accept-Encoding に gzip があれば圧縮して返す')
+    parser.add_argument('--chunked', action='store_true', help='Content-Length を付けずに chunked で返す')
+    parser.add_argument('--fail-pattern', help='パスがこの正規表現に一致するリクエストには常に 500 を返す')
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def server_options(args):
+    return {'latency': args.latency, 'pages': args.pages, 'per_page': args.per_page, 'jitter': args.jitter, 'throttle_rate': args.throttle_rate,
+            'error_rate': args.error_rate, 'retry_after': args.retry_after, 'trickle': args.trickle, 'padding': args.padding, 'gzip': args.gzip, 'chunked': args.chunked, 'fail_pattern': args.fail_pattern, 'seed': args.seed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8000)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    server, base_url = start_server(port=args.port, **server_options(args))
+    print(f"{base_url} で待ち受け中 ({args.pages}ページ × {args.per_page}人)。Ctrl+C で終了")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(server.stats)
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
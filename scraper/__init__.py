@@ -0,0 +1 @@
+"""CityHeaven Scraper の補助モジュール群。"""
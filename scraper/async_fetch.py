@@ -0,0 +1,192 @@
+"""asyncio ベースの詳細ページ取得エンジン。
+
+スレッドプール版 (requests.Session + Retry) と同じリトライ方針で、
+グローバル/ホスト単位の同時接続数を制限しながら多数のページを並行取得する。
+aiohttp が無い環境では is_available() が False を返す。
+"""
+import asyncio
+import contextlib
+import time
+
+from scraper.http_client import DNS_TTL_SECONDS
+from scraper.metrics import timed
+from scraper.parsing import PROFILE_SECTIONS, REVIEW_SECTIONS
+from scraper.streaming import read_body_async, wire_bytes_async
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp は任意依存
+    aiohttp = None
+
+# requests 側の Retry(total=3, backoff_factor=1, status_forcelist=[...]) と揃える
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+RETRY_AFTER_STATUS_CODES = (413, 429, 503)
+
+
+def is_available():
+    return aiohttp is not None
+
+
+def backoff_seconds(retry_number, backoff_factor, retry_after=None):
+    """urllib3 の Retry と同じ待ち時間 (1回目は即時、以降 factor * 2^(n-1)) を返す。"""
+    if retry_after is not None:
+        try: return max(0.0, float(retry_after))
+        except ValueError: pass
+    if retry_number <= 1: return 0.0
+    return min(120.0, backoff_factor * (2 ** (retry_number - 1)))
+
+
+class AsyncFetchEngine:
+    """aiohttp で多数の URL を並行取得する。接続数の上限は TCPConnector に任せる。
+
+    limiter (concurrency.AdaptiveLimiter) を渡すと、各リクエストをその枠の中で送る。
+    build_details がブロックする (解析をプロセスプールで行う) ときは blocking_build=True にすると、スレッドで呼ぶ。
+    stream=True ならプロフィール/口コミページは解析に使う部分まで読んだところで取得をやめる
+    (途中までの本文をキャッシュしないように、cache があるときは全体を読む)。
+    memory_budget (streaming.MemoryBudget) を渡すと、1 人分の予約を build_details が終わるまで持つ。
+    """
+
+    def __init__(self, headers, max_concurrency=30, per_host_limit=10, retries=3, backoff_factor=1, cache=None, metrics=None, limiter=None, blocking_build=False, stream=False, memory_budget=None):
+        if not is_available():
+            raise RuntimeError("aiohttp がインストールされていません")
+        self.headers = headers
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.cache = cache
+        self.metrics = metrics
+        self.limiter = limiter
+        self.blocking_build = blocking_build
+        self.stream = stream and cache is None
+        self.memory_budget = memory_budget
+
+    async def fetch(self, session, url, timeout=30, sections=None, hold=None):
+        """1 URL を取得する。リトライを使い切った場合や通信エラー時は status=None。
+
+        stream なら sections が揃ったところで読むのをやめる。hold (BudgetHold) があれば送る前に本文の分を予約する。
+        """
+        entry = self.cache.lookup(url) if self.cache else None
+        if entry and entry.is_fresh(self.cache.ttl_for(url)):
+            self.cache.stats.record('hits', saved=len(entry.body))
+            return entry.status, entry.body
+        request_headers = entry.conditional_headers() if entry else {}
+        reserved = await hold.admit_async() if hold else 0
+        status, body = await self._fetch_with_retries(session, url, timeout, request_headers, entry, sections if self.stream else None)
+        if hold: hold.settle(reserved, len(body))
+        return status, body
+
+    async def _fetch_with_retries(self, session, url, timeout, request_headers, entry, sections):
+        status, body = None, b''
+        for attempt in range(self.retries + 1):
+            retry_after, response_headers = None, {}
+            if self.limiter:
+                await self.limiter.acquire_async()
+            started = time.perf_counter()
+            status, body, nbytes = None, b'', 0
+            try:
+                async with session.get(url, headers=request_headers, timeout=aiohttp.ClientTimeout(total=timeout)) as res:
+                    status, response_headers = res.status, res.headers
+                    if sections is not None and status == 200:
+                        # 逐次読み込みした本文の通信量は read_body_async が数える
+                        body = await read_body_async(res, sections, self.metrics)
+                    else:
+                        body = await res.read()
+                        nbytes = wire_bytes_async(res, len(body))
+                    if status in RETRY_AFTER_STATUS_CODES:
+                        retry_after = res.headers.get('Retry-After')
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                status, body = None, b''
+            finally:
+                if self.limiter:
+                    self.limiter.release(time.perf_counter() - started, [status])
+            if self.metrics and status is not None:
+                self.metrics.record_response(url, time.perf_counter() - started, nbytes, status)
+            if status == 304 and entry:
+                self.cache.refresh(url)
+                self.cache.stats.record('revalidated', saved=len(entry.body))
+                return entry.status, entry.body
+            if status is not None and status not in RETRY_STATUS_CODES:
+                if self.cache and self.cache.ttl_for(url):
+                    self.cache.stats.record('misses')
+                    self.cache.store(url, status, response_headers, body)
+                return status, body
+            if attempt == self.retries:
+                break
+            if self.metrics:
+                self.metrics.record_retry()
+            await asyncio.sleep(backoff_seconds(attempt + 1, self.backoff_factor, retry_after))
+        return None, b''
+
+    def _new_session(self):
+        # aiohttp のセッションはイベントループごとなので実行をまたいで共有できない。名前解決のキャッシュだけ揃える
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, limit_per_host=self.per_host_limit, ttl_dns_cache=DNS_TTL_SECONDS)
+        return aiohttp.ClientSession(connector=connector, headers=self.headers)
+
+    async def _build(self, build_details, *args):
+        if self.blocking_build:
+            return await asyncio.get_running_loop().run_in_executor(None, build_details, *args)
+        return build_details(*args)
+
+    async def _fetch_one_person(self, session, profile_url, resolve_review, build_details):
+        if not profile_url:
+            return build_details(profile_url, None, None, None)
+        with (self.memory_budget.hold() if self.memory_budget else contextlib.nullcontext()) as hold:
+            status, profile_body = await self.fetch(session, profile_url, timeout=30, sections=PROFILE_SECTIONS.sections, hold=hold)
+            if status != 200:
+                return build_details(profile_url, None, None, None)
+            review_body = None
+            # resolve_review は口コミ数の解決で通信することがあるのでスレッドで呼ぶ
+            review_url, review_count = await asyncio.get_running_loop().run_in_executor(None, resolve_review, profile_url)
+            if review_url:
+                review_status, body = await self.fetch(session, review_url, timeout=10, sections=REVIEW_SECTIONS.sections, hold=hold)
+                if review_status == 200:
+                    review_body = body
+            return await self._build(build_details, profile_url, profile_body, review_body, review_count)
+
+    async def _run_stream(self, next_item, emit, profile_url_of, resolve_review, build_details):
+        loop = asyncio.get_running_loop()
+        feed = asyncio.Queue(maxsize=self.max_concurrency)
+        async with self._new_session() as session:
+            async def feeder():
+                # next_item はブロックするのでスレッドで待つ
+                while (item := await loop.run_in_executor(None, next_item)) is not None:
+                    await feed.put(item)
+                for _ in range(self.max_concurrency):
+                    await feed.put(None)
+
+            async def worker():
+                while (item := await feed.get()) is not None:
+                    try:
+                        with timed(self.metrics, 'detail_worker'):
+                            details = await self._fetch_one_person(session, profile_url_of(item), resolve_review, build_details)
+                    except Exception:
+                        details = None
+                    emit(item, details)
+
+            await asyncio.gather(feeder(), *(worker() for _ in range(self.max_concurrency)))
+
+    def run_stream(self, next_item, emit, profile_url_of, resolve_review, build_details):
+        """next_item() が None を返すまで項目を受け取り、詳細を取得して emit(item, details) を呼ぶ。
+
+        resolve_review(profile_url) はプロフィール取得後に 1 人 1 回だけ呼ばれ、(口コミページの URL, 口コミ数) を返す
+        (口コミ数が分かっていれば URL は None、取得しないなら両方 None)。
+        build_details(profile_url, profile_body, review_body, review_count) はプロフィール取得失敗時に
+        profile_body=None で呼ばれる。
+        """
+        asyncio.run(self._run_stream(next_item, emit, profile_url_of, resolve_review, build_details))
+
+    def fetch_details(self, profile_urls, resolve_review, build_details, on_done=None):
+        """各プロフィール URL の詳細を取得し、build_details の結果を入力順で返す。
+
+        on_done(index, details) は完了順に呼ばれる。
+        """
+        results = [None] * len(profile_urls)
+        items = iter(enumerate(profile_urls))
+
+        def emit(item, details):
+            results[item[0]] = details
+            if on_done: on_done(item[0], details)
+
+        self.run_stream(lambda: next(items, None), emit, lambda item: item[1], resolve_review, build_details)
+        return results
@@ -0,0 +1,40 @@
+"""複数の都道府県・絞り込み条件をまとめて 1 回で取得するための補助。
+
+各対象の一覧ページは round_robin で順番に取り出して詳細取得へ流すので、
+どれか 1 つの対象だけが先に進むことはない。同時実行数とレート制限は
+呼び出し側が全対象で共有する。
+"""
+from collections import deque
+
+
+def round_robin(iterables):
+    """(key, iterable) の組から順番に 1 つずつ取り出して (key, item) を返す。尽きたものは外す。"""
+    active = deque((key, iter(iterable)) for key, iterable in iterables)
+    while active:
+        key, iterator = active.popleft()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            continue
+        yield key, item
+        active.append((key, iterator))
+
+
+class TargetProgress:
+    """対象 (都道府県 × 絞り込み条件) ごとの進捗。"""
+
+    def __init__(self, label, prefecture_name, pages_total):
+        self.label = label
+        self.prefecture_name = prefecture_name
+        self.pages_total = pages_total
+        self.pages_done = 0
+        self.rows_found = 0
+        self.rows_done = 0
+        self.failed = False
+
+    def summary(self):
+        if self.failed:
+            # 途中のページで失敗したときは、それまでに取得した分は続けて処理する
+            done = f" (一覧 {self.pages_done}/{self.pages_total} まで 詳細 {self.rows_done}/{self.rows_found})" if self.pages_done else ""
+            return f"{self.label}: 一覧取得失敗{done}"
+        return f"{self.label}: 一覧 {self.pages_done}/{self.pages_total} 詳細 {self.rows_done}/{self.rows_found}"
@@ -0,0 +1,112 @@
+"""コマンドラインからのスクレイピング。取得し終えた行から順に NDJSON / CSV で書き出す。
+
+    python -m scraper --prefecture 東京 --prefecture 大阪 --pages 2 > tokyo_osaka.ndjson
+    python -m scraper -p 東京 --features 18～19歳,20～24歳 --features ニューフェイス --format csv -o out.csv
+
+--features は 1 回につき 1 つの絞り込み条件 (カンマ区切りの特徴名)。複数指定すると
+都道府県 × 条件の全組み合わせを取得する。進捗は標準エラーに出す。
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+
+from scraper import parsing
+from scraper.conditions import ALL_TYPS, PREFECTURES, build_targets
+from scraper.core import BASE_URL, MAX_CONCURRENCY, ScrapeRun
+from scraper.streaming import DEFAULT_MEMORY_LIMIT
+
+# 進捗表示を更新する最短間隔 (秒)
+PROGRESS_INTERVAL = 1.0
+
+
+def prefecture_name(value):
+    """都道府県名 (東京) とローマ字 (tokyo) のどちらでも受け付ける。"""
+    if value in PREFECTURES:
+        return value
+    for name, path in PREFECTURES.items():
+        if path == value:
+            return name
+    raise argparse.ArgumentTypeError(f"不明な都道府県です: {value}")
+
+
+def feature_set(value):
+    names = tuple(name.strip() for name in value.split(',') if name.strip())
+    unknown = [name for name in names if name not in ALL_TYPS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"不明な特徴です: {', '.join(unknown)} (指定できるもの: {', '.join(ALL_TYPS)})")
+    return names
+
+
+def write_ndjson(rows, out):
+    for row in rows:
+        out.write(json.dumps(row, ensure_ascii=False, default=str) + '\n')
+        out.flush()
+
+
+def write_csv(rows, out):
+    writer = None
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(out, fieldnames=list(row), extrasaction='ignore')
+            writer.writeheader()
+        # ギャラリーURL などのリストは JSON の文字列にする
+        writer.writerow({key: json.dumps(value, ensure_ascii=False) if isinstance(value, list) else value for key, value in row.items()})
+        out.flush()
+
+
+WRITERS = {'ndjson': write_ndjson, 'csv': write_csv}
+
+
+def progress_printer(quiet):
+    last_printed = 0.0
+
+    def on_progress(fraction, message):
+        nonlocal last_printed
+        now = time.monotonic()
+        if quiet or (now - last_printed < PROGRESS_INTERVAL and fraction < 1.0):
+            return
+        last_printed = now
+        print(f"[{fraction:4.0%}] {message}", file=sys.stderr, flush=True)
+    return on_progress
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m scraper', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-p', '--prefecture', type=prefecture_name, action='append', required=True, help='都道府県 (複数指定可)')
+    parser.add_argument('--features', type=feature_set, action='append', help='絞り込み条件。カンマ区切りの特徴名 (複数指定可)')
+    parser.add_argument('--pages', type=int, help='対象ごとの最大取得ページ数 (既定は全て)')
+    parser.add_argument('--include-inactive', action='store_true', help='次回出勤の無い人も出力する')
+    parser.add_argument('--engine', choices=['thread', 'asyncio'], default='thread')
+    parser.add_argument('--parser', choices=parsing.available_backends(), default=parsing.default_backend())
+    parser.add_argument('--max-concurrency', type=int, default=MAX_CONCURRENCY, help=f'同時リクエスト数の上限 (既定 {MAX_CONCURRENCY})')
+    parser.add_argument('--parse-processes', type=int, default=0, metavar='N', help='詳細ページの解析を N 個のプロセスで行う (0 は取得と同じスレッドで解析)')
+    parser.add_argument('--base-url', default=BASE_URL, help='取得先のサイト (benchmarks/standin_server.py の代替サーバーで試すときなど)')
+    parser.add_argument('--no-stream', dest='stream', action='store_false', help='詳細ページを途中で読み終えず、常に全体を取得する')
+    parser.add_argument('--memory-limit', type=float, default=DEFAULT_MEMORY_LIMIT / 2**20, metavar='MB',
+                        help=f'取得中～解析中の詳細ページの本文の合計の上限 (既定 {DEFAULT_MEMORY_LIMIT // 2**20}MB、0 で無制限)')
+    parser.add_argument('--shop-review-counts', action='store_true', help='口コミ数を店舗の口コミ一覧からまとめて読む (試験的)')
+    parser.add_argument('--cache', action='store_true', help='ディスク上のレスポンスキャッシュを使う')
+    parser.add_argument('--format', choices=sorted(WRITERS), default='ndjson')
+    parser.add_argument('-o', '--output', default='-', help='出力先 (既定は標準出力)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='進捗を表示しない')
+    args = parser.parse_args(argv)
+
+    targets = build_targets(args.prefecture, args.features or [()])
+    run = ScrapeRun(targets, hide_inactive=not args.include_inactive, page_limit=args.pages, fetch_engine=args.engine,
+                    parser=args.parser, use_cache=args.cache, on_progress=progress_printer(args.quiet), max_concurrency=args.max_concurrency,
+                    parse_processes=args.parse_processes, base_url=args.base_url, stream_pages=args.stream, memory_limit=int(args.memory_limit * 2**20),
+                    shop_review_counts=args.shop_review_counts)
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8', newline='')
+    try:
+        WRITERS[args.format](run.rows(), out)
+    except Exception as e:
+        print(f"エラーが発生しました: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if not args.quiet and (summary := run.summary()):
+        print(summary, file=sys.stderr)
+    return 0
@@ -0,0 +1,186 @@
+"""応答に合わせて同時リクエスト数を増減させる (AIMD)。
+
+正常な応答が続く間は 1 ウィンドウ (limit 件) ごとに上限を 1 ずつ増やし、429/5xx/通信エラーでは
+半分に、p95 の応答時間がこれまでの最良値の LATENCY_TOLERANCE 倍を超えたら 3/4 に減らす。
+減らした直後の 1 ウィンドウは、同じ混雑で何度も減らさないように減少を見送る。
+
+1 つの AdaptiveLimiter を一覧・詳細・口コミの全リクエストで共有する。requests からは
+LimitedAdapter (キャッシュを使うときは LimitedCachingAdapter) を Session にマウントし、
+asyncio エンジンからは acquire_async / release を直接呼ぶ。
+"""
+import asyncio
+import collections
+import threading
+import time
+import weakref
+
+from scraper.http_cache import CachingAdapter
+from scraper.http_client import SharedPoolAdapter
+
+BACKOFF_STATUS_CODES = (429, 500, 502, 503, 504)
+ERROR_DECREASE = 0.5
+LATENCY_DECREASE = 0.75
+LATENCY_TOLERANCE = 2.0
+# p95 を計算する応答数。最良値は少しずつ緩めて、サイト全体が遅くなったときにも増やせるようにする
+LATENCY_WINDOW = 20
+BASELINE_DECAY = 1.05
+POLL_MIN_SECONDS = 0.005
+POLL_MAX_SECONDS = 0.1
+
+
+async def poll_until(try_fn):
+    """try_fn() が True を返すまで、間隔を倍々に (POLL_MAX_SECONDS まで) 広げながら呼び続ける。
+
+    スレッドと共有する枠 (threading.Condition で待つもの) をイベントループを止めずに待つためのもの。
+    """
+    delay = POLL_MIN_SECONDS
+    while not try_fn():
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, POLL_MAX_SECONDS)
+
+
+class AdaptiveLimiter:
+    def __init__(self, initial=10, min_limit=1, max_limit=32):
+        self.min_limit, self.max_limit = min_limit, max_limit
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.in_flight = 0
+        self.peak = self.limit
+        self.decreases = 0
+        self._since_decrease = 0
+        self._latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self._baseline_p95 = None
+        # 上限と同時リクエスト数の時間積分 (usage())
+        self._limit_seconds = self._in_flight_seconds = 0.0
+        self._ticked_at = time.monotonic()
+        self._cond = threading.Condition()
+
+    def current(self):
+        return int(self.limit)
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self._tick()
+            self.in_flight += 1
+
+    def try_acquire(self):
+        with self._cond:
+            if self.in_flight >= int(self.limit):
+                return False
+            self._tick()
+            self.in_flight += 1
+            return True
+
+    async def acquire_async(self):
+        await poll_until(self.try_acquire)
+
+    def release(self, seconds, statuses):
+        """1 リクエストの完了を記録する。statuses はリトライ分も含めた応答ステータス (通信エラーは None)。"""
+        with self._cond:
+            self._tick()
+            self.in_flight -= 1
+            self._since_decrease += 1
+            if any(status is None or status in BACKOFF_STATUS_CODES for status in statuses):
+                self._decrease(ERROR_DECREASE)
+            elif self._latency_rising(seconds):
+                self._decrease(LATENCY_DECREASE)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                self.peak = max(self.peak, self.limit)
+            self._cond.notify_all()
+
+    def _tick(self):
+        # limit / in_flight を変える前に、前回からの分を積分に足す (self._cond を持って呼ぶ)
+        now = time.monotonic()
+        elapsed, self._ticked_at = now - self._ticked_at, now
+        self._limit_seconds += int(self.limit) * elapsed
+        self._in_flight_seconds += self.in_flight * elapsed
+
+    def usage(self):
+        """(上限, 同時リクエスト数) の時間積分 (秒)。2 時点の差を経過時間で割るとその間の平均になる。"""
+        with self._cond:
+            self._tick()
+            return self._limit_seconds, self._in_flight_seconds
+
+    def _latency_rising(self, seconds):
+        self._latencies.append(seconds)
+        if len(self._latencies) < LATENCY_WINDOW:
+            return False
+        p95 = sorted(self._latencies)[int(LATENCY_WINDOW * 0.95) - 1]
+        self._latencies.clear()
+        baseline = self._baseline_p95
+        self._baseline_p95 = p95 if baseline is None else min(p95, baseline * BASELINE_DECAY)
+        return baseline is not None and p95 > baseline * LATENCY_TOLERANCE
+
+    def _decrease(self, factor):
+        if self._since_decrease < self.limit:
+            return
+        self.limit = max(self.min_limit, self.limit * factor)
+        self.decreases += 1
+        self._since_decrease = 0
+
+    def to_dict(self):
+        with self._cond:
+            return {'limit': self.current(), 'peak': int(self.peak), 'max': self.max_limit, 'decreases': self.decreases}
+
+
+class LimitedAdapter(SharedPoolAdapter):
+    """送信を AdaptiveLimiter の枠内で行う HTTPAdapter。urllib3 のリトライも 1 つの枠の中で行う。
+
+    枠は本文を読み終えるか応答を閉じるまで持つ (stream=True で途中でやめるときは閉じること)。
+    """
+
+    def __init__(self, limiter=None, **kwargs):
+        if limiter is not None:
+            kwargs.setdefault('pool_maxsize', limiter.max_limit)
+        super().__init__(**kwargs)
+        self.limiter = limiter
+
+    def send(self, request, **kwargs):
+        if self.limiter is None:
+            return super().send(request, **kwargs)
+        self.limiter.acquire()
+        started = time.perf_counter()
+        try:
+            response = super().send(request, **kwargs)
+        except BaseException:
+            self.limiter.release(time.perf_counter() - started, [None])
+            raise
+        retries = getattr(response.raw, 'retries', None)
+        statuses = [attempt.status for attempt in (retries.history if retries else ())] + [response.status_code]
+        _release_after_body(response, lambda: self.limiter.release(time.perf_counter() - started, statuses))
+        return response
+
+
+def _release_after_body(response, release):
+    """本文を読み終えるか閉じたとき (urllib3 が接続を返すとき) に release() を 1 回だけ呼ぶ。
+
+    send() が返るのはヘッダーを受け取った時点なので、ここで枠を返すと本文の転送が枠の外になり、
+    応答時間も本文の遅さを含まなくなる。読まれずに捨てられた応答は回収されるときに返す。
+    """
+    lock = threading.Lock()
+    released = False
+
+    def release_once():
+        nonlocal released
+        with lock:
+            if released: return
+            released = True
+        release()
+
+    raw = response.raw
+    release_conn = raw.release_conn
+
+    def release_conn_and_slot():
+        try:
+            release_conn()
+        finally:
+            release_once()
+
+    raw.release_conn = release_conn_and_slot
+    weakref.finalize(response, release_once)
+
+
+class LimitedCachingAdapter(CachingAdapter, LimitedAdapter):
+    """キャッシュから返す応答は枠を使わない CachingAdapter。"""
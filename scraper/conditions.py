@@ -0,0 +1,24 @@
+"""検索条件 (都道府県・特徴の絞り込み) の定義と、取得対象の組み立て。"""
+
+PREFECTURES = {'東京': 'tokyo', '大阪': 'osaka', '香川': 'kagawa', '北海道': 'hokkaido', '青森': 'aomori', '岩手': 'iwate', '宮城': 'miyagi', '秋田': 'akita', '山形': 'yamagata', '福島': 'fukushima', '茨城': 'ibaraki', '栃木': 'tochigi', '群馬': 'gunma', '埼玉': 'saitama', '千葉': 'chiba', '神奈川': 'kanagawa', '新潟': 'niigata', '富山': 'toyama', '石川': 'ishikawa', '福井': 'fui', '山梨': 'yamanashi', '長野': 'nagano', '岐阜': 'gifu', '静岡': 'shizuoka', '愛知': 'aichi', '三重': 'mie', '滋賀': 'shiga', '京都': 'kyoto', '兵庫': 'hyogo', '奈良': 'nara', '和歌山': 'wakayama', '鳥取': 'tottori', '島根': 'shimane', '岡山': 'okayama', '広島': 'hiroshima', '山口': 'yamaguchi', '徳島': 'tokushima', '愛媛': 'ehime', '高知': 'kochi', '福岡': 'fukuoka', '佐賀': 'saga', '長崎': 'nagasaki', '熊本': 'kumamoto', '大分': 'oita', '宮崎': 'miyazaki', '鹿児島': 'kagoshima', '沖縄': 'okinawa'}
+AGE_MAP = {'18～19歳': 'typ101', '20～24歳': 'typ102', '25～29歳': 'typ103'}
+HEIGHT_MAP = {'149cm以下': 'typ201', '150～154cm': 'typ202', '155～159cm': 'typ203', '160～164cm': 'typ204'}
+BUST_MAP = {'Aカップ': 'typ301', 'Bカップ': 'typ302', 'Cカップ': 'typ303', 'Dカップ': 'typ304', 'Eカップ': 'typ305', 'Fカップ': 'typ306', 'Gカップ': 'typ307', 'Hカップ': 'typ308', 'Iカップ以上': 'typ309'}
+FEATURE_MAP = {'ニューフェイス': 'typ601', 'お店NO.1・2・3': 'typ602'}
+ALL_TYPS = {**AGE_MAP, **HEIGHT_MAP, **BUST_MAP, **FEATURE_MAP}
+
+
+def filter_path_for(feature_set):
+    """特徴名の並びから一覧のパス (girl-list/typ101-typ102/ など) を作る。"""
+    selected_typ_codes = [ALL_TYPS[name] for name in feature_set]
+    return f"girl-list/{'-'.join(selected_typ_codes)}/" if selected_typ_codes else "girl-list/"
+
+
+def build_targets(prefecture_names, feature_sets):
+    """都道府県 × 特徴の組み合わせごとに (表示名, 都道府県名, 一覧のパス) を作る。"""
+    targets = []
+    for prefecture_name in prefecture_names:
+        for i, feature_set in enumerate(feature_sets, 1):
+            label = f"{prefecture_name} 条件{i}" if len(feature_sets) > 1 else prefecture_name
+            targets.append((label, prefecture_name, f"{PREFECTURES[prefecture_name]}/{filter_path_for(feature_set)}"))
+    return tuple(targets)
@@ -0,0 +1,304 @@
+"""Streamlit に依存しないスクレイピング本体。
+
+    run = ScrapeRun(build_targets(['東京'], [()]), on_progress=lambda fraction, message: print(message))
+    for row in run.rows():
+        ...
+
+rows() は詳細まで取得し終えた行 (dict) を完了順に返すので、全件をメモリに溜めずに
+書き出せる。DataFrame が必要なら to_dataframe() を使う (pandas はそのときだけ読み込む)。
+
+previous_rows に前回の結果を渡すと、一覧は取り直したうえで、名前と出勤状況が前回と
+同じ人は前回の詳細を使い回し、新しく出てきた人と変わった人だけ詳細を取得する。
+"""
+import concurrent.futures
+import multiprocessing
+import threading
+import time
+from urllib.parse import urljoin
+
+import requests
+
+from scraper.batch import TargetProgress, round_robin
+from scraper.concurrency import AdaptiveLimiter, LimitedAdapter, LimitedCachingAdapter
+from scraper.details import build_review_url, get_girl_details
+from scraper.http_cache import ResponseCache
+from scraper.http_client import shared_pool
+from scraper.list_pages import iter_pages_in_order
+from scraper.metrics import RecordingRetry, RunMetrics
+from scraper.parsing import empty_girl_details, extract_girl_details, parse_list_page
+from scraper.pipeline import DetailPipeline, PipelineState, reuse_details_stage, thread_detail_stage
+from scraper.review_counts import ReviewCountResolver
+from scraper.streaming import DEFAULT_MEMORY_LIMIT, MemoryBudget
+from scraper.throttle import RateLimiter
+
+BASE_URL = "https://www.cityheaven.net/"
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36'}
+# 同時リクエスト数は応答を見ながら INITIAL_CONCURRENCY から MAX_CONCURRENCY の間で増減させる (concurrency.py)
+INITIAL_CONCURRENCY = 10
+MAX_CONCURRENCY = 32
+LIST_MAX_IN_FLIGHT = 4
+LIST_RATE_PER_SEC = 4.0
+SPECULATIVE_MAX_PAGES = 200
+DETAIL_QUEUE_SIZE = 200
+# 詳細ページから取る項目。前回の結果を使い回すときはこれだけを引き継ぐ
+DETAIL_KEYS = tuple(empty_girl_details())
+# 一覧のこれらの項目が前回と同じなら詳細は変わっていないとみなす (一覧の次回出勤は出勤状況から決まる)
+UNCHANGED_KEYS = ('名前', '出勤状況')
+
+
+def _missing_to_none(value):
+    # DataFrame を経由した前回の結果では欠損が NaN になっている
+    return None if isinstance(value, float) and value != value else value
+
+
+class ScrapeRun:
+    """1 回のスクレイピング。targets は (表示名, 都道府県名, 一覧のパス) のタプル (conditions.build_targets で作る)。
+
+    複数の対象は 1 つのセッション・レート制限・詳細取得ステージを共有して同時に取得し、
+    複数の対象に出てくる人 (プロフィールリンクが同じ) は 1 回だけ取得する。
+    on_progress(fraction, message) には 0.0～1.0 の進捗と表示用の文言が渡される。
+    max_concurrency は同時リクエスト数の上限 (一覧・詳細・口コミの合計)。
+    base_url を変えると別のサイト (benchmarks/standin_server.py の代替サーバーなど) から取得する。
+    parse_processes を 1 以上にすると、詳細ページの解析をその数のプロセスで行い、
+    取得側のスレッドは通信だけを行う (GIL で解析が詰まらないようにする)。
+    stream_pages ならプロフィール/口コミページは解析に使う部分まで読んだところで取得をやめる
+    (use_cache のときは途中までの本文をキャッシュしないように全体を読む)。
+    memory_limit は取得中～解析中の詳細ページの本文の合計の上限 (バイト)。超えそうなら次の人の取得を待たせる。
+    shop_review_counts なら口コミ数を店舗の口コミ一覧からまとめて読む (review_counts.py)。一覧のマークアップは
+    実サイトのページで確かめていないので既定では使わず、1 人ずつ口コミページを取得する。
+    """
+
+    def __init__(self, targets, hide_inactive=True, page_limit=None, fetch_engine="thread", parser="html.parser", use_cache=False, on_progress=None, previous_rows=None, max_concurrency=MAX_CONCURRENCY, parse_processes=0, base_url=BASE_URL, stream_pages=True, memory_limit=DEFAULT_MEMORY_LIMIT, shop_review_counts=False):
+        self.targets = targets
+        self.hide_inactive = hide_inactive
+        self.page_limit = page_limit
+        self.fetch_engine = fetch_engine
+        self.parser = parser
+        self.use_cache = use_cache
+        self.parse_processes = parse_processes
+        self.base_url = base_url
+        self.stream_pages = stream_pages and not use_cache
+        self.memory_budget = MemoryBudget(memory_limit) if memory_limit else None
+        self.shop_review_counts = shop_review_counts
+        self.limiter = AdaptiveLimiter(initial=INITIAL_CONCURRENCY, max_limit=max_concurrency)
+        self.on_progress = on_progress or (lambda fraction, message: None)
+        self.cache = None
+        self.review_counts = None
+        self.target_progress = []
+        self.metrics = RunMetrics()
+        self.previous = {row['プロフィールリンク']: row for row in previous_rows or () if row.get('プロフィールリンク')}
+        self.reused_rows = 0
+        self._lock = threading.Lock()
+
+    def summary(self):
+        failed = [progress.label for progress in self.target_progress if progress.failed]
+        parts = [part.summary() for part in (self.cache and self.cache.stats, self.review_counts) if part]
+        if self.previous: parts.append(f"詳細の再利用: {self.reused_rows}人")
+        if failed: parts.append(f"一覧取得失敗: {'・'.join(failed)}")
+        return " / ".join(parts)
+
+    def _reusable_details(self, row):
+        """前回から名前・出勤状況が変わっていなければ、前回の詳細を返す。"""
+        previous = self.previous.get(row['プロフィールリンク'])
+        if previous is None or any(_missing_to_none(previous.get(key)) != row.get(key) for key in UNCHANGED_KEYS):
+            return None
+        with self._lock:
+            self.reused_rows += 1
+        return {key: _missing_to_none(previous.get(key)) for key in DETAIL_KEYS}
+
+    def _summary_str(self):
+        return f" [{summary}]" if (summary := self.summary()) else ""
+
+    def rows(self):
+        """詳細を取得し終えた行を完了順に返す。hide_inactive なら次回出勤の無い行は返さない。"""
+        targets, parser, metrics, base_url = self.targets, self.parser, self.metrics, self.base_url
+        is_batch = len(targets) > 1
+        self.cache = cache = ResponseCache() if self.use_cache else None
+        parse_pool = _parse_pool(self.parse_processes) if self.parse_processes else None
+        found_rows = 0
+        with requests.Session() as session:
+            retry_strategy = RecordingRetry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504], metrics=metrics)
+            # 接続はプロセス全体で共有し、前の実行 (別のユーザーのものも) の keep-alive 接続を使い回す
+            pool = shared_pool()
+            connections_before = pool.stats.snapshot()
+            adapter_options = {'limiter': self.limiter, 'shared_pool': pool, 'max_retries': retry_strategy}
+            adapter = LimitedCachingAdapter(cache, **adapter_options) if cache else LimitedAdapter(**adapter_options)
+            session.mount("https://", adapter); session.mount("http://", adapter)
+            session.hooks['response'].append(metrics.requests_hook())
+            try:
+                self.on_progress(0.0, "総ページ数を確認中...")
+                # 一覧の取得は全対象で同時実行数とレートを共有する
+                list_limiter = RateLimiter(LIST_RATE_PER_SEC)
+                list_slots = threading.Semaphore(LIST_MAX_IN_FLIGHT)
+
+                def get_list_page(target_path, page):
+                    with list_slots:
+                        list_limiter.wait()
+                        return session.get(urljoin(base_url, target_path if page == 1 else f"{target_path}{page}/"), timeout=30, headers=HEADERS)
+
+                def fetch_first_page(target):
+                    try:
+                        response = get_list_page(target[2], 1)
+                        response.raise_for_status()
+                    except requests.exceptions.RequestException:
+                        # まとめて取得するときは、失敗した対象だけを飛ばして続ける
+                        if not is_batch: raise
+                        return None
+                    with metrics.timed('list_parse'):
+                        return parse_list_page(response.content, base_url, parser=parser)
+
+                with concurrent.futures.ThreadPoolExecutor(max_workers=LIST_MAX_IN_FLIGHT) as executor:
+                    first_pages = list(executor.map(fetch_first_page, targets))
+
+                def target_pages(progress, target_path, first_page, pages_to_scrape, speculative_until):
+                    def fetch_list_page(page):
+                        content = get_list_page(target_path, page).content
+                        with metrics.timed('list_parse'):
+                            list_page = parse_list_page(content, base_url, parser=parser)
+                        return list_page.has_items, list_page.rows
+                    yield 1, first_page.rows
+                    try:
+                        yield from iter_pages_in_order(fetch_list_page, 2, pages_to_scrape, max_in_flight=LIST_MAX_IN_FLIGHT, speculative_until=speculative_until)
+                    except requests.exceptions.RequestException:
+                        # まとめて取得するときは、途中のページで失敗した対象もそこまでの行を残して打ち切り、他の対象を続ける
+                        if not is_batch: raise
+                        progress.failed = True
+
+                target_iterables = []
+                speculative = False
+                for (label, prefecture_name, target_path), first_page in zip(targets, first_pages):
+                    if first_page is None:
+                        progress = TargetProgress(label, prefecture_name, 0); progress.failed = True
+                        self.target_progress.append(progress)
+                        continue
+                    pages_to_scrape = first_page.last_page
+                    if self.page_limit:
+                        pages_to_scrape = min(pages_to_scrape, self.page_limit)
+                    # ページ送りが省略されている場合は、空ページに当たるまで先読みする
+                    speculative_until = (self.page_limit or SPECULATIVE_MAX_PAGES) if first_page.truncated else None
+                    speculative = speculative or bool(speculative_until)
+                    progress = TargetProgress(label, prefecture_name, pages_to_scrape)
+                    self.target_progress.append(progress)
+                    target_iterables.append((progress, target_pages(progress, target_path, first_page, pages_to_scrape, speculative_until)))
+
+                def fetch_shop_reviews(url):
+                    try:
+                        res = session.get(url, timeout=10, headers=HEADERS)
+                        return res.content if res.status_code == 200 else None
+                    except requests.exceptions.RequestException:
+                        return None
+
+                # 同じ店舗のキャストの口コミ数は店舗の口コミ一覧からまとめて読む
+                if self.shop_review_counts:
+                    self.review_counts = ReviewCountResolver(fetch_shop_reviews, parser=parser)
+                review_counts = self.review_counts
+                row_targets = {}
+
+                def produce_pages():
+                    seen_links = set()
+                    for progress, (page, rows) in round_robin(target_iterables):
+                        new_rows = []
+                        for row in rows:
+                            link = row['プロフィールリンク']
+                            # 複数の絞り込み条件に出てくる人は最初の 1 回だけ詳細を取得する
+                            if link in seen_links: continue
+                            if link: seen_links.add(link)
+                            row['都道府県'] = progress.prefecture_name
+                            row_targets[id(row)] = progress
+                            if review_counts: review_counts.register(link)
+                            new_rows.append(row)
+                        progress.pages_done += 1
+                        progress.rows_found += len(new_rows)
+                        yield page, new_rows
+
+                # 一覧の行はすぐに詳細取得へ流し、一覧取得と詳細取得を並行させる
+                if self.fetch_engine == "asyncio" and (async_fetch := _async_fetch()).is_available():
+                    def build_details(profile_url, profile_body, review_body, review_count):
+                        with metrics.timed('detail_parse'):
+                            if parse_pool is None or profile_body is None:
+                                details = extract_girl_details(profile_url, profile_body, review_body, parser=parser)
+                            else:
+                                details = parse_pool.submit(extract_girl_details, profile_url, profile_body, review_body, parser=parser).result()
+                        if profile_body is not None and review_count is not None:
+                            details["口コミ数"] = review_count
+                        return details
+
+                    def resolve_review(profile_url):
+                        # count_for は解決した人数を数えるので、1 人 1 回だけ呼ぶ
+                        count = review_counts.count_for(profile_url) if review_counts else None
+                        return (None, count) if count is not None else (build_review_url(profile_url), None)
+                    max_limit = self.limiter.max_limit
+                    engine = async_fetch.AsyncFetchEngine(HEADERS, max_concurrency=max_limit, per_host_limit=max_limit, cache=cache, metrics=metrics, limiter=self.limiter, blocking_build=parse_pool is not None,
+                                                          stream=self.stream_pages, memory_budget=self.memory_budget)
+                    detail_stage = lambda next_row, emit: engine.run_stream(next_row, emit, lambda row: row['プロフィールリンク'], resolve_review, build_details)
+                else:
+                    def process_row(row):
+                        with metrics.timed('detail_worker'):
+                            return get_girl_details(row['プロフィールリンク'], session, HEADERS, parser=parser, review_counts=review_counts, metrics=metrics, parse_pool=parse_pool,
+                                                    stream=self.stream_pages, memory_budget=self.memory_budget)
+                    # 実際の同時数は limiter が決めるので、スレッドの数もその時々の上限に合わせる
+                    detail_stage = thread_detail_stage(process_row, workers=self.limiter.current)
+                if self.previous:
+                    detail_stage = reuse_details_stage(detail_stage, self._reusable_details)
+                pages_total = sum(progress.pages_total for progress in self.target_progress)
+                state = PipelineState(pages_total)
+                pipeline = DetailPipeline(produce_pages(), detail_stage, state, queue_size=DETAIL_QUEUE_SIZE)
+
+                detail_started, usage_before = time.perf_counter(), self.limiter.usage()
+                for result in pipeline.results():
+                    if result is not None:
+                        original_data, details = result
+                        row_targets.pop(id(original_data)).rows_done += 1
+                        if details is not None:
+                            original_data.update(details)
+                            if original_data["次回出勤"] is None: original_data["次回出勤"] = details.get("次回出勤")
+                            found_rows += 1
+                            if not self.hide_inactive or original_data["次回出勤"] is not None:
+                                yield original_data
+
+                    # --- 残り時間の計算と表示 ---
+                    page_total = f"{pages_total}+" if speculative else pages_total
+                    list_str = "" if state.list_finished else f"一覧 {state.pages_done}/{page_total} ページ取得済み・"
+                    total_str = f"全{state.rows_found}人" if state.list_finished else f"約{state.estimated_total_rows()}人"
+                    remaining_seconds = state.remaining_seconds()
+                    if remaining_seconds:
+                        time_estimate_str = f" - 残り約{remaining_seconds // 60}分{remaining_seconds % 60}秒"
+                    else:
+                        time_estimate_str = ""
+                    target_str = "".join(f"\n{progress.summary()}" for progress in self.target_progress) if is_batch else ""
+                    concurrency_str = f" [同時接続 {self.limiter.current()}/{self.limiter.max_limit}]"
+                    self.on_progress(state.progress(), f"{list_str}{total_str}の詳細情報を並列取得中... ({state.rows_done}/{state.rows_found}){time_estimate_str}{concurrency_str}{self._summary_str()}{target_str}")
+                metrics.detail_seconds = time.perf_counter() - detail_started
+                metrics.slot_usage = tuple(after - before for before, after in zip(usage_before, self.limiter.usage()))
+                metrics.concurrency = self.limiter.to_dict()
+                metrics.connections = pool.stats.delta(connections_before, pool.stats.snapshot())
+                metrics.memory = self.memory_budget.to_dict() if self.memory_budget else None
+
+                if not found_rows:
+                    self.on_progress(state.progress(), f"データが取得できませんでした。{self._summary_str()}")
+                else:
+                    self.on_progress(state.progress(), f"処理完了！{self._summary_str()}")
+            finally:
+                if cache: cache.close()
+                if parse_pool: parse_pool.shutdown(wait=False, cancel_futures=True)
+
+    def to_dataframe(self):
+        """全行を取得して型付きの DataFrame (frame.build_result_frame) にする。実行の要約と計測値は attrs に入れる。"""
+        from scraper.frame import build_result_frame  # 行を書き出すだけなら pandas は不要なので、ここで読み込む
+        df = build_result_frame(list(self.rows()))
+        df.attrs['run_summary'] = self.summary()
+        df.attrs['run_metrics'] = self.metrics.to_dict()
+        df.attrs['fetched_at'] = time.time()
+        return df
+
+
+def _parse_pool(processes):
+    # Streamlit などスレッドの多いプロセスから fork すると子でロックが固まることがあるので、使えるなら forkserver にする
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else None
+    return concurrent.futures.ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context(method))
+
+
+def _async_fetch():
+    # aiohttp の読み込みは asyncio エンジンを使うときだけにする
+    from scraper import async_fetch
+    return async_fetch
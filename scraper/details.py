@@ -0,0 +1,86 @@
+"""個人ページ (プロフィール/口コミ) の取得。"""
+import contextlib
+import re
+
+import requests
+
+from scraper.metrics import timed
+from scraper.parsing import PROFILE_SECTIONS, REVIEW_SECTIONS, empty_girl_details, extract_girl_details
+from scraper.streaming import read_body
+
+
+def split_profile_url(profile_url):
+    """プロフィールURLを (店舗のベースURL, girl_id) に分ける。形式が違えば (None, None)。"""
+    girl_id_match = re.search(r'girlid-(\d+)', profile_url or '')
+    shop_url_match = re.search(r'(https?://.*?/girlid-)', profile_url or '')
+    if girl_id_match and shop_url_match:
+        return shop_url_match.group(1).replace('girlid-', ''), girl_id_match.group(1)
+    return None, None
+
+def build_review_url(profile_url):
+    """プロフィールURLから口コミページのURLを組み立てる。"""
+    shop_base_url, girl_id = split_profile_url(profile_url)
+    if shop_base_url:
+        return f"{shop_base_url}reviews/?girlid={girl_id}"
+    return None
+
+def _get_page(session, url, timeout, headers, sections, stream, hold, metrics):
+    """(ステータス, 本文) を返す。stream なら sections が揃ったところで読むのをやめる。"""
+    reserved = hold.admit() if hold else 0
+    if stream:
+        with session.get(url, timeout=timeout, headers=headers, stream=True) as res:
+            status = res.status_code
+            content = read_body(res, sections if status == 200 else None, metrics)
+    else:
+        res = session.get(url, timeout=timeout, headers=headers)
+        status, content = res.status_code, res.content
+    if hold: hold.settle(reserved, len(content))
+    return status, content
+
+def fetch_girl_pages(profile_url, session, headers, review_counts=None, stream=False, hold=None, metrics=None):
+    """プロフィールページと、口コミ数が店舗一覧から分からなければ口コミページを取得する。
+
+    (プロフィールの本文, 口コミの本文, 口コミ数) を返す。プロフィールが取れなければ None。
+    stream なら解析に使う部分まで読んだところで本文の取得をやめる (streaming.read_body)。
+    hold (streaming.MemoryBudget.hold()) を渡すと、送る前に本文の分を予約する。
+    """
+    try:
+        status, profile_content = _get_page(session, profile_url, 30, headers, PROFILE_SECTIONS.sections, stream, hold, metrics)
+        if status != 200:
+            return None
+    except requests.exceptions.RequestException:
+        return None
+
+    review_count = review_counts.count_for(profile_url) if review_counts else None
+    review_content = None
+    if review_count is None and (review_url := build_review_url(profile_url)):
+        try:
+            review_status, content = _get_page(session, review_url, 10, headers, REVIEW_SECTIONS.sections, stream, hold, metrics)
+            if review_status == 200:
+                review_content = content
+        except requests.exceptions.RequestException:
+            pass
+    return profile_content, review_content, review_count
+
+def get_girl_details(profile_url, session, headers, parser="html.parser", review_counts=None, metrics=None, parse_pool=None, stream=False, memory_budget=None):
+    """個人のプロフィールページから詳細情報を取得する。画像取得ロジックを改良。
+
+    review_counts (ReviewCountResolver) で口コミ数が分かれば、個別の口コミページは取得しない。
+    parse_pool (ProcessPoolExecutor) を渡すと、解析はそのプロセスで行い、このスレッドは結果を待つだけになる。
+    memory_budget (streaming.MemoryBudget) の予約は解析し終えるまで持つ。
+    """
+    if not profile_url:
+        return empty_girl_details()
+    with (memory_budget.hold() if memory_budget else contextlib.nullcontext()) as hold:
+        if (pages := fetch_girl_pages(profile_url, session, headers, review_counts, stream=stream, hold=hold, metrics=metrics)) is None:
+            return empty_girl_details()
+        profile_content, review_content, review_count = pages
+
+        with timed(metrics, 'detail_parse'):
+            if parse_pool is None:
+                details = extract_girl_details(profile_url, profile_content, review_content, parser=parser)
+            else:
+                details = parse_pool.submit(extract_girl_details, profile_url, profile_content, review_content, parser=parser).result()
+    if review_count is not None:
+        details["口コミ数"] = review_count
+    return details
@@ -0,0 +1,92 @@
+"""取得結果の行 (dict) から、メモリの小さい型付きの DataFrame を作る。
+
+結果はセッションやキャッシュに長く残るので、種類の少ない文字列はカテゴリ型、
+年齢や寸法は小さい nullable 整数型にする。ギャラリーURL は行ごとの URL リストの代わりに
+GalleryURLs (共有の接頭辞 + 相対パス) で持つ。
+"""
+import os
+import sys
+
+import pandas as pd
+
+RESULT_SCHEMA = {
+    '年齢': 'UInt8', '身長(cm)': 'UInt16', 'バスト(cm)': 'UInt16', 'ウェスト(cm)': 'UInt16', 'ヒップ(cm)': 'UInt16',
+    'WEB人気の星': 'UInt16', '週合計出勤日数': 'UInt8', '週合計勤務時間': 'float32', '口コミ数': 'UInt32',
+    'カップ': 'category', '出勤状況': 'category', '次回出勤': 'category', '本日の出勤予定': 'category', '店舗名': 'category', '都道府県': 'category',
+}
+GALLERY_COLUMN = 'ギャラリーURL'
+
+
+class GalleryURLs:
+    """1 人分のギャラリー URL。接頭辞は同じ文字列を全行で共有し、残りは改行区切りの 1 つの文字列で持つ。
+
+    反復するとフル URL を返すので、list(urls) で元のリストに戻る。
+    """
+    __slots__ = ('prefix', 'paths')
+
+    def __init__(self, prefix, paths):
+        self.prefix, self.paths = prefix, paths
+
+    def __iter__(self):
+        return (self.prefix + path for path in self.paths.split('\n'))
+
+    def __len__(self):
+        return self.paths.count('\n') + 1
+
+    def __getitem__(self, index):
+        return list(self)[index]
+
+    def __eq__(self, other):
+        return list(self) == list(other) if isinstance(other, (GalleryURLs, list, tuple)) else NotImplemented
+
+    def __repr__(self):
+        return f"GalleryURLs({list(self)!r})"
+
+    def __sizeof__(self):
+        # 接頭辞は共有なので数えない (memory_usage(deep=True) がこの値を使う)
+        return object.__sizeof__(self) + sys.getsizeof(self.paths)
+
+
+def encode_gallery(urls, prefixes):
+    """URL のリストを GalleryURLs にする。空のリストは () にする。prefixes は接頭辞を共有するための dict。"""
+    if isinstance(urls, GalleryURLs) or not isinstance(urls, list):
+        return urls
+    if not urls:
+        return ()
+    prefix = os.path.commonprefix(urls)
+    prefix = prefix[:prefix.rfind('/') + 1]
+    prefix = prefixes.setdefault(prefix, prefix)
+    return GalleryURLs(prefix, '\n'.join(url[len(prefix):] for url in urls))
+
+
+def _typed(series, dtype):
+    if dtype == 'category':
+        return series.astype('category')
+    values = pd.to_numeric(series, errors='coerce')
+    try:
+        return values.astype(dtype)
+    except (TypeError, ValueError, OverflowError):
+        # 想定外の値 (小数や範囲外) が混じっていたら変換しない
+        return values
+
+
+def build_result_frame(rows):
+    """行のリストから RESULT_SCHEMA に沿った DataFrame を作る。"""
+    df = pd.DataFrame(rows)
+    for column, dtype in RESULT_SCHEMA.items():
+        if column in df.columns:
+            df[column] = _typed(df[column], dtype)
+    if GALLERY_COLUMN in df.columns:
+        prefixes = {}
+        df[GALLERY_COLUMN] = pd.Series([encode_gallery(urls, prefixes) for urls in df[GALLERY_COLUMN]], index=df.index, dtype=object)
+    return df
+
+
+def frame_to_rows(df):
+    """build_result_frame の逆。欠損は None、ギャラリーURL はリストに戻した dict のリストを返す。"""
+    values = df.astype(object)
+    rows = values.where(values.notna(), None).to_dict('records')
+    for row in rows:
+        if GALLERY_COLUMN in row:
+            row[GALLERY_COLUMN] = list(row[GALLERY_COLUMN] or [])
+    return rows
@@ -0,0 +1,181 @@
+"""ディスク上の HTTP レスポンスキャッシュ。
+
+URL の種類 (一覧/プロフィール/口コミ) ごとに有効期限を持ち、期限切れのエントリは
+ETag / Last-Modified があれば条件付きリクエストで再検証する。総サイズが上限を
+超えたら最終アクセスの古い順に削除する (LRU)。保存先は SQLite の 1 ファイル。
+
+requests からは CachingAdapter を Session にマウントして使い、asyncio エンジンからは
+lookup / store / refresh を直接呼ぶ。
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'cityheaven-scraper', 'http.sqlite3')
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+# 一覧は入れ替わりが早いので短め、口コミ件数はめったに変わらないので長め
+URL_CLASS_TTLS = {'list': 5 * 60, 'profile': 30 * 60, 'review': 6 * 3600}
+# 本文は展開済みで保存するので、転送に関するヘッダーは残さない
+_DROP_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection'}
+
+
+def classify_url(url):
+    if 'reviews/' in url: return 'review'
+    if re.search(r'girlid-\d+', url): return 'profile'
+    if 'girl-list/' in url: return 'list'
+    return None
+
+
+class CacheEntry:
+    def __init__(self, url, status, headers, body, stored_at, etag, last_modified):
+        self.url, self.status, self.headers, self.body = url, status, headers, body
+        self.stored_at, self.etag, self.last_modified = stored_at, etag, last_modified
+
+    def is_fresh(self, ttl):
+        return time.time() - self.stored_at < ttl
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag: headers['If-None-Match'] = self.etag
+        if self.last_modified: headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class CacheStats:
+    """1 回の実行中のヒット/再検証/ミス件数。"""
+
+    def __init__(self):
+        self.hits = self.revalidated = self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+
+    def record(self, kind, saved=0):
+        with self._lock:
+            setattr(self, kind, getattr(self, kind) + 1)
+            self.bytes_saved += saved
+
+    def summary(self):
+        return f"キャッシュ: ヒット {self.hits} / 再検証 {self.revalidated} / ミス {self.misses}"
+
+
+class ResponseCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, ttls=None):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttls = {**URL_CLASS_TTLS, **(ttls or {})}
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS responses (url TEXT PRIMARY KEY, status INTEGER, headers TEXT, body BLOB, size INTEGER, '
+                         'stored_at REAL, last_access REAL, etag TEXT, last_modified TEXT)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)')
+        self._total_bytes = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def ttl_for(self, url):
+        return self.ttls.get(classify_url(url), 0)
+
+    def lookup(self, url):
+        """キャッシュ対象外の URL や未保存なら None。"""
+        if not self.ttl_for(url):
+            return None
+        with self._lock:
+            row = self._db.execute('SELECT status, headers, body, stored_at, etag, last_modified FROM responses WHERE url = ?', (url,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute('UPDATE responses SET last_access = ? WHERE url = ?', (time.time(), url))
+            self._db.commit()
+        status, headers, body, stored_at, etag, last_modified = row
+        return CacheEntry(url, status, json.loads(headers), body, stored_at, etag, last_modified)
+
+    def store(self, url, status, headers, body):
+        if status != 200 or not self.ttl_for(url):
+            return
+        now = time.time()
+        with self._lock:
+            old = self._db.execute('SELECT size FROM responses WHERE url = ?', (url,)).fetchone()
+            self._db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                             (url, status, json.dumps({k: v for k, v in headers.items() if k.lower() not in _DROP_HEADERS}), body, len(body), now, now, headers.get('ETag'), headers.get('Last-Modified')))
+            self._total_bytes += len(body) - (old[0] if old else 0)
+            self._evict()
+            self._db.commit()
+
+    def refresh(self, url):
+        """304 Not Modified を受けたエントリの保存時刻を更新する。"""
+        now = time.time()
+        with self._lock:
+            self._db.execute('UPDATE responses SET stored_at = ?, last_access = ? WHERE url = ?', (now, now, url))
+            self._db.commit()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes:
+            rows = self._db.execute('SELECT url, size FROM responses ORDER BY last_access LIMIT 100').fetchall()
+            if not rows:
+                break
+            for url, size in rows:
+                self._db.execute('DELETE FROM responses WHERE url = ?', (url,))
+                self._total_bytes -= size
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class CachingAdapter(HTTPAdapter):
+    """GET リクエストを ResponseCache 経由で送る HTTPAdapter。
+
+    再検証 (304) してキャッシュから返す応答には、通信した 304 の応答を revalidation に付ける
+    (キャッシュから返す応答は raw が無いので、RunMetrics はこれで通信を数える)。
+    """
+
+    def __init__(self, cache, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+
+    def _cached_response(self, request, entry):
+        response = Response()
+        response.status_code = entry.status
+        response.reason = 'OK'
+        response.headers = CaseInsensitiveDict(entry.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = entry.body
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def send(self, request, **kwargs):
+        if request.method != 'GET' or (entry := self.cache.lookup(request.url)) is None:
+            response = super().send(request, **kwargs)
+            if request.method == 'GET' and self.cache.ttl_for(request.url):
+                self.cache.stats.record('misses')
+                self.cache.store(request.url, response.status_code, response.headers, response.content)
+            return response
+
+        if entry.is_fresh(self.cache.ttl_for(request.url)):
+            self.cache.stats.record('hits', saved=len(entry.body))
+            return self._cached_response(request, entry)
+
+        request.headers.update(entry.conditional_headers())
+        response = super().send(request, **kwargs)
+        if response.status_code == 304:
+            # この応答は返さないので、(空の) 本文を読み切って接続をプールに返す
+            response.content
+            response.close()
+            self.cache.refresh(request.url)
+            self.cache.stats.record('revalidated', saved=len(entry.body))
+            cached = self._cached_response(request, entry)
+            cached.revalidation = response
+            return cached
+        self.cache.stats.record('misses')
+        self.cache.store(request.url, response.status_code, response.headers, response.content)
+        return response
@@ -0,0 +1,213 @@
+"""プロセス全体で共有する HTTP 接続プール。
+
+実行ごとに Session と HTTPAdapter を作り直すと、毎回 TCP/TLS の接続と DNS の名前解決からやり直しになる。
+SharedConnectionPool は urllib3 の PoolManager をプロセスに 1 つだけ持ち、Streamlit の再実行や
+別のユーザーの実行をまたいで keep-alive の接続を使い回す。
+
+- プールの大きさは同時リクエスト数の上限に合わせる (ensure_maxsize。広げても既存の接続は捨てない)
+- IDLE_TIMEOUT_SECONDS 以上使われなかった接続は、次に取り出したときに閉じて接続し直す
+- 名前解決の結果 (アドレスの一覧) を DNS_TTL_SECONDS の間キャッシュし、接続できるアドレスを順に探す
+- 新規接続・再利用・アイドルで閉じた数と DNS キャッシュのヒット数を stats に数える
+
+実行ごとの Session には SharedPoolAdapter (またはそのサブクラス) をマウントする。
+アダプターを close() しても共有のプールは閉じない。
+"""
+import socket
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from urllib3 import PoolManager
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util.connection import allowed_gai_family
+
+IDLE_TIMEOUT_SECONDS = 30
+DNS_TTL_SECONDS = 300
+DEFAULT_MAXSIZE = 10
+
+
+class PoolStats:
+    KEYS = ('new_connections', 'reused_connections', 'idle_evictions', 'dns_hits', 'dns_misses')
+
+    def __init__(self):
+        self._counts = dict.fromkeys(self.KEYS, 0)
+        self._lock = threading.Lock()
+
+    def record(self, key):
+        with self._lock:
+            self._counts[key] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+    @staticmethod
+    def delta(before, after):
+        return {key: after[key] - before.get(key, 0) for key in after}
+
+
+class DNSCache:
+    """(ホスト, ポート) → 接続先の IP アドレスの一覧 (getaddrinfo の順)。
+
+    urllib3 と同じく allowed_gai_family() で絞る (IPv6 が使えない環境では IPv4 だけ)。
+    接続できたアドレスは prefer() で先頭に回し、どれにも接続できなければ invalidate() で捨てる。
+    """
+
+    def __init__(self, stats, ttl=DNS_TTL_SECONDS):
+        self.stats = stats
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host, port):
+        key = (host, port)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and time.monotonic() - entry[1] < self.ttl:
+            self.stats.record('dns_hits')
+            return list(entry[0])
+        self.stats.record('dns_misses')
+        addresses = []
+        for *_, sockaddr in socket.getaddrinfo(host, port, allowed_gai_family(), socket.SOCK_STREAM):
+            if sockaddr[0] not in addresses:
+                addresses.append(sockaddr[0])
+        with self._lock:
+            self._entries[key] = (addresses, time.monotonic())
+        return list(addresses)
+
+    def prefer(self, host, port, address):
+        with self._lock:
+            entry = self._entries.get((host, port))
+            if entry and entry[0][0] != address and address in entry[0]:
+                self._entries[(host, port)] = ([address] + [other for other in entry[0] if other != address], entry[1])
+
+    def invalidate(self, host, port):
+        with self._lock:
+            self._entries.pop((host, port), None)
+
+
+class _CachedDNSConnectionMixin:
+    shared = None  # SharedConnectionPool (サブクラスを作るときに設定する)
+
+    def _new_conn(self):
+        # 接続先だけ IP にする。host (TLS の SNI と証明書の検証に使う) はそのまま
+        host, dns_host = self.host, self._dns_host
+        try:
+            addresses = self.shared.dns.resolve(host, self.port)
+        except OSError:
+            addresses = []  # 名前解決の失敗は urllib3 側でいつもどおり扱わせる
+        if not addresses:
+            sock = super()._new_conn()
+            self.shared.stats.record('new_connections')
+            return sock
+        # create_connection と同じく、アドレスを順に試して最初に接続できたものを使う
+        try:
+            for address in addresses:
+                self._dns_host = address
+                try:
+                    sock = super()._new_conn()
+                except (NewConnectionError, ConnectTimeoutError) as e:
+                    error = e
+                    continue
+                self.shared.dns.prefer(host, self.port, address)
+                self.shared.stats.record('new_connections')
+                return sock
+        finally:
+            self._dns_host = dns_host
+        self.shared.dns.invalidate(host, self.port)
+        raise error
+
+
+class _IdleEvictingPoolMixin:
+    shared = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.widen(self.shared.maxsize)
+
+    def widen(self, maxsize):
+        """保持する接続の上限を maxsize まで広げる。入っている接続はそのまま。"""
+        with self.pool.mutex:
+            self.pool.maxsize = max(self.pool.maxsize, maxsize)
+
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout)
+        if getattr(conn, 'sock', None) is not None:
+            if time.monotonic() - getattr(conn, 'released_at', 0.0) > self.shared.idle_timeout:
+                conn.close()
+                self.shared.stats.record('idle_evictions')
+            else:
+                self.shared.stats.record('reused_connections')
+        return conn
+
+    def _put_conn(self, conn):
+        if conn is not None:
+            conn.released_at = time.monotonic()
+        super()._put_conn(conn)
+
+
+class SharedConnectionPool:
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, idle_timeout=IDLE_TIMEOUT_SECONDS, dns_ttl=DNS_TTL_SECONDS):
+        self.idle_timeout = idle_timeout
+        self.stats = PoolStats()
+        self.dns = DNSCache(self.stats, dns_ttl)
+        attrs = {'shared': self}
+        http_conn = type('SharedHTTPConnection', (_CachedDNSConnectionMixin, HTTPConnection), attrs)
+        https_conn = type('SharedHTTPSConnection', (_CachedDNSConnectionMixin, HTTPSConnection), attrs)
+        http_pool = type('SharedHTTPConnectionPool', (_IdleEvictingPoolMixin, HTTPConnectionPool), {**attrs, 'ConnectionCls': http_conn})
+        https_pool = type('SharedHTTPSConnectionPool', (_IdleEvictingPoolMixin, HTTPSConnectionPool), {**attrs, 'ConnectionCls': https_conn})
+        self.manager = PoolManager(maxsize=maxsize, block=False)
+        self.manager.pool_classes_by_scheme = {'http': http_pool, 'https': https_pool}
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+
+    def ensure_maxsize(self, maxsize):
+        """ホストごとの接続数の上限を maxsize 以上にする。
+
+        既存のプールはその場で広げ、他の実行が使っている keep-alive の接続は捨てない
+        (connection_pool_kw の maxsize はプールのキーに入るので変えない。新しいプールは作るときに広げる)。
+        """
+        with self._lock:
+            if maxsize <= self.maxsize:
+                return
+            self.maxsize = maxsize
+            pools = self.manager.pools
+            for key in pools.keys():
+                if (pool := pools.get(key)) is not None:
+                    pool.widen(maxsize)
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def shared_pool():
+    """プロセスで 1 つの SharedConnectionPool を返す。"""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = SharedConnectionPool()
+        return _shared_pool
+
+
+class SharedPoolAdapter(HTTPAdapter):
+    """接続を SharedConnectionPool から借りる HTTPAdapter。shared_pool が None なら通常の HTTPAdapter と同じ。"""
+
+    def __init__(self, shared_pool=None, **kwargs):
+        self.shared_pool = shared_pool
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        if self.shared_pool is None:
+            return super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self._pool_connections, self._pool_maxsize, self._pool_block = connections, maxsize, block
+        self.shared_pool.ensure_maxsize(maxsize)
+        self.poolmanager = self.shared_pool.manager
+
+    def close(self):
+        if self.shared_pool is None:
+            return super().close()
+        for proxy in self.proxy_manager.values():
+            proxy.clear()
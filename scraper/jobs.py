@@ -0,0 +1,86 @@
+"""バックグラウンドのスクレイピングジョブ管理。
+
+ジョブは検索条件 (params タプル) をキーにプロセス全体で共有される。実行中のジョブと
+同じ条件で開始しようとした場合は新しく実行せず、既存のジョブに合流する。
+ジョブは run_scraper の progress_bar / status_text の代わりとしてそのまま渡せる。
+"""
+import threading
+import time
+
+# 終了したジョブを結果の受け取り用に残しておく時間
+FINISHED_JOB_RETENTION_SECONDS = 10 * 60
+
+
+class ScrapeJob:
+    def __init__(self, key):
+        self.key = key
+        self.fraction = 0.0
+        self.status = "開始待ち..."
+        self.error_message = None
+        self.result = None
+        self.subscribers = 1
+        self.started_at = time.time()
+        self.finished_at = None
+        self._done = threading.Event()
+
+    # --- run_scraper から呼ばれる progress_bar / status_text 互換のメソッド ---
+    def progress(self, value):
+        self.fraction = value
+
+    def text(self, body):
+        self.status = body
+
+    def error(self, body):
+        self.error_message = body
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def _run(self, target):
+        try:
+            self.result = target(self)
+        except Exception as e:
+            self.error_message = f"エラーが発生しました: {e}"
+        finally:
+            self.finished_at = time.time()
+            self._done.set()
+
+
+class JobManager:
+    """プロセス全体で 1 つだけ作り、全セッションから共有する。"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _prune(self):
+        now = time.time()
+        for key in [key for key, job in self._jobs.items() if job.done and now - job.finished_at > FINISHED_JOB_RETENTION_SECONDS]:
+            del self._jobs[key]
+
+    def submit(self, key, target):
+        """key のジョブを開始する。同じ key のジョブが実行中ならそれに合流して返す。
+
+        target(job) はバックグラウンドのスレッドで実行され、戻り値が job.result になる。
+        """
+        with self._lock:
+            self._prune()
+            if (job := self._jobs.get(key)) and not job.done:
+                job.subscribers += 1
+                return job
+            job = self._jobs[key] = ScrapeJob(key)
+        threading.Thread(target=job._run, args=(target,), daemon=True, name=f"scrape-job-{key}").start()
+        return job
+
+    def get(self, key):
+        with self._lock:
+            self._prune()
+            return self._jobs.get(key)
+
+    def running_jobs(self):
+        with self._lock:
+            return [job for job in self._jobs.values() if not job.done]
@@ -0,0 +1,32 @@
+"""一覧ページの並行取得。
+
+取得は同時実行数を制限したスレッドプールで行い、結果は必ずページ順に返す。
+ページ送りが省略されていて最終ページが分からない場合は、最終ページより先を
+先読みし、一覧が空のページに当たった時点で打ち切る。
+"""
+import concurrent.futures
+
+
+def iter_pages_in_order(fetch_page, first_page, last_page, max_in_flight=4, speculative_until=None):
+    """first_page から順に (page, rows) を返すジェネレーター。
+
+    fetch_page(page) は (一覧項目があったか, rows) を返す。speculative_until を指定すると
+    last_page より先も speculative_until まで先読みし、項目の無いページで終了する。
+    """
+    end_page = max(last_page, speculative_until or 0)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        pending = {}
+        next_submit = next_yield = first_page
+        try:
+            while next_yield <= end_page:
+                while next_submit <= end_page and next_submit - next_yield < max_in_flight:
+                    pending[next_submit] = executor.submit(fetch_page, next_submit)
+                    next_submit += 1
+                has_items, rows = pending.pop(next_yield).result()
+                if not has_items and next_yield > last_page:
+                    break
+                yield next_yield, rows
+                next_yield += 1
+        finally:
+            for future in pending.values():
+                future.cancel()
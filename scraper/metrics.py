@@ -0,0 +1,187 @@
+"""1 回の実行の計測値。
+
+処理段階ごとの所要時間、URL の種類ごとの応答時間の分布、通信量 (圧縮されたままのバイト数)、リトライ/429 の回数、
+詳細取得中の同時リクエスト数の上限の平均と稼働率 (上限のうち使った割合)、
+同時リクエスト数の推移 (終了時・最大・減らした回数)、
+接続の新規/再利用の数 (共有の接続プールなので同時に動いた他の実行の分も含む)、
+逐次読み込み (streaming.py) で途中まで読んでやめた本文の数と読まずに済んだバイト数、
+取得中の本文の合計の最大値 (memory) を集計する。
+複数スレッド・asyncio のどちらからも記録できる。
+requests の Session には requests_hook() を response フックとして登録し、Retry の代わりに
+RecordingRetry を使う (リトライを使い切って応答が返らなかった分もリトライと 429 に数えるため)。
+"""
+import contextlib
+import math
+import threading
+import time
+
+from urllib3.exceptions import MaxRetryError
+from urllib3.util.retry import Retry
+
+from scraper.http_cache import classify_url
+from scraper.streaming import wire_bytes
+
+# 応答時間のヒストグラムの区切り (ミリ秒)
+LATENCY_BUCKETS_MS = (50, 100, 200, 500, 1000, 2000, 5000)
+
+
+def percentile(sorted_values, q):
+    """昇順に並んだ値の q (0～1) 分位点 (nearest-rank)。空なら None。"""
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))]
+
+
+def timed(metrics, stage):
+    """metrics が None なら何もしない metrics.timed(stage)。"""
+    return metrics.timed(stage) if metrics else contextlib.nullcontext()
+
+
+class RunMetrics:
+    def __init__(self):
+        self.started_at = time.time()
+        self.requests = 0
+        self.bytes_downloaded = 0
+        self.retries = 0
+        self.status_counts = {}
+        self.detail_seconds = 0.0
+        self.slot_usage = None
+        self.concurrency = None
+        self.connections = None
+        self.memory = None
+        self.bodies_streamed = 0
+        self.early_stops = 0
+        self.bytes_unread = 0
+        self._stages = {}
+        self._latency = {}
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage, seconds):
+        with self._lock:
+            count, total = self._stages.get(stage, (0, 0.0))
+            self._stages[stage] = (count + 1, total + seconds)
+
+    @contextlib.contextmanager
+    def timed(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(stage, time.perf_counter() - started)
+
+    def record_response(self, url, seconds, nbytes, status):
+        """通信した応答を 1 件記録する。URL の種類ごとの取得時間 ({種類}_fetch) にも加える。"""
+        url_class = classify_url(url) or 'other'
+        self.add_stage(f"{url_class}_fetch", seconds)
+        bucket = next((i for i, limit in enumerate(LATENCY_BUCKETS_MS) if seconds * 1000 <= limit), len(LATENCY_BUCKETS_MS))
+        with self._lock:
+            self.requests += 1
+            self.bytes_downloaded += nbytes
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            latency = self._latency.setdefault(url_class, {'count': 0, 'seconds': 0.0, 'max': 0.0, 'buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1), 'samples': []})
+            latency['count'] += 1
+            latency['samples'].append(seconds)
+            latency['seconds'] += seconds
+            latency['max'] = max(latency['max'], seconds)
+            latency['buckets'][bucket] += 1
+
+    def record_body(self, read, unread, stopped):
+        """stream=True で読んだ本文を 1 件記録する。unread は途中でやめて受け取らなかったバイト数。"""
+        with self._lock:
+            self.bytes_downloaded += read
+            self.bodies_streamed += 1
+            self.early_stops += stopped
+            self.bytes_unread += unread
+
+    def record_failed_request(self, status=None):
+        """リトライを使い切って応答を返せなかったリクエストを 1 件記録する。"""
+        with self._lock:
+            self.requests += 1
+            if status is not None:
+                self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    def record_retry(self, status=None):
+        """リトライを 1 回記録する。status は record_response で記録していない応答のときだけ渡す。"""
+        with self._lock:
+            self.retries += 1
+            if status is not None:
+                self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    def requests_hook(self):
+        """requests の response フック。キャッシュから返した応答 (raw が無い) は数えない。
+        ただし再検証した応答は、その 304 の通信 (CachingAdapter が revalidation に付ける) を数える。
+        urllib3 が内部で行ったリトライは RecordingRetry が数える。
+
+        stream=True の応答は本文をここでは読まない (応答時間はヘッダーまで、通信量は record_body で数える)。
+        通信量は圧縮されたままのバイト数で数える。
+        """
+        def hook(response, *args, **kwargs):
+            if response.raw is None:
+                if (revalidation := getattr(response, 'revalidation', None)) is not None:
+                    self.record_response(revalidation.url, revalidation.elapsed.total_seconds(), wire_bytes(revalidation, len(revalidation.content)), revalidation.status_code)
+                return response
+            started = time.perf_counter()
+            nbytes = 0 if kwargs.get('stream') else wire_bytes(response, len(response.content))
+            self.record_response(response.url, response.elapsed.total_seconds() + time.perf_counter() - started, nbytes, response.status_code)
+            return response
+        return hook
+
+    def to_dict(self):
+        with self._lock:
+            # detail_worker はワーカーの稼働時間なので、処理段階ではなく workers に出す
+            stages = {stage: {'count': count, 'seconds': round(total, 3)} for stage, (count, total) in self._stages.items() if stage != 'detail_worker'}
+            labels = [f"<={limit}ms" for limit in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+            latency = {url_class: {'count': value['count'], 'mean_ms': round(value['seconds'] / value['count'] * 1000, 1), 'max_ms': round(value['max'] * 1000, 1),
+                                   **_percentiles_ms(sorted(value['samples'])), 'histogram': dict(zip(labels, value['buckets']))}
+                       for url_class, value in self._latency.items()}
+            all_samples = sorted(seconds for value in self._latency.values() for seconds in value['samples'])
+            busy = self._stages.get('detail_worker', (0, 0.0))[1]
+            # 稼働率は詳細取得の間の同時リクエスト数の平均 / 同時リクエスト数の上限 (AdaptiveLimiter が増減させる) の平均
+            limit_seconds, in_flight_seconds = self.slot_usage or (0.0, 0.0)
+            return {
+                'elapsed_seconds': round(time.time() - self.started_at, 3),
+                'stages': stages,
+                'latency': latency,
+                'request_latency': _percentiles_ms(all_samples),
+                'requests': self.requests,
+                'bytes_downloaded': self.bytes_downloaded,
+                'retries': self.retries,
+                'http_429': self.status_counts.get(429, 0),
+                'status_counts': {str(status): count for status, count in sorted(self.status_counts.items(), key=lambda item: str(item[0]))},
+                'workers': {'count': round(limit_seconds / self.detail_seconds, 1) if self.detail_seconds else None, 'busy_seconds': round(busy, 3),
+                            'utilisation': round(in_flight_seconds / limit_seconds, 3) if limit_seconds else None},
+                'concurrency': self.concurrency,
+                'connections': self.connections,
+                'streaming': {'bodies': self.bodies_streamed, 'early_stops': self.early_stops, 'bytes_unread': self.bytes_unread} if self.bodies_streamed else None,
+                'memory': self.memory,
+            }
+
+
+class RecordingRetry(Retry):
+    """リトライのたびに metrics (RunMetrics) に記録する Retry。
+
+    使い切ったときの最後の応答は MaxRetryError になって response フックに届かないので、ここで数える。
+    """
+
+    def __init__(self, *args, metrics=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = metrics
+
+    def new(self, **kw):
+        retry = super().new(**kw)
+        retry.metrics = self.metrics
+        return retry
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        status = response.status if response is not None else None
+        try:
+            retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        except MaxRetryError:
+            if self.metrics: self.metrics.record_failed_request(status)
+            raise
+        if self.metrics: self.metrics.record_retry(status)
+        return retry
+
+
+def _percentiles_ms(sorted_seconds):
+    return {f'p{round(q * 100)}_ms': round(value * 1000, 1) if (value := percentile(sorted_seconds, q)) is not None else None for q in (0.5, 0.95)}
@@ -0,0 +1,277 @@
+"""一覧/プロフィール/口コミページの解析。
+
+解析エンジンは PARSER_BACKENDS から選べる。BeautifulSoup 系 (html.parser, lxml) は
+必要な要素だけを木にする限定解析を行い、selectolax は lexbor で全体を解析する。
+どのエンジンでも返す dict は同じになる (benchmarks/check_parsers.py で確認)。
+"""
+import re
+from collections import namedtuple
+from datetime import datetime, timedelta
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+from bs4.filter import ElementFilter
+
+try:
+    import lxml  # noqa: F401
+except ImportError:  # lxml は任意依存
+    lxml = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # selectolax は任意依存
+    LexborHTMLParser = None
+
+PARSER_BACKENDS = ('html.parser', 'lxml', 'selectolax')
+BASE_SITE_URL = "https://www.cityheaven.net/"
+
+ListPage = namedtuple('ListPage', ['has_items', 'rows', 'last_page', 'truncated'])
+
+
+def available_backends():
+    backends = ['html.parser']
+    if lxml is not None: backends.append('lxml')
+    if LexborHTMLParser is not None: backends.append('selectolax')
+    return backends
+
+
+def default_backend():
+    return 'lxml' if lxml is not None else 'html.parser'
+
+
+# --- 文字列の解析 ---
+def parse_style(style_text):
+    data = {"身長(cm)": None, "バスト(cm)": None, "カップ": None, "ウェスト(cm)": None, "ヒップ(cm)": None}
+    if style_text and (match := re.search(r'T(\d+).*?･(\d+)\((.*?)\)･(\d+)･(\d+)', style_text)):
+        try: data.update({"身長(cm)": int(match.group(1)), "バスト(cm)": int(match.group(2)), "カップ": match.group(3), "ウェスト(cm)": int(match.group(4)), "ヒップ(cm)": int(match.group(5))})
+        except (ValueError, IndexError): pass
+    return data
+
+def parse_age(age_text):
+    if age_text and (match := re.search(r'\d+', age_text)): return int(match.group(0))
+    return None
+
+def parse_sortable_time(text):
+    if text and (match := re.search(r'(\d{1,2}:\d{2})', text)): return match.group(1)
+    return None
+
+def empty_girl_details():
+    return {"本日の出勤予定": None, "次回出勤": None, "ギャラリーURL": [], "WEB人気の星": 999, "週合計出勤日数": 0, "週合計勤務時間": 0.0, "口コミ数": 0}
+
+
+# --- 限定解析 (BeautifulSoup) ---
+class _SectionFilter(ElementFilter):
+    """(タグ名, 属性名, 値) のどれかに一致する要素とその子孫だけを木にする。"""
+
+    def __init__(self, *sections):
+        super().__init__()
+        self.sections = sections
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        for tag_name, attr, value in self.sections:
+            if name == tag_name and attrs and (attr_value := attrs.get(attr)):
+                values = attr_value.split() if isinstance(attr_value, str) else attr_value
+                if value == attr_value or (attr == 'class' and value in values):
+                    return True
+        return False
+
+    def allow_string_creation(self, string):
+        return False
+
+PROFILE_SECTIONS = _SectionFilter(('ul', 'id', 'girl_sukkin'), ('td', 'class', 'shukkin-sugunavitext'), ('img', 'class', 'yoyaku_girlmark'), ('ul', 'id', 'slider'), ('div', 'id', 'girlprofile_diary'))
+REVIEW_SECTIONS = _SectionFilter(('div', 'class', 'review-total'))
+LIST_SECTIONS = _SectionFilter(('li', 'class', 'girls-list'), ('div', 'class', 'shop_nav_list'))
+
+
+def _soup(content, parser, sections):
+    return BeautifulSoup(content, parser, parse_only=sections)
+
+def _lexbor(content):
+    if isinstance(content, bytes):
+        content = content.decode('utf-8', errors='replace')
+    return LexborHTMLParser(content)
+
+def _lexbor_strings(node):
+    """BeautifulSoup の stripped_strings 相当。"""
+    return [text for child in node.traverse(include_text=True) if child.tag == '-text' and (text := child.text_content.strip())]
+
+
+# --- プロフィールページ ---
+def _profile_raw_bs4(soup):
+    schedule = None
+    if schedule_list := soup.find('ul', id='girl_sukkin'):
+        schedule = []
+        for item in schedule_list.find_all('li'):
+            date_tag, dd_tag = item.find('dt'), item.find('dd')
+            schedule.append((date_tag.get_text() if date_tag else None,
+                             dd_tag.get_text(separator='-', strip=True) if dd_tag else None,
+                             dd_tag.get_text(strip=True) if dd_tag else None))
+    next_tag = soup.find('td', class_='shukkin-sugunavitext')
+    star_tag = soup.find('img', class_='yoyaku_girlmark')
+    thumbs = [item.get('data-thumb') for item in slider.find_all('li')] if (slider := soup.find('ul', id='slider')) else []
+    diary_srcs = []
+    if diary := soup.find('div', id='girlprofile_diary'):
+        for item in diary.find_all('div', class_='thm'):
+            img_tag = item.find('img')
+            diary_srcs.append(img_tag.get('src') if img_tag else None)
+    return schedule, next_tag.get_text(strip=True) if next_tag else None, star_tag.get('src', '') if star_tag else None, thumbs, diary_srcs
+
+def _profile_raw_lexbor(tree):
+    schedule = None
+    if schedule_list := tree.css_first('ul#girl_sukkin'):
+        schedule = []
+        for item in schedule_list.css('li'):
+            date_tag, dd_tag = item.css_first('dt'), item.css_first('dd')
+            strings = _lexbor_strings(dd_tag) if dd_tag else None
+            schedule.append((date_tag.text() if date_tag else None,
+                             '-'.join(strings) if dd_tag else None,
+                             ''.join(strings) if dd_tag else None))
+    next_tag = tree.css_first('td.shukkin-sugunavitext')
+    star_tag = tree.css_first('img.yoyaku_girlmark')
+    thumbs = [item.attributes.get('data-thumb') for item in slider.css('li')] if (slider := tree.css_first('ul#slider')) else []
+    diary_srcs = []
+    if diary := tree.css_first('div#girlprofile_diary'):
+        for item in diary.css('div.thm'):
+            img_tag = item.css_first('img')
+            diary_srcs.append(img_tag.attributes.get('src') if img_tag else None)
+    return schedule, ''.join(_lexbor_strings(next_tag)) if next_tag else None, (star_tag.attributes.get('src') or '') if star_tag else None, thumbs, diary_srcs
+
+def _build_profile_details(details, schedule, next_text, star_src, thumbs, diary_srcs, today):
+    total_work_hours, total_work_days = 0.0, 0
+    if schedule:
+        today_str = today.strftime("%-m/%-d")
+        for date_text, dd_dashed, dd_text in schedule:
+            if date_text is not None and today_str in date_text:
+                if dd_dashed is not None:
+                    details["本日の出勤予定"] = dd_dashed
+            if dd_text is not None:
+                if match := re.search(r'(\d{1,2}:\d{1,2}).*?(\d{1,2}:\d{1,2})', dd_text):
+                    total_work_days += 1
+                    try:
+                        start_time = datetime.strptime(match.group(1), '%H:%M')
+                        end_time = datetime.strptime(match.group(2), '%H:%M')
+                        if end_time < start_time:
+                            end_time += timedelta(days=1)
+                        total_work_hours += (end_time - start_time).total_seconds() / 3600
+                    except ValueError:
+                        continue
+    details["週合計出勤日数"], details["週合計勤務時間"] = total_work_days, total_work_hours
+
+    if next_text is not None:
+        details["次回出勤"] = parse_sortable_time(next_text)
+
+    if star_src is not None:
+        if match := re.search(r'yoyaku_(\d+)\.png', star_src):
+            details["WEB人気の星"] = int(match.group(1))
+
+    profile_image_urls = [("https:" + thumb_url).split('?')[0] for thumb_url in thumbs if thumb_url]
+    diary_image_urls = [urljoin(BASE_SITE_URL, src) for src in diary_srcs if src]
+    all_image_urls = list(dict.fromkeys(profile_image_urls + diary_image_urls))
+    details["ギャラリーURL"] = all_image_urls[:6]
+    return details
+
+
+def parse_review_count(content, parser='html.parser'):
+    """口コミページの div.review-total から件数を読む。見つからなければ None。"""
+    if parser == 'selectolax':
+        total_text = node.text() if (node := _lexbor(content).css_first('div.review-total')) else None
+    else:
+        total_text = node.get_text() if (node := _soup(content, parser, REVIEW_SECTIONS).find('div', class_='review-total')) else None
+    if total_text is not None and (count_match := re.search(r'(\d+)件', total_text)):
+        return int(count_match.group(1))
+    return None
+
+
+def parse_shop_review_counts(content, parser='html.parser'):
+    """店舗の口コミ一覧ページから、キャストごとの口コミ件数 {girl_id: 件数} を読む。
+
+    キャスト絞り込み用のリンク (a[href]) や選択肢 (option[value]) のうち、
+    girlid を含み、表示文字列に「N件」があるものだけを数える。
+    """
+    counts = {}
+    if parser == 'selectolax':
+        tree = _lexbor(content)
+        candidates = [(node.attributes.get('href') or '', node.text()) for node in tree.css('a[href*="girlid="]')]
+        candidates += [(node.attributes.get('value') or '', node.text()) for node in tree.css('option[value*="girlid="]')]
+    else:
+        soup = BeautifulSoup(content, parser)
+        candidates = [(node.get('href', ''), node.get_text()) for node in soup.find_all('a', href=re.compile(r'girlid='))]
+        candidates += [(node.get('value', ''), node.get_text()) for node in soup.find_all('option', value=re.compile(r'girlid='))]
+    for target, text in candidates:
+        if (id_match := re.search(r'girlid=(\d+)', target)) and (count_match := re.search(r'(\d+)件', text)):
+            counts[id_match.group(1)] = int(count_match.group(1))
+    return counts
+
+
+def extract_girl_details(profile_url, profile_content, review_content, parser='html.parser', today=None):
+    """取得済みのプロフィール/口コミページの内容から詳細情報を組み立てる。"""
+    details = empty_girl_details()
+    if profile_content is None:
+        return details
+
+    if review_content is not None and (count := parse_review_count(review_content, parser)) is not None:
+        details["口コミ数"] = count
+
+    if parser == 'selectolax':
+        raw = _profile_raw_lexbor(_lexbor(profile_content))
+    else:
+        raw = _profile_raw_bs4(_soup(profile_content, parser, PROFILE_SECTIONS))
+    return _build_profile_details(details, *raw, today or datetime.now())
+
+
+# --- 一覧ページ ---
+def _list_raw_bs4(soup):
+    items = soup.find_all('li', class_='girls-list')
+    raw_items = []
+    for item in items:
+        if not item.find('div', class_='maingirl'): continue
+        girlname = item.find('p', 'girlname')
+        raw_items.append((
+            s.text.strip() if (s := item.find('span', 'soku')) else None,
+            p.get('href') if (p := item.find('a', 'shopimg')) else False,
+            n.text.strip() if (n := girlname.find('a')) else None,
+            a.text.strip() if (a := girlname.find('span')) else '',
+            s.text.strip() if (s := item.find('p', 'girlstyle')) else '',
+            s.text.strip() if (s := item.find('p', 'shopname').find('a')) else None))
+    nav = soup.find('div', class_='shop_nav_list')
+    return bool(items), raw_items, list(nav.stripped_strings) if nav else None
+
+def _list_raw_lexbor(tree):
+    text = lambda node: node.text().strip()
+    items = tree.css('li.girls-list')
+    raw_items = []
+    for item in items:
+        if not item.css_first('div.maingirl'): continue
+        girlname = item.css_first('p.girlname')
+        raw_items.append((
+            text(s) if (s := item.css_first('span.soku')) else None,
+            p.attributes.get('href') if (p := item.css_first('a.shopimg')) else False,
+            text(n) if (n := girlname.css_first('a')) else None,
+            text(a) if (a := girlname.css_first('span')) else '',
+            text(s) if (s := item.css_first('p.girlstyle')) else '',
+            text(s) if (s := item.css_first('p.shopname').css_first('a')) else None))
+    nav = tree.css_first('div.shop_nav_list')
+    return bool(items), raw_items, _lexbor_strings(nav) if nav else None
+
+def _read_pagination(nav_strings):
+    """ページ送りから最終ページ番号を読む。省略記号の後に番号が無ければ最終ページ不明 (truncated) とみなす。"""
+    last_page, truncated = 1, False
+    for text in nav_strings or []:
+        if text.isdigit():
+            last_page = max(last_page, int(text)); truncated = False
+        elif '…' in text or '...' in text:
+            truncated = True
+    return last_page, truncated
+
+def parse_list_page(content, base_url, parser='html.parser'):
+    """一覧ページから基本情報とページ送りを読み取る。"""
+    if parser == 'selectolax':
+        has_items, raw_items, nav_strings = _list_raw_lexbor(_lexbor(content))
+    else:
+        has_items, raw_items, nav_strings = _list_raw_bs4(_soup(content, parser, LIST_SECTIONS))
+    rows = []
+    for soku, href, name, age_text, style_text, shop_name in raw_items:
+        status = soku or "-"
+        profile_link = urljoin(base_url, href) if href is not False else None
+        rows.append({"名前": name if name is not None else "NoName", "年齢": parse_age(age_text), "出勤状況": status, "次回出勤": parse_sortable_time(status), **parse_style(style_text), "プロフィールリンク": profile_link, "店舗名": shop_name})
+    return ListPage(has_items, rows, *_read_pagination(nav_strings))
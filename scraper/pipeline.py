@@ -0,0 +1,183 @@
+"""一覧取得と詳細取得を重ねて実行する producer/consumer パイプライン。
+
+一覧ページから抜き出した行はすぐに上限付きキューへ積まれ、詳細取得ステージが
+順次取り出して処理する。完了した行は呼び出し側スレッドへ逐次返されるので、
+Streamlit の進捗表示は呼び出し側 (スクリプトスレッド) だけで行える。
+"""
+import queue
+import threading
+import time
+
+_END = object()
+
+
+class PipelineState:
+    """進捗表示用のカウンター。一覧側と詳細側の両方から更新される。"""
+
+    def __init__(self, pages_total):
+        self.pages_total = max(pages_total, 1)
+        self.pages_done = 0
+        self.rows_found = 0
+        self.rows_done = 0
+        self.list_finished = False
+        self.started_at = time.time()
+
+    def estimated_total_rows(self):
+        """一覧取得中は、取得済みページの平均件数から総件数を見積もる。"""
+        if self.list_finished or not self.pages_done:
+            return self.rows_found
+        return max(self.rows_found, round(self.rows_found * self.pages_total / self.pages_done))
+
+    def progress(self):
+        """一覧 20% / 詳細 80% の配分で 0.0～1.0 を返す。"""
+        list_ratio = 1.0 if self.list_finished else min(self.pages_done / self.pages_total, 1.0)
+        total_rows = self.estimated_total_rows()
+        detail_ratio = min(self.rows_done / total_rows, 1.0) if total_rows else 0.0
+        return list_ratio * 0.2 + detail_ratio * 0.8
+
+    def remaining_seconds(self):
+        """これまでの詳細処理ペースから残り時間を見積もる。見積もれない間は None。"""
+        # 最初の数件は計算が安定しないため、5件目以降から見積もる
+        if self.rows_done <= 5:
+            return None
+        elapsed_time = time.time() - self.started_at
+        remaining_rows = self.estimated_total_rows() - self.rows_done
+        return int(elapsed_time / self.rows_done * remaining_rows)
+
+
+def thread_detail_stage(process_row, workers):
+    """process_row(row) を workers 本のスレッドで実行する詳細ステージを作る。
+
+    workers に関数 (AdaptiveLimiter.current など) を渡すと、1 行ごとにその値に合わせてスレッドを増減させる。
+    """
+    target = workers if callable(workers) else lambda: workers
+
+    def stage(next_row, emit):
+        cond = threading.Condition()
+        threads, running, finished = [], 0, False
+
+        def start_workers(count):
+            # running は呼ぶ前に増やしておく。start() は cond を持たずに呼ぶ
+            for _ in range(count):
+                thread = threading.Thread(target=worker, daemon=True)
+                thread.start()
+                with cond:
+                    threads.append(thread)
+                    cond.notify_all()
+
+        def stop_worker():
+            # 行が尽きたら、残りのスレッドも終わるだけで補充しない
+            nonlocal running, finished
+            with cond:
+                running -= 1
+                finished = True
+                cond.notify_all()
+
+        def worker():
+            nonlocal running
+            while True:
+                with cond:
+                    wanted = max(target(), 1)
+                    if finished or running > wanted:
+                        running -= 1
+                        cond.notify_all()
+                        return
+                    spawn, running = wanted - running, wanted
+                start_workers(spawn)
+                if (row := next_row()) is None:
+                    return stop_worker()
+                try: details = process_row(row)
+                except Exception: details = None
+                emit(row, details)
+
+        running = 1
+        start_workers(1)
+        # 動いているスレッドが無くなり、始めたスレッドをすべて待ち終えたら終わり
+        joined = 0
+        while True:
+            with cond:
+                while joined == len(threads) and running:
+                    cond.wait()
+                if joined == len(threads):
+                    break
+                thread = threads[joined]
+            thread.join()
+            joined += 1
+    return stage
+
+
+def reuse_details_stage(detail_stage, reusable_details):
+    """reusable_details(row) が詳細を返す行は detail_stage に渡さず、その詳細をそのまま emit する。"""
+    def stage(next_row, emit):
+        def next_changed_row():
+            while (row := next_row()) is not None:
+                if (details := reusable_details(row)) is None:
+                    return row
+                emit(row, details)
+            return None
+        detail_stage(next_changed_row, emit)
+    return stage
+
+
+class DetailPipeline:
+    """produce_pages が返す (page, rows) を detail_stage へ流し、完了した (row, details) を返す。
+
+    detail_stage(next_row, emit) は next_row() が None を返すまで行を処理し、
+    1 行ごとに emit(row, details) を呼ぶ。キューが満杯の間は一覧側が待たされる。
+    """
+
+    def __init__(self, produce_pages, detail_stage, state, queue_size=200):
+        self.produce_pages = produce_pages
+        self.detail_stage = detail_stage
+        self.state = state
+        self._inbox = queue.Queue(maxsize=queue_size)
+        self._outbox = queue.Queue()
+        self._error = None
+
+    def _produce(self):
+        try:
+            for _page, rows in self.produce_pages:
+                for row in rows:
+                    self._inbox.put(row)
+                    self.state.rows_found += 1
+                self.state.pages_done += 1
+        except Exception as e:
+            self._error = e
+        finally:
+            self.state.list_finished = True
+            self._inbox.put(_END)
+
+    def _next_row(self):
+        row = self._inbox.get()
+        if row is _END:
+            self._inbox.put(_END)  # 他のワーカーにも終了を伝える
+            return None
+        return row
+
+    def _emit(self, row, details):
+        self._outbox.put((row, details))
+
+    def _run_details(self):
+        try:
+            self.detail_stage(self._next_row, self._emit)
+        except Exception as e:
+            self._error = self._error or e
+        finally:
+            self._outbox.put(_END)
+
+    def results(self, tick=0.5):
+        """完了した (row, details) を順次返す。tick 秒何も完了しなければ None を返す。"""
+        threading.Thread(target=self._produce, daemon=True).start()
+        threading.Thread(target=self._run_details, daemon=True).start()
+        while True:
+            try:
+                item = self._outbox.get(timeout=tick)
+            except queue.Empty:
+                yield None
+                continue
+            if item is _END:
+                break
+            self.state.rows_done += 1
+            yield item
+        if self._error:
+            raise self._error
@@ -0,0 +1,365 @@
+"""スクレイピング結果の HTML レポート生成。"""
+import json
+import re
+
+import pandas as pd
+
+
+INT_FORMAT_COLUMNS = ['年齢', '身長(cm)', 'バスト(cm)', 'ウェスト(cm)', 'ヒップ(cm)', '口コミ数', '週合計出勤日数', '週合計勤務時間']
+RENAME_MAP = {"身長(cm)": "身長", "バスト(cm)": "バスト", "ウェスト(cm)": "ウェスト", "ヒップ(cm)": "ヒップ", "週合計出勤日数": "出勤日", "週合計勤務時間": "勤務時間", "店舗名": "店舗", "WEB人気の星": "WEB人気", "ギャラリーURL": "ギャラリー"}
+DISPLAY_ORDER = ["チェック", "名前", "ギャラリー", "年齢", "身長", "カップ", "WEB人気", "口コミ数", "出勤日", "勤務時間", "出勤状況", "本日の出勤予定", "次回出勤", "バスト", "ウェスト", "ヒップ", "店舗", "都道府県"]
+# 名前のリンク先。表示はしない列として末尾に置く
+LINK_COLUMN = "プロフィールリンク"
+# カスタムフィルターで範囲を絞る列。ブラウザでは型付き配列にして比較する (欠損は 0)
+RANGE_FILTER_COLUMNS = ["年齢", "ウェスト", "口コミ数", "出勤日"]
+# 次回出勤は 0 時からの分にする (欠損は -1)
+TIME_FILTER_COLUMN = "次回出勤"
+
+
+def minutes_of_day(value):
+    """'18:00' や '翌2:30' を 0 時からの分にする。読めなければ -1。"""
+    if isinstance(value, str) and (match := re.search(r'(\d{1,2}):(\d{2})', value)):
+        return int(match.group(1)) % 24 * 60 + int(match.group(2))
+    return -1
+
+
+def build_filter_index(df_display):
+    """カスタムフィルター用に、列名 → 行順の整数リストの dict を返す。"""
+    index = {col: pd.to_numeric(df_display[col], errors='coerce').fillna(0).round().astype('int64').tolist()
+             for col in RANGE_FILTER_COLUMNS if col in df_display.columns}
+    if TIME_FILTER_COLUMN in df_display.columns:
+        index[TIME_FILTER_COLUMN] = [minutes_of_day(value) for value in df_display[TIME_FILTER_COLUMN]]
+    return index
+
+
+def build_report_data(df):
+    """レポートに埋め込む (列名のリスト, 行データの JSON, フィルター用の列データの JSON) を返す。
+
+    HTML は組み立てず値だけを列単位で整形し、表示用の HTML はブラウザ側で描画時に作る。
+    """
+    df_display = df.rename(columns=RENAME_MAP)
+    df_display['チェック'] = None
+    for col in INT_FORMAT_COLUMNS:
+        col = RENAME_MAP.get(col, col)
+        if col in df_display.columns:
+            df_display[col] = pd.to_numeric(df_display[col], errors='coerce').round().astype('Int64')
+    if 'WEB人気' in df_display.columns:
+        # 21/22/23 が星 3/2/1 個。それ以外は 999 (星なし) として後ろに並べる
+        stars = pd.to_numeric(df_display['WEB人気'], errors='coerce')
+        df_display['WEB人気'] = stars.where(stars.isin([21, 22, 23]), 999).astype(int)
+    columns = [col for col in DISPLAY_ORDER if col in df_display.columns]
+    if LINK_COLUMN in df_display.columns:
+        columns.append(LINK_COLUMN)
+    values = df_display[columns].astype(object)
+    rows = values.where(values.notna(), None).values.tolist()
+    # ギャラリー (frame.GalleryURLs) は URL のリストとして書き出す。</script> で埋め込み先のタグが閉じないようにする
+    rows_json = json.dumps(rows, ensure_ascii=False, separators=(',', ':'), default=list).replace('</', '<\\/')
+    index_json = json.dumps(build_filter_index(df_display), ensure_ascii=False, separators=(',', ':'))
+    return columns, rows_json, index_json
+
+
+def generate_html_report(df, title_text):
+    """ データフレームから高機能なHTMLレポートを生成する
+
+    行データは JSON として埋め込み、DataTables の deferRender で表示中のページの行だけ DOM を作る。
+    ギャラリーの画像は表示範囲に入るまで読み込まない (loading="lazy")。カスタムフィルターは
+    列ごとの型付き配列とチェック状態のビット列に対して評価し、条件は変更時に 1 回だけ読む。
+    """
+    if df.empty:
+        return "<h1>データがありません</h1>"
+
+    columns, rows_json, index_json = build_report_data(df)
+    columns_json = json.dumps(columns, ensure_ascii=False)
+
+    html_template = f"""
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <title>{title_text}</title>
+        <link rel="stylesheet" type="text/css" href="https://cdn.datatables.net/1.13.1/css/jquery.dataTables.css">
+        <script type="text/javascript" charset="utf8" src="https://code.jquery.com/jquery-3.6.0.min.js"></script>
+        <script type="text/javascript" charset="utf8" src="https://cdn.datatables.net/1.13.1/js/jquery.dataTables.js"></script>
+        <style>
+            body {{ font-family: sans-serif; margin: 1.5em; }}
+            table.dataframe th, td {{ padding: 5px 10px; border: 1px solid #ddd; text-align: left; vertical-align: middle; }}
+            thead th {{ background-color: #f0f0f0; cursor: pointer; }}
+            .dataTables_wrapper .dataTables_length, .dataTables_wrapper .dataTables_filter {{ float: left; margin-right: 20px; }}
+            .dataTables_wrapper .dataTables_info {{ clear: both; padding-top: 1em; }}
+            #custom-filters {{ padding: 10px; border: 1px solid #ccc; margin-bottom: 1em; border-radius: 5px; }}
+            .filter-container > strong {{ display: block; margin-bottom: 8px; }}
+            .filter-row {{ display: flex; align-items: center; flex-wrap: wrap; margin-bottom: 5px; }}
+            .filter-row > span {{ margin-right: 15px; margin-bottom: 5px; }}
+            #custom-filters button {{ margin-left: 5px; cursor: pointer; }}
+            .action-buttons {{ padding: 0 0 10px 0; }}
+            .action-buttons button {{ padding: 5px 10px; margin-right: 10px; cursor: pointer; border: 1px solid #ccc; border-radius: 3px; background-color: #f0f0f0;}}
+        </style>
+    </head>
+    <body>
+        <h1>{title_text}</h1>
+        <p>各列のヘッダーでソートできます。画像クリックで次の写真に切り替わります。</p>
+        
+        <div id="custom-filters">
+            <div class="filter-container">
+                <strong>カスタムフィルター</strong>
+                <div class="filter-row">
+                    <span>
+                        次回出勤: <select id="min-time"></select> ～ <select id="max-time"></select>
+                        <button id="reset-time" type="button">リセット</button>
+                    </span>
+                    <span>
+                        年齢: <select id="min-age"></select> ～ <select id="max-age"></select>
+                        <button id="reset-age" type="button">リセット</button>
+                    </span>
+                    <span>
+                        ウェスト: <select id="min-waist"></select> ～ <select id="max-waist"></select>
+                        <button id="reset-waist" type="button">リセット</button>
+                    </span>
+                </div>
+                <div class="filter-row">
+                    <span>
+                        口コミ数: <select id="min-reviews"></select> ～ <select id="max-reviews"></select>
+                        <button id="reset-reviews" type="button">リセット</button>
+                    </span>
+                    <span>
+                        出勤日: <select id="min-workdays"></select> ～ <select id="max-workdays"></select>
+                        <button id="reset-workdays" type="button">リセット</button>
+                    </span>
+                </div>
+            </div>
+        </div>
+
+        <div class="action-buttons">
+            <button id="filter-checked-btn">チェックしたキャストのみを表示</button>
+            <button id="show-all-btn">全てのキャストを表示</button>
+            <button id="download-html-btn">現在の表示をHTMLでダウンロード</button>
+        </div>
+
+        <table id="resultsTable" class="dataframe display compact stripe hover"></table>
+        <script id="report-data" type="application/json">{rows_json}</script>
+        <script id="report-index" type="application/json">{index_json}</script>
+
+        <script>
+        const COLUMNS = {columns_json};
+        const ROWS = JSON.parse(document.getElementById('report-data').textContent);
+        // フィルター用の列データ (列名 → 行順の値)。列名はヘッダー (COLUMNS) にあるものだけ使う
+        const INDEX_DATA = JSON.parse(document.getElementById('report-index').textContent);
+        const FILTER_INDEX = {{}};
+        for (const [title, values] of Object.entries(INDEX_DATA)) {{
+            if (COLUMNS.includes(title)) FILTER_INDEX[title] = Int32Array.from(values);
+        }}
+        // チェック状態は DOM ではなく行番号のビット列で持つ (deferRender では未描画の行に DOM がない)
+        const checkedBits = new Uint32Array((ROWS.length + 31) >>> 5);
+        const isChecked = index => (checkedBits[index >>> 5] & (1 << (index & 31))) !== 0;
+        function setChecked(index, checked) {{
+            if (checked) checkedBits[index >>> 5] |= 1 << (index & 31);
+            else checkedBits[index >>> 5] &= ~(1 << (index & 31));
+        }}
+
+        function escapeHtml(value) {{
+            return String(value).replace(/[&<>"']/g, c => ({{'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}})[c]);
+        }}
+        function renderText(data, type) {{
+            if (data === null || data === undefined) return '';
+            return type === 'display' ? escapeHtml(data) : data;
+        }}
+        function renderCheckbox(data, type, row, meta) {{
+            if (type !== 'display') return '';
+            return `<input type="checkbox" class="row-checkbox" data-row="${{meta.row}}" ${{isChecked(meta.row) ? 'checked' : ''}} style="cursor:pointer; transform: scale(1.5);">`;
+        }}
+        function renderName(data, type, row) {{
+            const link = row[COLUMNS.indexOf('プロフィールリンク')];
+            if (type !== 'display' || !link) return renderText(data, type);
+            return `<a href="${{escapeHtml(link)}}" target="_blank">${{renderText(data, type)}}</a>`;
+        }}
+        function renderGallery(data, type) {{
+            if (type !== 'display' || !Array.isArray(data) || data.length === 0) return '';
+            return `<div class="gallery-container" data-images="${{escapeHtml(JSON.stringify(data))}}" data-current-index="0" onclick="nextImage(this)" style="cursor: pointer;">`
+                + `<img src="${{escapeHtml(data[0])}}" width="120" loading="lazy" onerror="this.style.display='none'"></div>`;
+        }}
+        function renderStars(data, type) {{
+            if (type !== 'display') return data;
+            const stars = {{21: '★★★', 22: '★★☆', 23: '★☆☆'}}[data] || '☆☆☆';
+            return `<span style="font-size: 1.1em; color: #f2b01e;">${{stars}}</span>`;
+        }}
+        const RENDERERS = {{'チェック': renderCheckbox, '名前': renderName, 'ギャラリー': renderGallery, 'WEB人気': renderStars}};
+        const TABLE_COLUMNS = COLUMNS.map((title, i) => ({{
+            title: title, data: i, render: RENDERERS[title] || renderText,
+            visible: title !== 'プロフィールリンク',
+            searchable: !['チェック', 'ギャラリー', 'プロフィールリンク'].includes(title), orderable: !['チェック', 'ギャラリー'].includes(title),
+        }}));
+
+        function nextImage(container) {{
+            if (!container.dataset.images) return;
+            const images = JSON.parse(container.dataset.images);
+            if (images.length === 0) return;
+            let currentIndex = parseInt(container.dataset.currentIndex, 10);
+            currentIndex = (currentIndex + 1) % images.length;
+            container.querySelector('img').src = images[currentIndex];
+            container.dataset.currentIndex = currentIndex;
+        }}
+
+        function setupSelectOptions(selector, options) {{ $(selector).html(options.join('')); }}
+        function setupAgeFilters() {{
+            const opts = ['<option value="">指定なし</option>'];
+            for (let i = 18; i <= 40; i++) opts.push(`<option value="${{i}}">${{i}}歳</option>`);
+            setupSelectOptions('#min-age, #max-age', opts);
+        }}
+        function setupTimeFilters() {{
+            const opts = ['<option value="">指定なし</option>'];
+            const hourSeq = [10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 0, 1, 2, 3, 4, 5];
+            for (const i of hourSeq) {{
+                const h = i.toString().padStart(2, '0');
+                opts.push(`<option value="${{h}}:00">${{h}}:00</option>`);
+            }}
+            setupSelectOptions('#min-time, #max-time', opts);
+        }}
+        function setupWaistFilters() {{
+            const opts = ['<option value="">指定なし</option>'];
+            for (let i = 45; i <= 80; i++) opts.push(`<option value="${{i}}">${{i}}</option>`);
+            setupSelectOptions('#min-waist, #max-waist', opts);
+        }}
+        function setupReviewFilters() {{
+            const opts = ['<option value="">指定なし</option>'];
+            [1, 2, 3, 5, 10, 20, 30, 50, 100].forEach(v => opts.push(`<option value="${{v}}">${{v}}</option>`));
+            setupSelectOptions('#min-reviews, #max-reviews', opts);
+        }}
+        function setupWorkdayFilters() {{
+            const opts = ['<option value="">指定なし</option>'];
+            for (let i = 0; i <= 7; i++) opts.push(`<option value="${{i}}">${{i}}</option>`);
+            setupSelectOptions('#min-workdays, #max-workdays', opts);
+        }}
+
+        function downloadCurrentViewAsHTML() {{
+            const table = $('#resultsTable').DataTable();
+            const clonedDoc = document.documentElement.cloneNode(true);
+            const $clonedDoc = $(clonedDoc);
+            // 未描画の行もあるので、絞り込み後の行を行データから HTML にする
+            const visibleColumns = TABLE_COLUMNS.filter(col => col.visible);
+            const rowHtml = table.rows({{ search: 'applied', order: 'applied' }}).indexes().toArray().map(index => {{
+                const row = ROWS[index];
+                const cells = visibleColumns.map(col => `<td>${{col.render(row[col.data], 'display', row, {{ row: index }})}}</td>`);
+                return `<tr>${{cells.join('')}}</tr>`;
+            }});
+            const newTbody = document.createElement('tbody');
+            newTbody.innerHTML = rowHtml.join('');
+            $clonedDoc.find('#resultsTable tbody').replaceWith(newTbody);
+            $clonedDoc.find('select').each(function() {{
+                const originalId = $(this).attr('id');
+                const originalValue = $('#' + originalId).val();
+                if (originalValue) {{
+                    $(this).find(`option[value='${{originalValue}}']`).attr('selected', 'selected');
+                }}
+            }});
+            $clonedDoc.find('script[src*="jquery.dataTables.js"]').remove();
+            $clonedDoc.find('script:not([src])').remove();
+            const finalHtml = '<!DOCTYPE html>\\n' + clonedDoc.outerHTML;
+            const blob = new Blob([finalHtml], {{ type: 'text/html;charset=utf-8' }});
+            const link = document.createElement('a');
+            const fileName = (document.title || 'report').replace(/[/\\\\?%*:|"<>]/g, '-') + '.html';
+            link.href = URL.createObjectURL(blob);
+            link.download = fileName;
+            document.body.appendChild(link);
+            link.click();
+            document.body.removeChild(link);
+            URL.revokeObjectURL(link.href);
+        }}
+
+        // 範囲で絞る列と、その下限/上限の select
+        const RANGE_FILTERS = [
+            {{ title: '年齢', min: '#min-age', max: '#max-age' }},
+            {{ title: 'ウェスト', min: '#min-waist', max: '#max-waist' }},
+            {{ title: '口コミ数', min: '#min-reviews', max: '#max-reviews' }},
+            {{ title: '出勤日', min: '#min-workdays', max: '#max-workdays' }},
+        ];
+        const TIME_TITLE = '次回出勤';
+        const filterState = {{ checkedOnly: false, ranges: [], time: null }};
+
+        function selectNumber(id) {{ return parseInt($(id).val(), 10); }}
+        function selectMinutes(id) {{
+            const value = $(id).val();
+            if (!value) return NaN;
+            const [h, m] = value.split(':');
+            return parseInt(h, 10) * 60 + parseInt(m, 10);
+        }}
+        // select の値は変更時にここで 1 回だけ読み、行ごとの判定では読まない
+        function captureFilters() {{
+            filterState.ranges = [];
+            for (const f of RANGE_FILTERS) {{
+                const values = FILTER_INDEX[f.title];
+                const min = selectNumber(f.min), max = selectNumber(f.max);
+                if (!values || (isNaN(min) && isNaN(max))) continue;
+                filterState.ranges.push({{ values: values, min: isNaN(min) ? -Infinity : min, max: isNaN(max) ? Infinity : max }});
+            }}
+            const minTime = selectMinutes('#min-time'), maxTime = selectMinutes('#max-time');
+            filterState.time = FILTER_INDEX[TIME_TITLE] && !(isNaN(minTime) && isNaN(maxTime))
+                ? {{ values: FILTER_INDEX[TIME_TITLE], hasMin: !isNaN(minTime), min: isNaN(minTime) ? 0 : minTime, max: isNaN(maxTime) ? 24 * 60 : maxTime }}
+                : null;
+        }}
+        function rowPassesFilters(index) {{
+            if (filterState.checkedOnly && !isChecked(index)) return false;
+            for (const r of filterState.ranges) {{
+                const value = r.values[index];
+                if (value < r.min || value > r.max) return false;
+            }}
+            const t = filterState.time;
+            if (t) {{
+                const value = t.values[index];
+                // 下限 > 上限 (例: 21:00～05:00) は日付をまたぐ範囲
+                const wraps = t.min > t.max;
+                if (value < 0) {{
+                    // 次回出勤の無い行は、下限だけ・下限と上限 (日付をまたがない) を指定したときだけ除く (従来どおり)
+                    if (t.hasMin && !wraps) return false;
+                }} else if (wraps ? (value < t.min && value > t.max) : (value < t.min || value > t.max)) return false;
+            }}
+            return true;
+        }}
+
+        $(document).ready(function() {{
+            $.fn.dataTable.ext.search.push((settings, data, dataIndex) => rowPassesFilters(dataIndex));
+
+            var table = $('#resultsTable').DataTable({{
+                "data": ROWS, "columns": TABLE_COLUMNS, "deferRender": true,
+                "pageLength": 50,
+                "lengthMenu": [[10, 25, 50, 100, -1], [10, 25, 50, 100, "全て"]],
+                "order": [], "dom": '<"top"lfi>rt<"bottom"p><"clear">'
+            }});
+
+            setupAgeFilters(); setupTimeFilters(); setupWaistFilters();
+            setupReviewFilters(); setupWorkdayFilters();
+            function redraw() {{ captureFilters(); table.draw(); }}
+            
+            function setDefaultFiltersAndDraw() {{
+                $('#min-age').val('18');
+                $('#max-age').val('29');
+                $('#min-waist').val('48');
+                $('#max-waist').val('60');
+                const now = new Date();
+                const startHour = (now.getHours() - 3 + 24) % 24;
+                const formattedStart = startHour.toString().padStart(2, '0') + ':00';
+                $('#min-time').val(formattedStart);
+                $('#max-time').val('05:00');
+                redraw();
+            }}
+            setDefaultFiltersAndDraw();
+
+            const allFilters = '#min-age, #max-age, #min-time, #max-time, #min-waist, #max-waist, #min-reviews, #max-reviews, #min-workdays, #max-workdays';
+            $(allFilters).on('change', redraw);
+
+            $('#reset-time').on('click', () => {{ $('#min-time, #max-time').val(''); redraw(); }});
+            $('#reset-age').on('click', () => {{ $('#min-age, #max-age').val(''); redraw(); }});
+            $('#reset-waist').on('click', () => {{ $('#min-waist, #max-waist').val(''); redraw(); }});
+            $('#reset-reviews').on('click', () => {{ $('#min-reviews, #max-reviews').val(''); redraw(); }});
+            $('#reset-workdays').on('click', () => {{ $('#min-workdays, #max-workdays').val(''); redraw(); }});
+
+            $('#filter-checked-btn').on('click', () => {{ filterState.checkedOnly = true; redraw(); }});
+            $('#show-all-btn').on('click', () => {{ filterState.checkedOnly = false; redraw(); }});
+            $('#download-html-btn').on('click', downloadCurrentViewAsHTML);
+            $('#resultsTable tbody').on('change', '.row-checkbox', function() {{
+                setChecked(parseInt(this.dataset.row, 10), this.checked);
+            }});
+        }});
+        </script>
+    </body>
+    </html>
+    """
+    return html_template
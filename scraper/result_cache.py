@@ -0,0 +1,72 @@
+"""スクレイピング結果 (DataFrame) のプロセス内共有キャッシュ。
+
+検索条件をキーに全セッションで共有する。有効期限内の結果はそのまま使い、期限切れでも
+MAX_STALE_SECONDS までは古い結果として返すので、呼び出し側はそれを表示しながら
+バックグラウンドで取り直せる (stale-while-revalidate)。合計サイズが上限を超えたら
+最後に使われたのが古い順に捨てる (LRU)。
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL_SECONDS = 15 * 60
+MAX_STALE_SECONDS = 24 * 3600
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def dataframe_nbytes(df):
+    """DataFrame のおおよそのメモリ使用量。リストの列 (ギャラリーのURLなど) は中の文字列も数える。"""
+    nbytes = int(df.memory_usage(deep=True).sum())
+    for column in df.columns[df.dtypes == object]:
+        for value in df[column]:
+            if isinstance(value, list):
+                nbytes += sum(sys.getsizeof(item) for item in value)
+    return nbytes
+
+
+class CachedResult:
+    def __init__(self, df, stored_at, nbytes):
+        self.df, self.stored_at, self.nbytes = df, stored_at, nbytes
+
+    def age(self):
+        return time.time() - self.stored_at
+
+    def is_fresh(self, ttl):
+        return self.age() < ttl
+
+
+class ResultCache:
+    def __init__(self, ttl=DEFAULT_TTL_SECONDS, max_bytes=DEFAULT_MAX_BYTES, max_stale=MAX_STALE_SECONDS):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_stale = max_stale
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """キャッシュ済みの CachedResult を返す。未保存か古すぎれば None。期限切れかどうかは is_fresh(ttl) で判断する。"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.age() >= self.max_stale:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, df):
+        entry = CachedResult(df, time.time(), dataframe_nbytes(df))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self.total_bytes += entry.nbytes
+            # 入れたばかりのエントリは上限を超えていても残す
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        self.total_bytes -= self._entries.pop(key).nbytes
@@ -0,0 +1,72 @@
+"""口コミ数を店舗単位でまとめて解決する。
+
+同じ店舗のキャストが複数いる場合は、店舗の口コミ一覧ページ ({店舗URL}reviews/) を
+1 回だけ取得して全員分の件数を読み取り、個別の口コミページ取得を省く。
+一覧ページから読めなかったキャストは None を返すので、呼び出し側は従来どおり
+個別ページを取得する。
+
+一覧ページのマークアップは実サイトのページで確かめていない (benchmarks/fixtures/shop_reviews.html と
+代替サーバーのページはこのパーサーに合わせて作ったもの)。実サイトのページをフィクスチャにして確かめるまでは
+ScrapeRun(shop_review_counts=True) (CLI の --shop-review-counts) のときだけ使う。
+"""
+import threading
+
+from scraper.details import split_profile_url
+from scraper.parsing import parse_shop_review_counts
+
+# 店舗一覧を取得しても 1 件も読めない状態が続いたら、以降はまとめ取得をやめる
+GIVE_UP_AFTER_EMPTY_SHOPS = 3
+
+
+class ReviewCountResolver:
+    def __init__(self, fetch, parser='html.parser', min_rows=2):
+        """fetch(url) はページ本文 (失敗時は None) を返す関数。min_rows 人以上いる店舗だけをまとめて取得する。"""
+        self.fetch = fetch
+        self.parser = parser
+        self.min_rows = min_rows
+        self.shop_fetches = self.resolved = self.fallbacks = 0
+        self._rows_per_shop = {}
+        self._shop_counts = {}
+        self._shop_locks = {}
+        self._empty_shops = 0
+        self._lock = threading.Lock()
+
+    def register(self, profile_url):
+        """一覧で見つかったキャストを登録する。店舗ごとの人数をまとめ取得の判断に使う。"""
+        shop_base_url, _girl_id = split_profile_url(profile_url)
+        if shop_base_url:
+            with self._lock:
+                self._rows_per_shop[shop_base_url] = self._rows_per_shop.get(shop_base_url, 0) + 1
+
+    def _counts_for_shop(self, shop_base_url):
+        with self._lock:
+            shop_lock = self._shop_locks.setdefault(shop_base_url, threading.Lock())
+        # 同じ店舗の取得は 1 回だけにし、他のスレッドは結果を待つ
+        with shop_lock:
+            if shop_base_url not in self._shop_counts:
+                content = self.fetch(f"{shop_base_url}reviews/")
+                counts = parse_shop_review_counts(content, self.parser) if content is not None else {}
+                with self._lock:
+                    self.shop_fetches += 1
+                    if not counts: self._empty_shops += 1
+                    self._shop_counts[shop_base_url] = counts
+            return self._shop_counts[shop_base_url]
+
+    def count_for(self, profile_url):
+        """口コミ数を返す。店舗一覧から分からなければ None。"""
+        shop_base_url, girl_id = split_profile_url(profile_url)
+        if not shop_base_url or self._rows_per_shop.get(shop_base_url, 0) < self.min_rows:
+            return None
+        if shop_base_url not in self._shop_counts and self._empty_shops >= GIVE_UP_AFTER_EMPTY_SHOPS and self.resolved == 0:
+            return None
+        count = self._counts_for_shop(shop_base_url).get(girl_id)
+        with self._lock:
+            if count is None: self.fallbacks += 1
+            else: self.resolved += 1
+        return count
+
+    def requests_avoided(self):
+        return self.resolved - self.shop_fetches
+
+    def summary(self):
+        return f"口コミ数: 店舗一覧{self.shop_fetches}件で{self.resolved}人分を取得 (個別取得 {self.fallbacks}人 / リクエスト削減 {self.requests_avoided()}件)"
@@ -0,0 +1,244 @@
+"""ページ本文の逐次読み込みと、取得中の本文の合計サイズの上限。
+
+プロフィール/口コミページは解析に使う要素 (parsing.PROFILE_SECTIONS など) がすべて出てきて閉じた時点で
+読むのをやめる。判定は受け取った断片を順に復号して html.parser で追うだけで、木は作らない。
+要素が揃わなければ最後まで読むので、解析結果は全体を読んだ場合と同じになる。
+
+MemoryBudget は 1 人分 (プロフィールと口コミ) の本文を取得してから解析し終えるまでの合計に上限を設ける。
+上限に達している間は次の人のリクエストを送らずに待つ。待つのは送る前だけで、読み始めた本文や
+同じ人の口コミページの分は待たずに加えるので、予約を持ったまま互いに待ち合うことはない
+(そのため、ページが見込みより大きいと一時的に上限を少し超える)。
+"""
+import codecs
+import contextlib
+import threading
+from html.parser import HTMLParser
+
+from scraper.concurrency import poll_until
+
+CHUNK_SIZE = 16 * 1024
+# 送る前に 1 ページ分として予約するサイズの初期値。以降は読み終えたページのサイズの移動平均にする
+DEFAULT_PAGE_ESTIMATE = 128 * 1024
+ESTIMATE_WEIGHT = 0.2
+# 途中でやめたとき、残りがこれ以下なら読み捨てて接続を使い回す。多ければ接続を閉じる
+DRAIN_MAX_BYTES = 32 * 1024
+DEFAULT_MEMORY_LIMIT = 64 * 1024 * 1024
+_VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+
+class SectionWatcher(HTMLParser):
+    """sections ((タグ名, 属性名, 値) のタプル) それぞれの最初の要素が閉じたら done になる。"""
+
+    def __init__(self, sections, encoding='utf-8'):
+        super().__init__(convert_charrefs=False)
+        self.pending = list(sections)
+        self.done = not self.pending
+        self._open = []  # [タグ名, 同じタグの入れ子の深さ]
+        try:
+            self._decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        except LookupError:
+            # タグと ASCII の属性値が読めればよいので、知らない文字コードは latin-1 で読む
+            self._decoder = codecs.getincrementaldecoder('latin-1')()
+
+    def feed_bytes(self, chunk):
+        self.feed(self._decoder.decode(chunk))
+        return self.done
+
+    def handle_starttag(self, tag, attrs):
+        for entry in self._open:
+            if entry[0] == tag: entry[1] += 1
+        attrs = dict(attrs)
+        for section in self.pending:
+            tag_name, attr, value = section
+            if tag == tag_name and (attr_value := attrs.get(attr)) and (value == attr_value or (attr == 'class' and value in attr_value.split())):
+                self.pending.remove(section)
+                if tag not in _VOID_TAGS:
+                    self._open.append([tag, 1])
+                break
+        self.done = not self.pending and not self._open
+
+    def handle_endtag(self, tag):
+        for entry in self._open:
+            if entry[0] == tag: entry[1] -= 1
+        self._open = [entry for entry in self._open if entry[1] > 0]
+        self.done = not self.pending and not self._open
+
+
+class MemoryBudget:
+    """取得中～解析中の本文の合計バイト数の上限。hold() で 1 人分の予約をまとめ、抜けるときに返す。"""
+
+    def __init__(self, max_bytes=DEFAULT_MEMORY_LIMIT):
+        self.max_bytes = max_bytes
+        self.used = self.peak = self.waits = 0
+        self.page_estimate = DEFAULT_PAGE_ESTIMATE
+        self._cond = threading.Condition()
+
+    def _fits(self, nbytes):
+        # 何も持っていなければ上限より大きくても通す (止まらないように)
+        return not self.used or self.used + nbytes <= self.max_bytes
+
+    def try_reserve(self, nbytes):
+        with self._cond:
+            if not self._fits(nbytes):
+                return False
+            self._add(nbytes)
+            return True
+
+    def reserve(self, nbytes):
+        with self._cond:
+            if not self._fits(nbytes):
+                self.waits += 1
+                while not self._fits(nbytes):
+                    self._cond.wait()
+            self._add(nbytes)
+
+    async def reserve_async(self, nbytes):
+        if self.try_reserve(nbytes):
+            return
+        with self._cond:
+            self.waits += 1
+        await poll_until(lambda: self.try_reserve(nbytes))
+
+    def grow(self, nbytes):
+        """待たずに加える。"""
+        with self._cond:
+            self._add(nbytes)
+
+    def release(self, nbytes):
+        with self._cond:
+            self.used -= nbytes
+            self._cond.notify_all()
+
+    def observe(self, page_bytes):
+        """読み終えたページのサイズを次からの見込みに反映する。"""
+        with self._cond:
+            self.page_estimate = int(self.page_estimate * (1 - ESTIMATE_WEIGHT) + page_bytes * ESTIMATE_WEIGHT)
+
+    def _add(self, nbytes):
+        self.used += nbytes
+        self.peak = max(self.peak, self.used)
+
+    @contextlib.contextmanager
+    def hold(self):
+        holder = BudgetHold(self)
+        try:
+            yield holder
+        finally:
+            self.release(holder.nbytes)
+
+    def to_dict(self):
+        with self._cond:
+            return {'max_bytes': self.max_bytes, 'peak_bytes': self.peak, 'waits': self.waits}
+
+
+class BudgetHold:
+    """1 人分の予約。最初の admit() だけが上限で待ち、2 ページ目以降は待たずに加える。"""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.nbytes = 0
+
+    def admit(self):
+        estimate = self.budget.page_estimate
+        if self.nbytes: self.budget.grow(estimate)
+        else: self.budget.reserve(estimate)
+        self.nbytes += estimate
+        return estimate
+
+    async def admit_async(self):
+        estimate = self.budget.page_estimate
+        if self.nbytes: self.budget.grow(estimate)
+        else: await self.budget.reserve_async(estimate)
+        self.nbytes += estimate
+        return estimate
+
+    def settle(self, reserved, actual):
+        """admit() で reserved 予約したページの実際のサイズが actual だった。"""
+        if actual > reserved: self.budget.grow(actual - reserved)
+        elif actual < reserved: self.budget.release(reserved - actual)
+        self.nbytes += actual - reserved
+        self.budget.observe(actual)
+
+
+def _content_length(headers):
+    try: return int(headers.get('Content-Length'))
+    except (TypeError, ValueError): return None
+
+
+def _complete_tags(body):
+    # 途中でやめた本文は最後のタグの終わりで切る (文字の途中で切れた断片を解析器に渡さない)
+    return body[:body.rfind(b'>') + 1]
+
+
+def wire_bytes(response, decoded):
+    """requests の応答について、ここまでに受け取った本文のバイト数 (圧縮されたまま)。
+
+    urllib3 は chunked の本文を数えないので、そのときは復号後の decoded で代える。
+    """
+    return response.raw.tell() or decoded
+
+
+def _received_async(response):
+    # 古い aiohttp は数えないので None
+    return getattr(response.content, 'total_raw_bytes', None)
+
+
+def wire_bytes_async(response, decoded):
+    """aiohttp の応答について wire_bytes と同じもの。"""
+    return _received_async(response) or decoded
+
+
+def read_body(response, sections=None, metrics=None):
+    """requests の応答 (stream=True) の本文を読む。sections が揃ったらそこでやめて、読んだ分だけを返す。
+
+    通信量と残りのバイト数は Content-Length と同じく圧縮されたままの大きさで数える。
+    """
+    length = _content_length(response.headers)
+    watcher = SectionWatcher(sections, response.encoding or 'utf-8') if sections else None
+    chunks = response.iter_content(CHUNK_SIZE)
+    parts, stopped = [], False
+    for chunk in chunks:
+        parts.append(chunk)
+        if watcher and watcher.feed_bytes(chunk):
+            stopped = True
+            break
+    unread = 0
+    if stopped:
+        # chunked (Content-Length が無い) なら残りは分からないので閉じる
+        remaining = length - response.raw.tell() if length is not None else None
+        if remaining is not None and remaining <= DRAIN_MAX_BYTES:
+            # 少しなら読み捨てて、接続をプールに返す
+            for _ in chunks: pass
+        else:
+            unread = remaining or 0
+            response.close()
+    body = b''.join(parts)
+    if metrics:
+        metrics.record_body(wire_bytes(response, len(body)), unread, stopped)
+    return _complete_tags(body) if stopped else body
+
+
+async def read_body_async(response, sections=None, metrics=None):
+    """aiohttp の応答の本文を read_body と同じように読む。"""
+    length = _content_length(response.headers)
+    watcher = SectionWatcher(sections, response.charset or 'utf-8') if sections else None
+    parts, stopped = [], False
+    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+        parts.append(chunk)
+        if watcher and watcher.feed_bytes(chunk):
+            stopped = True
+            break
+    unread = 0
+    if stopped:
+        received = _received_async(response)
+        remaining = length - received if length is not None and received is not None else None
+        if remaining is not None and remaining <= DRAIN_MAX_BYTES:
+            await response.content.read()
+        else:
+            # 閉じれば残りは受け取らず、復号もしない
+            unread = remaining or 0
+            response.close()
+    body = b''.join(parts)
+    if metrics:
+        metrics.record_body(wire_bytes_async(response, len(body)), unread, stopped)
+    return _complete_tags(body) if stopped else body
@@ -0,0 +1,22 @@
+"""サイトへの負荷を抑えるためのレート制限。"""
+import threading
+import time
+
+
+class RateLimiter:
+    """リクエスト開始間隔を 1/rate_per_sec 秒以上に保つ。複数スレッドから共有できる。"""
+
+    def __init__(self, rate_per_sec):
+        self.interval = 1.0 / rate_per_sec if rate_per_sec else 0.0
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_time)
+            self._next_time = start + self.interval
+        if start > now:
+            time.sleep(start - now)
@@ -1,474 +1,93 @@
 import streamlit as st
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from bs4 import BeautifulSoup
 import pandas as pd
-from urllib.parse import urljoin
-import re
-import time
-from datetime import datetime, timedelta
-import concurrent.futures
 import json
+import os
+import time
+from datetime import date
+from scraper import async_fetch, parsing
+from scraper.conditions import AGE_MAP, BUST_MAP, FEATURE_MAP, HEIGHT_MAP, PREFECTURES, build_targets
+from scraper.core import MAX_CONCURRENCY, ScrapeRun
+from scraper.frame import frame_to_rows
+from scraper.jobs import JobManager
+from scraper.report import generate_html_report
+from scraper.result_cache import ResultCache
 
 # --- データ定義 ---
-PREFECTURES = {'東京': 'tokyo', '大阪': 'osaka', '香川': 'kagawa', '北海道': 'hokkaido', '青森': 'aomori', '岩手': 'iwate', '宮城': 'miyagi', '秋田': 'akita', '山形': 'yamagata', '福島': 'fukushima', '茨城': 'ibaraki', '栃木': 'tochigi', '群馬': 'gunma', '埼玉': 'saitama', '千葉': 'chiba', '神奈川': 'kanagawa', '新潟': 'niigata', '富山': 'toyama', '石川': 'ishikawa', '福井': 'fui', '山梨': 'yamanashi', '長野': 'nagano', '岐阜': 'gifu', '静岡': 'shizuoka', '愛知': 'aichi', '三重': 'mie', '滋賀': 'shiga', '京都': 'kyoto', '兵庫': 'hyogo', '奈良': 'nara', '和歌山': 'wakayama', '鳥取': 'tottori', '島根': 'shimane', '岡山': 'okayama', '広島': 'hiroshima', '山口': 'yamaguchi', '徳島': 'tokushima', '愛媛': 'ehime', '高知': 'kochi', '福岡': 'fukuoka', '佐賀': 'saga', '長崎': 'nagasaki', '熊本': 'kumamoto', '大分': 'oita', '宮崎': 'miyazaki', '鹿児島': 'kagoshima', '沖縄': 'okinawa'}
-AGE_MAP = {'18～19歳': 'typ101', '20～24歳': 'typ102', '25～29歳': 'typ103'}
-HEIGHT_MAP = {'149cm以下': 'typ201', '150～154cm': 'typ202', '155～159cm': 'typ203', '160～164cm': 'typ204'}
-BUST_MAP = {'Aカップ': 'typ301', 'Bカップ': 'typ302', 'Cカップ': 'typ303', 'Dカップ': 'typ304', 'Eカップ': 'typ305', 'Fカップ': 'typ306', 'Gカップ': 'typ307', 'Hカップ': 'typ308', 'Iカップ以上': 'typ309'}
-FEATURE_MAP = {'ニューフェイス': 'typ601', 'お店NO.1・2・3': 'typ602'}
-ALL_TYPS = {**AGE_MAP, **HEIGHT_MAP, **BUST_MAP, **FEATURE_MAP}
-
-
-# --- ヘルパー関数群 ---
-def create_gallery_html(image_urls):
-    if not isinstance(image_urls, list) or not image_urls: return ''
-    image_paths_json = json.dumps(image_urls)
-    return f'<div class="gallery-container" data-images=\'{image_paths_json}\' data-current-index="0" onclick="nextImage(this)" style="cursor: pointer;"><img src="{image_urls[0]}" width="120" onerror="this.style.display=\'none\'"></div>'
-
-def create_star_rating_html(sort_number):
-    try: num = int(sort_number)
-    except (ValueError, TypeError): num = 999
-    if num == 21: stars = "★★★"
-    elif num == 22: stars = "★★☆"
-    elif num == 23: stars = "★☆☆"
-    else: stars = "☆☆☆"; num = 999
-    sort_key_html = f'<span style="display: none;">{num:03d}</span>'
-    star_display_html = f'<span style="font-size: 1.1em; color: #f2b01e;">{stars}</span>'
-    return f'{sort_key_html}{star_display_html}'
+FETCH_ENGINES = {'スレッド': 'thread', 'asyncio': 'asyncio'}
+STAGE_LABELS = {'list_fetch': '一覧取得', 'profile_fetch': 'プロフィール取得', 'review_fetch': '口コミ取得', 'list_parse': '一覧解析', 'detail_parse': '詳細解析', 'report': 'レポート生成'}
 
-def parse_style(style_text):
-    data = {"身長(cm)": None, "バスト(cm)": None, "カップ": None, "ウェスト(cm)": None, "ヒップ(cm)": None}
-    if style_text and (match := re.search(r'T(\d+).*?･(\d+)\((.*?)\)･(\d+)･(\d+)', style_text)):
-        try: data.update({"身長(cm)": int(match.group(1)), "バスト(cm)": int(match.group(2)), "カップ": match.group(3), "ウェスト(cm)": int(match.group(4)), "ヒップ(cm)": int(match.group(5))})
-        except (ValueError, IndexError): pass
-    return data
 
-def parse_age(age_text):
-    if age_text and (match := re.search(r'\d+', age_text)): return int(match.group(0))
-    return None
+def run_scraper(params, progress_bar, status_text, fetch_engine="thread", parser="html.parser", use_cache=False, previous_rows=None, max_concurrency=MAX_CONCURRENCY, parse_processes=0):
+    """params は (targets, hide_inactive, page_limit)。進捗を progress_bar / status_text に表示しながら ScrapeRun を実行する。"""
+    targets, hide_inactive, page_limit = params
 
-def parse_sortable_time(text):
-    if text and (match := re.search(r'(\d{1,2}:\d{2})', text)): return match.group(1)
-    return None
-
-def get_girl_details(profile_url, session, headers):
-    """個人のプロフィールページから詳細情報を取得する。画像取得ロジックを改良。"""
-    details = {"本日の出勤予定": None, "次回出勤": None, "ギャラリーURL": [], "WEB人気の星": 999, "週合計出勤日数": 0, "週合計勤務時間": 0.0, "口コミ数": 0}
-    if not profile_url:
-        return details
-    
-    base_site_url = "https://www.cityheaven.net/"
+    def on_progress(fraction, message):
+        progress_bar.progress(fraction)
+        status_text.text(message)
 
+    run = ScrapeRun(targets, hide_inactive=hide_inactive, page_limit=page_limit, fetch_engine=fetch_engine, parser=parser, use_cache=use_cache, on_progress=on_progress, previous_rows=previous_rows, max_concurrency=max_concurrency, parse_processes=parse_processes)
     try:
-        res = session.get(profile_url, timeout=30, headers=headers)
-        if res.status_code != 200:
-            return details
-        soup = BeautifulSoup(res.content, 'html.parser')
-    except requests.exceptions.RequestException:
-        return details
-
-    girl_id_match = re.search(r'girlid-(\d+)', profile_url)
-    shop_url_match = re.search(r'(https?://.*?/girlid-)', profile_url)
-    
-    if girl_id_match and shop_url_match:
-        girl_id = girl_id_match.group(1)
-        shop_base_url = shop_url_match.group(1).replace('girlid-', '')
-        review_url = f"{shop_base_url}reviews/?girlid={girl_id}"
-        try:
-            review_res = session.get(review_url, timeout=10, headers=headers)
-            if review_res.status_code == 200:
-                review_soup = BeautifulSoup(review_res.content, 'html.parser')
-                if (total_div := review_soup.find('div', class_='review-total')) and (count_match := re.search(r'(\d+)件', total_div.get_text())):
-                    details["口コミ数"] = int(count_match.group(1))
-        except requests.exceptions.RequestException:
-            pass
-
-    total_work_hours, total_work_days = 0.0, 0
-    if schedule_list := soup.find('ul', id='girl_sukkin'):
-        today_str = datetime.now().strftime("%-m/%-d")
-        for item in schedule_list.find_all('li'):
-            if (date_tag := item.find('dt')) and today_str in date_tag.get_text():
-                if dd_tag := item.find('dd'):
-                    details["本日の出勤予定"] = dd_tag.get_text(separator='-', strip=True)
-            if dd_tag := item.find('dd'):
-                time_text = dd_tag.get_text(strip=True)
-                if match := re.search(r'(\d{1,2}:\d{1,2}).*?(\d{1,2}:\d{1,2})', time_text):
-                    total_work_days += 1
-                    try:
-                        start_time = datetime.strptime(match.group(1), '%H:%M')
-                        end_time = datetime.strptime(match.group(2), '%H:%M')
-                        if end_time < start_time:
-                            end_time += timedelta(days=1)
-                        total_work_hours += (end_time - start_time).total_seconds() / 3600
-                    except ValueError:
-                        continue
-    details["週合計出勤日数"], details["週合計勤務時間"] = total_work_days, total_work_hours
-
-    if next_time_tag := soup.find('td', class_='shukkin-sugunavitext'):
-        details["次回出勤"] = parse_sortable_time(next_time_tag.get_text(strip=True))
-
-    if star_img_tag := soup.find('img', class_='yoyaku_girlmark'):
-        if match := re.search(r'yoyaku_(\d+)\.png', star_img_tag.get('src', '')):
-            details["WEB人気の星"] = int(match.group(1))
-
-    profile_image_urls = []
-    if slider := soup.find('ul', id='slider'):
-        for item in slider.find_all('li'):
-            if thumb_url := item.get('data-thumb'):
-                full_url = "https:" + thumb_url
-                clean_url = full_url.split('?')[0]
-                profile_image_urls.append(clean_url)
-    
-    diary_image_urls = []
-    if diary := soup.find('div', id='girlprofile_diary'):
-        for item in diary.find_all('div', class_='thm'):
-            if (img_tag := item.find('img')) and (src := img_tag.get('src')):
-                diary_image_urls.append(urljoin(base_site_url, src))
-
-    all_image_urls = list(dict.fromkeys(profile_image_urls + diary_image_urls))
-    details["ギャラリーURL"] = all_image_urls[:6]
-
-    return details
-
-
-def run_scraper(params, progress_bar, status_text):
-    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36'}
-    base_url = "https://www.cityheaven.net/"
-    prefecture_path, filter_path, hide_inactive, page_limit = params
-    target_path = f"{prefecture_path}/{filter_path}"
-    all_girls_data = []
-    with requests.Session() as session:
-        retry_strategy = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        session.mount("https://", adapter); session.mount("http://", adapter)
-        try:
-            status_text.text("総ページ数を確認中...")
-            first_page_url = urljoin(base_url, target_path)
-            response = session.get(first_page_url, timeout=30, headers=headers)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-            last_page = 1
-            if pagination_div := soup.find('div', class_='shop_nav_list'):
-                for link in pagination_div.find_all('a'):
-                    if link.text.isdigit() and (page_num := int(link.text)) > last_page: last_page = page_num
-            pages_to_scrape = last_page
-            if page_limit: 
-                pages_to_scrape = min(pages_to_scrape, page_limit)
-
-            initial_girl_list = []
-            for page in range(1, pages_to_scrape + 1):
-                status_text.text(f"ページ {page}/{pages_to_scrape} の基本情報を取得中...")
-                progress_bar.progress(page / pages_to_scrape * 0.2)
-                if page > 1:
-                    response = session.get(urljoin(base_url, f"{target_path}{page}/"), timeout=30, headers=headers)
-                    soup = BeautifulSoup(response.content, 'html.parser')
-                for item in soup.find_all('li', class_='girls-list'):
-                    if not item.find('div', class_='maingirl'): continue
-                    status = (s.text.strip() if (s := item.find('span', 'soku')) else None) or "-"
-                    profile_link = urljoin(base_url, p.get('href')) if (p := item.find('a', 'shopimg')) else None
-                    data = {"名前": n.text.strip() if (n := item.find('p', 'girlname').find('a')) else "NoName", "年齢": parse_age(a.text.strip() if (a := item.find('p', 'girlname').find('span')) else ''), "出勤状況": status, "次回出勤": parse_sortable_time(status), **parse_style(s.text.strip() if (s := item.find('p', 'girlstyle')) else ''), "プロフィールリンク": profile_link, "店舗名": (s.text.strip() if (s := item.find('p', 'shopname').find('a')) else None)}
-                    initial_girl_list.append(data)
-                time.sleep(0.5)
-
-            # ▼▼▼ ここからが修正箇所 ▼▼▼
-            total_people = len(initial_girl_list)
-            status_text.text(f"全{total_people}人の詳細情報を並列取得中...")
-            
-            # 詳細情報取得の開始時間を記録
-            start_time_details = time.time()
-            
-            with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-                future_to_data = {executor.submit(get_girl_details, data['プロフィールリンク'], session, headers): data for data in initial_girl_list}
-                progress_count = 0
-                
-                for future in concurrent.futures.as_completed(future_to_data):
-                    original_data = future_to_data[future]
-                    try:
-                        details = future.result()
-                        original_data.update(details)
-                        if original_data["次回出勤"] is None: original_data["次回出勤"] = details.get("次回出勤")
-                        all_girls_data.append(original_data)
-                    except Exception: 
-                        pass
-                    
-                    progress_count += 1
-                    
-                    # --- 残り時間の計算と表示 ---
-                    # 最初の数件は計算が安定しないため、5件目以降から表示
-                    if progress_count > 5:
-                        elapsed_time = time.time() - start_time_details
-                        avg_time_per_person = elapsed_time / progress_count
-                        remaining_people = total_people - progress_count
-                        remaining_seconds = int(avg_time_per_person * remaining_people)
-                        
-                        if remaining_seconds > 0:
-                            remaining_minutes = remaining_seconds // 60
-                            remaining_seconds_part = remaining_seconds % 60
-                            time_estimate_str = f" - 残り約{remaining_minutes}分{remaining_seconds_part}秒"
-                        else:
-                            time_estimate_str = ""
-                        
-                        # ステータステキストを更新
-                        status_text.text(f"全{total_people}人の詳細情報を並列取得中... ({progress_count}/{total_people}){time_estimate_str}")
-                    else:
-                        # 最初の5件までは進捗のみ表示
-                        status_text.text(f"全{total_people}人の詳細情報を並列取得中... ({progress_count}/{total_people})")
-
-                    # プログレスバーを更新
-                    progress_bar.progress(0.2 + (progress_count / total_people * 0.8))
-            
-            if not all_girls_data:
-                status_text.text("データが取得できませんでした。"); return pd.DataFrame()
-            df = pd.DataFrame(all_girls_data)
-            if hide_inactive: df = df[df['次回出勤'].notna()].copy()
-            status_text.text("処理完了！"); return df
-        except Exception as e:
-            st.error(f"エラーが発生しました: {e}"); return pd.DataFrame()
-
-
-def generate_html_report(df, title_text):
-    """ データフレームから高機能なHTMLレポートを生成する """
-    if df.empty:
-        return "<h1>データがありません</h1>"
-
-    df_display = df.copy()
-    df_display['チェック'] = '<input type="checkbox" class="row-checkbox" style="cursor:pointer; transform: scale(1.5);">'
-    df_display['名前'] = df_display.apply(lambda row: f'<a href="{row["プロフィールリンク"]}" target="_blank">{row["名前"]}</a>' if pd.notna(row['プロフィールリンク']) else row['名前'], axis=1)
-    df_display['ギャラリー'] = df_display['ギャラリーURL'].apply(create_gallery_html)
-    df_display['WEB人気'] = df_display['WEB人気の星'].apply(create_star_rating_html)
-    int_format_cols = ['年齢', '身長(cm)', 'バスト(cm)', 'ウェスト(cm)', 'ヒップ(cm)', '口コミ数', '週合計出勤日数', '週合計勤務時間']
-    for col in int_format_cols:
-        if col in df_display.columns:
-            df_display[col] = df_display[col].apply(lambda x: f"{x:.0f}" if pd.notna(x) else "")
-    df_display.fillna("", inplace=True)
-    rename_map = {"身長(cm)": "身長", "バスト(cm)": "バスト", "ウェスト(cm)": "ウェスト", "ヒップ(cm)": "ヒップ", "週合計出勤日数": "出勤日", "週合計勤務時間": "勤務時間", "店舗名": "店舗"}
-    df_display.rename(columns=rename_map, inplace=True)
-    desired_order = ["チェック", "名前", "ギャラリー", "年齢", "身長", "カップ", "WEB人気", "口コミ数", "出勤日", "勤務時間", "出勤状況", "本日の出勤予定", "次回出勤", "バスト", "ウェスト", "ヒップ", "店舗"]
-    existing_columns = [col for col in desired_order if col in df_display.columns]
-    df_display = df_display[existing_columns]
-    html_table = df_display.to_html(escape=False, index=False, table_id='resultsTable', classes='display compact stripe hover')
-
-    html_template = f"""
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <title>{title_text}</title>
-        <link rel="stylesheet" type="text/css" href="https://cdn.datatables.net/1.13.1/css/jquery.dataTables.css">
-        <script type="text/javascript" charset="utf8" src="https://code.jquery.com/jquery-3.6.0.min.js"></script>
-        <script type="text/javascript" charset="utf8" src="https://cdn.datatables.net/1.13.1/js/jquery.dataTables.js"></script>
-        <style>
-            body {{ font-family: sans-serif; margin: 1.5em; }}
-            table.dataframe th, td {{ padding: 5px 10px; border: 1px solid #ddd; text-align: left; vertical-align: middle; }}
-            thead th {{ background-color: #f0f0f0; cursor: pointer; }}
-            .dataTables_wrapper .dataTables_length, .dataTables_wrapper .dataTables_filter {{ float: left; margin-right: 20px; }}
-            .dataTables_wrapper .dataTables_info {{ clear: both; padding-top: 1em; }}
-            #custom-filters {{ padding: 10px; border: 1px solid #ccc; margin-bottom: 1em; border-radius: 5px; }}
-            .filter-container > strong {{ display: block; margin-bottom: 8px; }}
-            .filter-row {{ display: flex; align-items: center; flex-wrap: wrap; margin-bottom: 5px; }}
-            .filter-row > span {{ margin-right: 15px; margin-bottom: 5px; }}
-            #custom-filters button {{ margin-left: 5px; cursor: pointer; }}
-            .action-buttons {{ padding: 0 0 10px 0; }}
-            .action-buttons button {{ padding: 5px 10px; margin-right: 10px; cursor: pointer; border: 1px solid #ccc; border-radius: 3px; background-color: #f0f0f0;}}
-        </style>
-    </head>
-    <body>
-        <h1>{title_text}</h1>
-        <p>各列のヘッダーでソートできます。画像クリックで次の写真に切り替わります。</p>
-        
-        <div id="custom-filters">
-            <div class="filter-container">
-                <strong>カスタムフィルター</strong>
-                <div class="filter-row">
-                    <span>
-                        次回出勤: <select id="min-time"></select> ～ <select id="max-time"></select>
-                        <button id="reset-time" type="button">リセット</button>
-                    </span>
-                    <span>
-                        年齢: <select id="min-age"></select> ～ <select id="max-age"></select>
-                        <button id="reset-age" type="button">リセット</button>
-                    </span>
-                    <span>
-                        ウェスト: <select id="min-waist"></select> ～ <select id="max-waist"></select>
-                        <button id="reset-waist" type="button">リセット</button>
-                    </span>
-                </div>
-                <div class="filter-row">
-                    <span>
-                        口コミ数: <select id="min-reviews"></select> ～ <select id="max-reviews"></select>
-                        <button id="reset-reviews" type="button">リセット</button>
-                    </span>
-                    <span>
-                        出勤日: <select id="min-workdays"></select> ～ <select id="max-workdays"></select>
-                        <button id="reset-workdays" type="button">リセット</button>
-                    </span>
-                </div>
-            </div>
-        </div>
-
-        <div class="action-buttons">
-            <button id="filter-checked-btn">チェックしたキャストのみを表示</button>
-            <button id="show-all-btn">全てのキャストを表示</button>
-            <button id="download-html-btn">現在の表示をHTMLでダウンロード</button>
-        </div>
-
-        {html_table}
-
-        <script>
-        function nextImage(container) {{
-            if (!container.dataset.images) return;
-            const images = JSON.parse(container.dataset.images);
-            if (images.length === 0) return;
-            let currentIndex = parseInt(container.dataset.currentIndex, 10);
-            currentIndex = (currentIndex + 1) % images.length;
-            container.querySelector('img').src = images[currentIndex];
-            container.dataset.currentIndex = currentIndex;
-        }}
-
-        function setupSelectOptions(selector, options) {{ $(selector).html(options.join('')); }}
-        function setupAgeFilters() {{
-            const opts = ['<option value="">指定なし</option>'];
-            for (let i = 18; i <= 40; i++) opts.push(`<option value="${{i}}">${{i}}歳</option>`);
-            setupSelectOptions('#min-age, #max-age', opts);
-        }}
-        function setupTimeFilters() {{
-            const opts = ['<option value="">指定なし</option>'];
-            const hourSeq = [10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 0, 1, 2, 3, 4, 5];
-            for (const i of hourSeq) {{
-                const h = i.toString().padStart(2, '0');
-                opts.push(`<option value="${{h}}:00">${{h}}:00</option>`);
-            }}
-            setupSelectOptions('#min-time, #max-time', opts);
-        }}
-        function setupWaistFilters() {{
-            const opts = ['<option value="">指定なし</option>'];
-            for (let i = 45; i <= 80; i++) opts.push(`<option value="${{i}}">${{i}}</option>`);
-            setupSelectOptions('#min-waist, #max-waist', opts);
-        }}
-        function setupReviewFilters() {{
-            const opts = ['<option value="">指定なし</option>'];
-            [1, 2, 3, 5, 10, 20, 30, 50, 100].forEach(v => opts.push(`<option value="${{v}}">${{v}}</option>`));
-            setupSelectOptions('#min-reviews, #max-reviews', opts);
-        }}
-        function setupWorkdayFilters() {{
-            const opts = ['<option value="">指定なし</option>'];
-            for (let i = 0; i <= 7; i++) opts.push(`<option value="${{i}}">${{i}}</option>`);
-            setupSelectOptions('#min-workdays, #max-workdays', opts);
-        }}
-
-        function downloadCurrentViewAsHTML() {{
-            const table = $('#resultsTable').DataTable();
-            const clonedDoc = document.documentElement.cloneNode(true);
-            const $clonedDoc = $(clonedDoc);
-            const newTbody = document.createElement('tbody');
-            table.rows({{ search: 'applied' }}).nodes().each(function(row) {{
-                const originalCheckbox = $(row).find('.row-checkbox');
-                const clonedRow = row.cloneNode(true);
-                if (originalCheckbox.is(':checked')) {{
-                    $(clonedRow).find('.row-checkbox').attr('checked', 'checked');
-                }} else {{
-                    $(clonedRow).find('.row-checkbox').removeAttr('checked');
-                }}
-                newTbody.appendChild(clonedRow);
-            }});
-            $clonedDoc.find('#resultsTable tbody').replaceWith(newTbody);
-            $clonedDoc.find('select').each(function() {{
-                const originalId = $(this).attr('id');
-                const originalValue = $('#' + originalId).val();
-                if (originalValue) {{
-                    $(this).find(`option[value='${{originalValue}}']`).attr('selected', 'selected');
-                }}
-            }});
-            $clonedDoc.find('script[src*="jquery.dataTables.js"]').remove();
-            $clonedDoc.find('script:not([src])').remove();
-            const finalHtml = '<!DOCTYPE html>\\n' + clonedDoc.outerHTML;
-            const blob = new Blob([finalHtml], {{ type: 'text/html;charset=utf-8' }});
-            const link = document.createElement('a');
-            const fileName = (document.title || 'report').replace(/[/\\\\?%*:|"<>]/g, '-') + '.html';
-            link.href = URL.createObjectURL(blob);
-            link.download = fileName;
-            document.body.appendChild(link);
-            link.click();
-            document.body.removeChild(link);
-            URL.revokeObjectURL(link.href);
-        }}
-
-        $(document).ready(function() {{
-            let isCheckedFilterActive = false;
-
-            $.fn.dataTable.ext.search.push(
-                function(settings, data, dataIndex) {{
-                    if (isCheckedFilterActive) {{
-                        var rowNode = table.row(dataIndex).node();
-                        if (!$(rowNode).find('.row-checkbox').is(':checked')) return false;
-                    }}
-                    
-                    const ageColIdx = 3, reviewColIdx = 7, workdayColIdx = 8, timeColIdx = 12, waistColIdx = 14;
-                    const getVal = (id) => parseInt($(id).val(), 10);
-                    const minAge = getVal('#min-age'), maxAge = getVal('#max-age');
-                    const minWaist = getVal('#min-waist'), maxWaist = getVal('#max-waist');
-                    const minReviews = getVal('#min-reviews'), maxReviews = getVal('#max-reviews');
-                    const minWorkdays = getVal('#min-workdays'), maxWorkdays = getVal('#max-workdays');
-                    const cellAge = parseInt(data[ageColIdx]) || 0;
-                    const cellWaist = parseInt(data[waistColIdx]) || 0;
-                    const cellReviews = parseInt(data[reviewColIdx]) || 0;
-                    const cellWorkdays = parseInt(data[workdayColIdx]) || 0;
-                    const cellTime = data[timeColIdx] || "";
-                    const minTime = $('#min-time').val(), maxTime = $('#max-time').val();
-                    if ((!isNaN(minAge) && cellAge < minAge) || (!isNaN(maxAge) && cellAge > maxAge)) return false;
-                    if ((!isNaN(minWaist) && cellWaist < minWaist) || (!isNaN(maxWaist) && cellWaist > maxWaist)) return false;
-                    if ((!isNaN(minReviews) && cellReviews < minReviews) || (!isNaN(maxReviews) && cellReviews > maxReviews)) return false;
-                    if ((!isNaN(minWorkdays) && cellWorkdays < minWorkdays) || (!isNaN(maxWorkdays) && cellWorkdays > maxWorkdays)) return false;
-                    if (minTime && maxTime && minTime > maxTime) {{
-                        if (cellTime < minTime && cellTime > maxTime) return false;
-                    }} else {{
-                        if ((minTime && cellTime < minTime) || (maxTime && cellTime > maxTime)) return false;
-                    }}
-                    return true;
-                }}
-            );
-
-            var table = $('#resultsTable').DataTable({{ 
-                "pageLength": 50,
-                "lengthMenu": [[10, 25, 50, 100, -1], [10, 25, 50, 100, "全て"]],
-                "order": [], "dom": '<"top"lfi>rt<"bottom"p><"clear">'
-            }});
-
-            setupAgeFilters(); setupTimeFilters(); setupWaistFilters();
-            setupReviewFilters(); setupWorkdayFilters();
-            
-            function setDefaultFiltersAndDraw() {{
-                $('#min-age').val('18');
-                $('#max-age').val('29');
-                $('#min-waist').val('48');
-                $('#max-waist').val('60');
-                const now = new Date();
-                const startHour = (now.getHours() - 3 + 24) % 24;
-                const formattedStart = startHour.toString().padStart(2, '0') + ':00';
-                $('#min-time').val(formattedStart);
-                $('#max-time').val('05:00');
-                table.draw();
-            }}
-            setDefaultFiltersAndDraw();
-
-            const allFilters = '#min-age, #max-age, #min-time, #max-time, #min-waist, #max-waist, #min-reviews, #max-reviews, #min-workdays, #max-workdays';
-            $(allFilters).on('change', () => table.draw());
+        return run.to_dataframe()
+    except Exception as e:
+        status_text.error(f"エラーが発生しました: {e}"); return pd.DataFrame()
+
+
+def show_metrics_panel(run_metrics):
+    """実行の計測結果を折りたたみパネルに表示し、JSON で保存できるようにする。"""
+    with st.expander("計測結果"):
+        workers = run_metrics['workers']
+        cols = st.columns(4)
+        cols[0].metric("経過時間", f"{run_metrics['elapsed_seconds']:.1f}秒")
+        connections = run_metrics.get('connections')
+        connections_help = f" / 接続: 新規{connections['new_connections']}・再利用{connections['reused_connections']}" if connections else ""
+        streaming = run_metrics.get('streaming')
+        streaming_help = f" / 途中で読み終えたページ {streaming['early_stops']}件 (読まずに済んだ分 {streaming['bytes_unread'] / 1024 / 1024:.1f}MB)" if streaming else ""
+        cols[1].metric("通信量", f"{run_metrics['bytes_downloaded'] / 1024 / 1024:.1f}MB", help=f"{run_metrics['requests']}リクエスト{connections_help}{streaming_help}")
+        cols[2].metric("リトライ / 429", f"{run_metrics['retries']} / {run_metrics['http_429']}")
+        concurrency = run_metrics.get('concurrency')
+        concurrency_help = f" / 同時接続: 最大{concurrency['peak']}・終了時{concurrency['limit']} (上限{concurrency['max']}、{concurrency['decreases']}回減らした)" if concurrency else ""
+        cols[3].metric("ワーカー稼働率", f"{workers['utilisation']:.0%}" if workers['utilisation'] is not None else "-", help=f"同時リクエスト数の上限 (平均{workers['count']}) のうち使った割合{concurrency_help}")
+        st.caption("処理段階ごとの時間 (並列に実行された分は合計)")
+        stages = pd.DataFrame.from_dict(run_metrics['stages'], orient='index').rename(index=STAGE_LABELS, columns={'count': '回数', 'seconds': '秒'})
+        st.dataframe(stages)
+        if run_metrics['latency']:
+            st.caption("URL の種類ごとの応答時間")
+            latency = pd.DataFrame({url_class: {'件数': value['count'], '平均ms': value['mean_ms'], 'p50ms': value['p50_ms'], 'p95ms': value['p95_ms'], '最大ms': value['max_ms'], **value['histogram']}
+                                    for url_class, value in run_metrics['latency'].items()}).T
+            st.dataframe(latency)
+        st.download_button("計測結果を JSON で保存", json.dumps(run_metrics, ensure_ascii=False, indent=1), file_name="scrape-metrics.json", mime="application/json")
+
+
+@st.cache_resource
+def get_job_manager():
+    """全セッションで共有するジョブ管理。同じ条件の実行中ジョブには合流する。"""
+    return JobManager()
+
+
+@st.cache_resource
+def get_result_cache():
+    """全セッションで共有する検索結果のキャッシュ。"""
+    return ResultCache()
+
+
+def start_scrape_job(params, result_key, previous_df=None, **options):
+    """取得をバックグラウンドのジョブとして始める。同じ条件の実行中ジョブがあればそれに合流する。
+
+    previous_df (同じ日に取得した結果) があれば、一覧だけ取り直して変わった人の詳細だけを取得する。
+    """
+    result_cache = get_result_cache()
 
-            $('#reset-time').on('click', () => {{ $('#min-time, #max-time').val(''); table.draw(); }});
-            $('#reset-age').on('click', () => {{ $('#min-age, #max-age').val(''); table.draw(); }});
-            $('#reset-waist').on('click', () => {{ $('#min-waist, #max-waist').val(''); table.draw(); }});
-            $('#reset-reviews').on('click', () => {{ $('#min-reviews, #max-reviews').val(''); table.draw(); }});
-            $('#reset-workdays').on('click', () => {{ $('#min-workdays, #max-workdays').val(''); table.draw(); }});
+    def run_and_cache(job):
+        # 本日の出勤予定などは日をまたぐと使い回せない
+        reusable = previous_df is not None and not previous_df.empty and date.fromtimestamp(previous_df.attrs.get('fetched_at', 0)) == date.today()
+        df = run_scraper(params, job, job, previous_rows=frame_to_rows(previous_df) if reusable else None, **options)
+        if job.error_message is None:
+            result_cache.put(result_key, df)
+        return df
 
-            $('#filter-checked-btn').on('click', () => {{ isCheckedFilterActive = true; table.draw(); }});
-            $('#show-all-btn').on('click', () => {{ isCheckedFilterActive = false; table.draw(); }});
-            $('#download-html-btn').on('click', downloadCurrentViewAsHTML);
-        }});
-        </script>
-    </body>
-    </html>
-    """
-    return html_template
+    job = get_job_manager().submit(result_key, run_and_cache)
+    st.session_state.job_key = result_key
+    st.session_state.joined_job = job.subscribers > 1
 
 
 # --- Streamlit UI ---
@@ -476,11 +95,14 @@ st.set_page_config(page_title="CityHeaven Scraper", layout="wide")
 st.title("🏙️ CityHeaven Scraper")
 
 if 'result_df' not in st.session_state: st.session_state.result_df = None
-if 'is_running' not in st.session_state: st.session_state.is_running = False
+if 'job_key' not in st.session_state: st.session_state.job_key = None
+if 'job_error' not in st.session_state: st.session_state.job_error = None
+if 'result_stored_at' not in st.session_state: st.session_state.result_stored_at = None
+if 'filter_sets' not in st.session_state: st.session_state.filter_sets = []
 
 with st.sidebar:
     st.header("検索条件")
-    prefecture_name = st.selectbox("都道府県", options=list(PREFECTURES.keys()), index=0)
+    prefecture_names = st.multiselect("都道府県", options=list(PREFECTURES.keys()), default=list(PREFECTURES.keys())[:1], help="複数選ぶとまとめて取得します")
     
     with st.expander("特徴で絞り込み"):
         selected_features = []
@@ -505,6 +127,17 @@ with st.sidebar:
             if st.checkbox(name):
                 selected_features.append(name)
 
+        # 複数の絞り込み条件をまとめて取得する場合は、条件を追加していく
+        if st.button("この条件をまとめて取得に追加"):
+            if tuple(selected_features) not in st.session_state.filter_sets:
+                st.session_state.filter_sets.append(tuple(selected_features))
+        if st.session_state.filter_sets:
+            for i, feature_set in enumerate(st.session_state.filter_sets, 1):
+                st.caption(f"条件{i}: {'・'.join(feature_set) if feature_set else '特徴指定なし'}")
+            if st.button("追加した条件をクリア"):
+                st.session_state.filter_sets = []
+                st.rerun()
+
     page_limit = st.selectbox(
         "最大取得ページ数",
         options=['全て', 1, 2, 5, 10, 15, 20, 25, 30, 50, 100],
@@ -512,28 +145,81 @@ with st.sidebar:
     )
     
     hide_inactive = st.checkbox("本日出勤者のみを表示", value=True)
+    engine_options = list(FETCH_ENGINES.keys()) if async_fetch.is_available() else list(FETCH_ENGINES.keys())[:1]
+    fetch_engine = FETCH_ENGINES[st.selectbox("取得エンジン", options=engine_options, index=0)]
+    parser_options = parsing.available_backends()
+    parser = st.selectbox("HTMLパーサー", options=parser_options, index=parser_options.index(parsing.default_backend()))
+    use_cache = st.checkbox("レスポンスキャッシュを使う", value=False, help="取得したページをディスクに保存し、次回以降の実行で再利用します")
+    parse_processes = (os.cpu_count() or 1) if st.checkbox("解析を別プロセスで行う", value=False, help=f"詳細ページの解析を {os.cpu_count()} 個のプロセスで行い、取得側のスレッドは通信だけにします") else 0
+    max_concurrency = st.slider("同時接続数の上限", min_value=1, max_value=64, value=MAX_CONCURRENCY, help="応答が速い間はこの数まで同時接続を増やし、429 やエラー、応答の遅れがあると減らします")
     # ▼▼▼ 変更点: デバッグモードのチェックボックスを削除 ▼▼▼
     # debug_mode = st.checkbox("デバッグモード (1ページのみ取得)")
-    start_button = st.button("スクレイピング開始", type="primary", disabled=st.session_state.is_running)
+    start_button = st.button("スクレイピング開始", type="primary", disabled=st.session_state.job_key is not None or not prefecture_names)
+
+feature_sets = st.session_state.filter_sets or [tuple(selected_features)]
+title_text = f"{'・'.join(prefecture_names)} / {' | '.join('・'.join(feature_set) if feature_set else '特徴指定なし' for feature_set in feature_sets)}"
 
 if start_button:
-    st.session_state.is_running = True
-    st.session_state.result_df = None
-    selected_typ_codes = [ALL_TYPS[name] for name in selected_features]
-    filter_path = f"girl-list/{'-'.join(selected_typ_codes)}/" if selected_typ_codes else "girl-list/"
+    st.session_state.job_error = None
+    targets = build_targets(prefecture_names, feature_sets)
     # ▼▼▼ 変更点: 引数からdebug_modeを削除 ▼▼▼
-    params = (PREFECTURES[prefecture_name], filter_path, hide_inactive, None if page_limit == '全て' else int(page_limit))
-    st.subheader("処理状況"); progress_bar = st.progress(0); status_text = st.empty()
-    result = run_scraper(params, progress_bar, status_text)
-    st.session_state.result_df = result
-    st.session_state.is_running = False
-    st.rerun()
+    params = (targets, hide_inactive, None if page_limit == '全て' else int(page_limit))
+    # 取得エンジンやパーサーは結果に影響しないので、キーは取得先のパスと絞り込み条件だけにする
+    result_key = (tuple(target_path for _label, _name, target_path in targets), params[1], params[2])
+    result_cache = get_result_cache()
+    cached = result_cache.get(result_key)
+    st.session_state.result_df = cached.df if cached else None
+    st.session_state.result_stored_at = cached.stored_at if cached else None
+    st.session_state.result_params = (params, result_key)
+
+    # 期限内の結果があればそのまま使い、期限切れなら古い結果を表示したまま、変わった人だけ取り直す
+    if cached is None or not cached.is_fresh(result_cache.ttl):
+        start_scrape_job(params, result_key, cached.df if cached else None, fetch_engine=fetch_engine, parser=parser, use_cache=use_cache, max_concurrency=max_concurrency, parse_processes=parse_processes)
+
+@st.fragment(run_every=1)
+def show_job_progress():
+    job = get_job_manager().get(st.session_state.job_key)
+    if job is None or job.done:
+        if job is not None:
+            st.session_state.job_error = job.error_message
+            # 取り直しに失敗したときは古い結果を残す
+            if job.error_message is None or st.session_state.result_df is None:
+                st.session_state.result_df = job.result if job.result is not None else pd.DataFrame()
+                st.session_state.result_stored_at = None
+        st.session_state.job_key = None
+        st.rerun()
+    st.subheader("処理状況")
+    if st.session_state.get("joined_job"):
+        st.info("同じ条件で実行中の検索に合流しました。")
+    st.progress(job.fraction)
+    st.text(job.status)
+
+if st.session_state.job_key is not None:
+    show_job_progress()
+
+if st.session_state.job_error:
+    st.error(st.session_state.job_error)
 
 if st.session_state.result_df is not None:
     st.header("スクレイピング結果")
+    if st.session_state.result_stored_at:
+        age_minutes = int(time.time() - st.session_state.result_stored_at) // 60
+        refreshing = " 最新の結果をバックグラウンドで取得中です。" if st.session_state.job_key is not None else ""
+        st.info(f"{age_minutes}分前に取得した結果を表示しています。{refreshing}")
+    if run_summary := st.session_state.result_df.attrs.get('run_summary'):
+        st.caption(run_summary)
+    if st.session_state.get('result_params') and st.session_state.job_key is None and not st.session_state.result_df.empty:
+        if st.button("最新の状態に更新", help="一覧だけを取り直し、新しく出てきた人と出勤状況が変わった人だけ詳細を取得します"):
+            start_scrape_job(*st.session_state.result_params, st.session_state.result_df, fetch_engine=fetch_engine, parser=parser, use_cache=use_cache, max_concurrency=max_concurrency, parse_processes=parse_processes)
+            st.session_state.result_stored_at = st.session_state.result_df.attrs.get('fetched_at')
+            st.rerun()
     if not st.session_state.result_df.empty:
-        title_text = f"{prefecture_name} / {'・'.join(selected_features) if selected_features else '特徴指定なし'}"
+        report_started = time.perf_counter()
         html_report = generate_html_report(st.session_state.result_df, title_text)
+        report_seconds = time.perf_counter() - report_started
         st.components.v1.html(html_report, height=800, scrolling=True)
+        if run_metrics := st.session_state.result_df.attrs.get('run_metrics'):
+            # 結果はセッション間で共有されるので、レポート生成時間はコピーに足す
+            show_metrics_panel({**run_metrics, 'stages': {**run_metrics['stages'], 'report': {'count': 1, 'seconds': round(report_seconds, 3)}}})
     else:
         st.warning("条件に合うデータが見つかりませんでした。")
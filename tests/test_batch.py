@@ -0,0 +1,33 @@
+import pytest
+import requests
+
+from scraper.conditions import build_targets
+from scraper.core import ScrapeRun
+from scraper.metrics import RecordingRetry
+from standin_server import start_server
+
+
+@pytest.fixture
+def standin(monkeypatch):
+    # 大阪の一覧の 2 ページ目だけ常に 500。リトライの待ち時間は省く
+    monkeypatch.setattr(RecordingRetry, 'get_backoff_time', lambda self: 0)
+    server, base_url = start_server(latency=0.0, pages=3, per_page=10, fail_pattern=r'^/osaka/girl-list/2/$')
+    yield base_url
+    server.shutdown()
+
+
+def test_batch_keeps_going_when_a_later_list_page_fails(standin):
+    run = ScrapeRun(build_targets(['東京', '大阪'], [()]), hide_inactive=False, base_url=standin)
+    rows = list(run.rows())
+    # 代替サーバーの一覧はどの都道府県でも同じ人なので、行は東京の 3 ページ分
+    assert len(rows) == 30
+    tokyo, osaka = run.target_progress
+    assert (tokyo.failed, tokyo.pages_done) == (False, 3)
+    assert (osaka.failed, osaka.pages_done) == (True, 1)
+    assert '一覧取得失敗: 大阪' in run.summary()
+
+
+def test_single_target_still_raises(standin):
+    run = ScrapeRun(build_targets(['大阪'], [()]), hide_inactive=False, base_url=standin)
+    with pytest.raises(requests.exceptions.RetryError):
+        list(run.rows())
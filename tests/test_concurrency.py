@@ -0,0 +1,153 @@
+import asyncio
+import concurrent.futures
+import threading
+import types
+
+import pytest
+import requests
+
+from scraper import concurrency
+from scraper.concurrency import BASELINE_DECAY, LATENCY_WINDOW, AdaptiveLimiter, LimitedAdapter, poll_until
+from scraper.streaming import MemoryBudget
+from standin_server import start_server
+
+
+def complete(limiter, count, seconds=0.01, statuses=(200,)):
+    for _ in range(count):
+        assert limiter.try_acquire()
+        limiter.release(seconds, list(statuses))
+
+
+def test_increases_by_about_one_per_window():
+    # 成功ごとに 1/limit ずつ増える
+    limiter = AdaptiveLimiter(initial=4, max_limit=32)
+    complete(limiter, 4)
+    assert limiter.current() == 4
+    complete(limiter, 1)
+    assert limiter.current() == 5
+    complete(limiter, 5)
+    assert limiter.current() == 6
+
+
+def test_never_exceeds_max_limit():
+    limiter = AdaptiveLimiter(initial=4, max_limit=6)
+    complete(limiter, 200)
+    assert limiter.current() == 6
+    assert limiter.to_dict() == {'limit': 6, 'peak': 6, 'max': 6, 'decreases': 0}
+    for _ in range(6):
+        assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+
+
+def test_usage_integrates_limit_and_in_flight(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(concurrency, 'time', types.SimpleNamespace(monotonic=lambda: clock[0]))
+    limiter = AdaptiveLimiter(initial=4, max_limit=32)
+    assert limiter.try_acquire() and limiter.try_acquire()
+    clock[0] = 10.0
+    limiter.release(0.01, [200])  # 4.25 になるが、使える上限は 4 のまま
+    clock[0] = 20.0
+    # 上限 4 × 20 秒、同時 2 × 10 秒 + 1 × 10 秒
+    assert limiter.usage() == (80.0, 30.0)
+
+
+@pytest.mark.parametrize('statuses', [[429], [503], [None], [429, 200]])
+def test_halves_on_throttling_and_errors(statuses):
+    limiter = AdaptiveLimiter(initial=8, max_limit=32)
+    complete(limiter, 8)
+    before = limiter.limit
+    complete(limiter, 1, statuses=statuses)
+    assert limiter.limit == pytest.approx(before * 0.5)
+    assert limiter.decreases == 1
+
+
+def test_one_decrease_per_window():
+    limiter = AdaptiveLimiter(initial=8, max_limit=32)
+    complete(limiter, 8)
+    complete(limiter, 3, statuses=[429])
+    assert limiter.decreases == 1
+    assert limiter.current() == 4
+
+
+def test_never_below_min_limit():
+    limiter = AdaptiveLimiter(initial=2, min_limit=1, max_limit=32)
+    for _ in range(20):
+        complete(limiter, 4, statuses=[429])
+    assert limiter.current() == 1
+
+
+def test_decreases_when_p95_latency_doubles():
+    limiter = AdaptiveLimiter(initial=10, max_limit=10)
+    complete(limiter, LATENCY_WINDOW, seconds=0.1)
+    complete(limiter, LATENCY_WINDOW, seconds=0.1 * BASELINE_DECAY)
+    assert limiter.decreases == 0
+    complete(limiter, LATENCY_WINDOW, seconds=0.5)
+    assert limiter.decreases == 1
+    assert limiter.current() == 7
+
+
+@pytest.fixture
+def trickling_server():
+    server, base_url = start_server(latency=0.0, trickle=0.2)
+    yield server, base_url
+    server.shutdown()
+
+
+def test_slot_is_held_until_the_body_is_read(trickling_server):
+    _server, base_url = trickling_server
+    limiter = AdaptiveLimiter(initial=2, max_limit=2)
+    with requests.Session() as session:
+        session.mount('http://', LimitedAdapter(limiter))
+        response = session.get(f'{base_url}shop/girlid-1/', stream=True)
+        assert limiter.in_flight == 1
+        response.content
+        assert limiter.in_flight == 0
+        response = session.get(f'{base_url}shop/girlid-1/', stream=True)
+        response.close()
+        assert limiter.in_flight == 0
+        session.get(f'{base_url}shop/girlid-1/')
+        assert limiter.in_flight == 0
+        # 読まずに捨てた応答の枠も返る
+        session.get(f'{base_url}shop/girlid-1/', stream=True)
+        assert limiter.in_flight == 0
+
+
+def test_body_transfers_stay_within_the_limit(trickling_server):
+    server, base_url = trickling_server
+    limiter = AdaptiveLimiter(initial=2, max_limit=2)
+    with requests.Session() as session:
+        session.mount('http://', LimitedAdapter(limiter))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=12) as executor:
+            sizes = list(executor.map(lambda n: len(session.get(f'{base_url}shop/girlid-{n}/').content), range(12)))
+    assert all(sizes)
+    assert server.stats['peak_in_flight'] <= 2
+    # 応答時間は本文の送信 (trickle) を含む
+    assert min(limiter._latencies) >= 0.15
+
+
+def test_poll_until_waits_for_a_thread_to_free_the_slot():
+    # スレッドが持っている枠が空くまで、イベントループを止めずに待つ
+    limiter, budget = AdaptiveLimiter(initial=1, max_limit=1), MemoryBudget(100)
+    assert limiter.try_acquire() and budget.try_reserve(80)
+    threading.Timer(0.05, limiter.release, (0.01, [200])).start()
+    threading.Timer(0.1, budget.release, (80,)).start()
+    calls = []
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.001)
+
+        task = asyncio.create_task(ticker())
+        await poll_until(lambda: calls.append(1) or limiter.try_acquire())
+        await budget.reserve_async(50)
+        task.cancel()
+        return ticks
+
+    assert asyncio.run(main()) > 5
+    assert 1 < len(calls) < 20 and limiter.in_flight == 1
+    assert budget.to_dict()['waits'] == 1 and budget.used == 50
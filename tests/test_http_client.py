@@ -0,0 +1,70 @@
+import socket
+
+import pytest
+import requests
+
+from scraper.http_client import SharedConnectionPool, SharedPoolAdapter
+from standin_server import start_server
+
+
+@pytest.fixture(scope='module')
+def base_url():
+    server, base_url = start_server(latency=0.0)
+    yield base_url
+    server.shutdown()
+
+
+def get(shared, url, pool_maxsize=10):
+    with requests.Session() as session:
+        session.mount('http://', SharedPoolAdapter(shared, pool_maxsize=pool_maxsize))
+        return session.get(url).status_code
+
+
+def test_connections_are_reused_across_sessions(base_url):
+    shared = SharedConnectionPool()
+    assert [get(shared, f'{base_url}shop/girlid-{n}/') for n in range(3)] == [200] * 3
+    stats = shared.stats.snapshot()
+    assert (stats['new_connections'], stats['reused_connections']) == (1, 2)
+    assert (stats['dns_misses'], stats['dns_hits']) == (1, 0)
+
+
+def test_widening_keeps_warm_connections(base_url):
+    shared = SharedConnectionPool(maxsize=4)
+    get(shared, f'{base_url}shop/girlid-1/', pool_maxsize=4)
+    pool = shared.manager.connection_from_url(base_url)
+    assert pool.pool.maxsize == 4
+    # 別の実行がより大きな同時接続数で始まっても、既存の接続は捨てずにプールを広げる
+    get(shared, f'{base_url}shop/girlid-2/', pool_maxsize=64)
+    assert shared.manager.connection_from_url(base_url) is pool
+    assert pool.pool.maxsize == 64
+    stats = shared.stats.snapshot()
+    assert (stats['new_connections'], stats['reused_connections']) == (1, 1)
+
+
+def test_new_pools_start_at_the_current_size(base_url):
+    shared = SharedConnectionPool(maxsize=4)
+    shared.ensure_maxsize(32)
+    shared.ensure_maxsize(8)
+    get(shared, f'{base_url}shop/girlid-1/', pool_maxsize=8)
+    assert shared.manager.connection_from_url(base_url).pool.maxsize == 32
+
+
+def test_falls_back_to_the_next_address(base_url, monkeypatch):
+    # 1 つ目のアドレス (127.0.0.2) は待ち受けていないので接続を拒否され、2 つ目で接続する
+    port = int(base_url.rsplit(':', 1)[1].strip('/'))
+    getaddrinfo = socket.getaddrinfo
+
+    def fake_getaddrinfo(host, *args, **kwargs):
+        if host != 'standin.test':
+            return getaddrinfo(host, *args, **kwargs)
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (address, port)) for address in ('127.0.0.2', '127.0.0.1')]
+
+    monkeypatch.setattr(socket, 'getaddrinfo', fake_getaddrinfo)
+    shared = SharedConnectionPool()
+    assert get(shared, f'http://standin.test:{port}/shop/girlid-1/') == 200
+    assert shared.dns.resolve('standin.test', port) == ['127.0.0.1', '127.0.0.2']
+    # 接続を閉じても、次は接続できたアドレスから試す
+    shared.manager.clear()
+    assert get(shared, f'http://standin.test:{port}/shop/girlid-2/') == 200
+    stats = shared.stats.snapshot()
+    assert (stats['new_connections'], stats['dns_misses']) == (2, 1)
@@ -0,0 +1,71 @@
+import time
+
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+
+from scraper.http_cache import CachingAdapter, ResponseCache
+from scraper.metrics import RecordingRetry, RunMetrics, percentile
+from standin_server import start_server
+
+
+def test_percentile_nearest_rank():
+    assert percentile([], 0.5) is None
+    assert percentile([1, 2, 3, 4], 0.5) == 2
+    assert percentile(list(range(1, 101)), 0.95) == 95
+
+
+def fetch(server_options, urls):
+    server, base_url = start_server(latency=0.0, **server_options)
+    metrics = RunMetrics()
+    try:
+        with requests.Session() as session:
+            retry = RecordingRetry(total=3, backoff_factor=0, status_forcelist=[429, 500, 502, 503, 504], metrics=metrics)
+            session.mount('http://', HTTPAdapter(max_retries=retry))
+            session.hooks['response'].append(metrics.requests_hook())
+            for url in urls:
+                try:
+                    session.get(base_url + url, timeout=10)
+                except requests.exceptions.RetryError:
+                    pass
+        return metrics.to_dict(), server.stats
+    finally:
+        server.shutdown()
+
+
+def test_exhausted_retries_are_counted():
+    # 全部 429 なので応答は返らず RetryError になる
+    metrics, server_stats = fetch({'throttle_rate': 1.0}, ['tokyo/girl-list/'])
+    assert (server_stats['requests'], server_stats['429']) == (4, 4)
+    assert (metrics['requests'], metrics['retries'], metrics['http_429']) == (1, 3, 4)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_every_attempt_is_counted_once(seed):
+    metrics, server_stats = fetch({'throttle_rate': 0.3, 'error_rate': 0.2, 'seed': seed}, [f'shop/girlid-{n}/' for n in range(30)])
+    assert metrics['requests'] == 30
+    assert metrics['requests'] + metrics['retries'] == server_stats['requests']
+    assert metrics['http_429'] == server_stats.get('429', 0)
+    assert sum(count for status, count in metrics['status_counts'].items() if status.startswith('5')) == server_stats.get('5xx', 0)
+
+
+def test_revalidation_round_trip_is_counted(tmp_path):
+    # 期限切れのプロフィールを 304 で再検証すると、キャッシュの本文を返しつつ通信は数える
+    server, base_url = start_server(latency=0.0)
+    cache, metrics = ResponseCache(str(tmp_path / 'cache.sqlite3'), ttls={'profile': 0.001}), RunMetrics()
+    try:
+        with requests.Session() as session:
+            session.mount('http://', CachingAdapter(cache))
+            session.hooks['response'].append(metrics.requests_hook())
+            url = base_url + 'tokyo/A1/shop1/girlid-1/'
+            first = session.get(url, timeout=10).content
+            time.sleep(0.01)
+            assert session.get(url, timeout=10).content == first
+    finally:
+        server.shutdown()
+        cache.close()
+    assert cache.stats.revalidated == 1
+    result = metrics.to_dict()
+    assert (result['requests'], result['status_counts']) == (2, {'200': 1, '304': 1})
+    assert result['latency']['profile']['count'] == 2
+    assert result['bytes_downloaded'] == len(first)
@@ -0,0 +1,46 @@
+import threading
+import time
+import types
+
+from scraper import pipeline
+from scraper.pipeline import thread_detail_stage
+
+
+def test_thread_stage_follows_the_worker_count():
+    # 30 行目で 3 本から 1 本に減らす。減らす前に取り出した行が終われば、以降は 1 本だけで処理する
+    wanted, lock = [3], threading.Lock()
+    active, peaks, threads = [0], {}, set()
+
+    def process_row(row):
+        with lock:
+            active[0] += 1
+            peaks[row] = active[0]
+            threads.add(threading.get_ident())
+            if row == 30: wanted[0] = 1
+        time.sleep(0.005)
+        with lock: active[0] -= 1
+        return row * 2
+
+    rows = iter(range(60))
+    results = []
+    thread_detail_stage(process_row, workers=lambda: wanted[0])(lambda: next(rows, None), lambda row, details: results.append((row, details)))
+    assert sorted(results) == [(row, row * 2) for row in range(60)]
+    assert max(peaks.values()) == 3 and len(threads) == 3
+    assert all(peaks[row] == 1 for row in range(36, 60))
+
+
+def test_thread_stage_with_a_fixed_count(monkeypatch):
+    started = []
+
+    class CountingThread(threading.Thread):
+        def start(self):
+            started.append(self)
+            super().start()
+
+    monkeypatch.setattr(pipeline, 'threading', types.SimpleNamespace(Thread=CountingThread, Condition=threading.Condition))
+    rows = iter(range(20))
+    results = []
+    thread_detail_stage(lambda row: time.sleep(0.001) or row, workers=4)(lambda: next(rows, None), lambda row, details: results.append(row))
+    assert sorted(results) == list(range(20))
+    # 行が尽きたあとに終わったスレッドの代わりを立てない
+    assert len(started) == 4
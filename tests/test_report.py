@@ -0,0 +1,69 @@
+import json
+import re
+import shutil
+import subprocess
+
+import pytest
+
+from run_benchmarks import report_rows
+from scraper.frame import build_result_frame
+from scraper.report import generate_html_report, minutes_of_day
+
+TIMES = [None, '18:00', '02:30', '9:00', '23:15', '05:00']
+
+
+def test_minutes_of_day():
+    assert [minutes_of_day(value) for value in TIMES] == [-1, 1080, 150, 540, 1395, 300]
+
+
+def run_report_js(html, selects, code):
+    """レポートの JS (ページ読み込み時の処理の前まで) に続けて code を node で実行し、出力した JSON を返す。"""
+    data = re.search(r'<script id="report-data" type="application/json">(.*?)</script>', html, re.S).group(1)
+    index = re.search(r'<script id="report-index" type="application/json">(.*?)</script>', html, re.S).group(1)
+    script = re.search(r'<script>\n(.*?)</script>', html, re.S).group(1)
+    script = script[:script.index('$(document).ready')]
+    js = f"""
+        const texts = {{'report-data': {json.dumps(data)}, 'report-index': {json.dumps(index)}}};
+        const document = {{getElementById: id => ({{textContent: texts[id]}})}};
+        const SELECTS = {json.dumps(selects)};
+        const $ = selector => ({{val: () => SELECTS[selector] || ''}});
+        {script}
+        {code}
+    """
+    return json.loads(subprocess.run(['node', '-e', js], check=True, capture_output=True, text=True).stdout)
+
+
+def passing_rows(html, selects):
+    """rowPassesFilters を通った行番号。"""
+    return run_report_js(html, selects, """
+        captureFilters();
+        const out = [];
+        for (let i = 0; i < ROWS.length; i++) if (rowPassesFilters(i)) out.push(i);
+        console.log(JSON.stringify(out));
+    """)
+
+
+@pytest.mark.skipif(not shutil.which('node'), reason='node がない')
+@pytest.mark.parametrize('selects, expected_times', [
+    ({}, TIMES),
+    # 次回出勤の無い行は、下限があって日付をまたがないときだけ除く
+    ({'#min-time': '09:00'}, ['18:00', '9:00', '23:15']),
+    ({'#max-time': '09:00'}, [None, '02:30', '9:00', '05:00']),
+    ({'#min-time': '09:00', '#max-time': '20:00'}, ['18:00', '9:00']),
+    ({'#min-time': '21:00', '#max-time': '05:00'}, [None, '02:30', '23:15', '05:00']),
+])
+def test_time_filter(selects, expected_times):
+    rows = report_rows(len(TIMES))
+    for row, value in zip(rows, TIMES):
+        row['次回出勤'] = value
+    html = generate_html_report(build_result_frame(rows), 'test')
+    assert [TIMES[i] for i in passing_rows(html, selects)] == expected_times
+
+
+@pytest.mark.skipif(not shutil.which('node'), reason='node がない')
+def test_hidden_link_column_is_not_searchable():
+    # 非表示のリンク列 (girlid やドメイン名) に検索語が当たって、見えるセルに無い行が出ないようにする
+    html = generate_html_report(build_result_frame(report_rows(3)), 'test')
+    columns = run_report_js(html, {}, "console.log(JSON.stringify(TABLE_COLUMNS.map(col => [col.title, col.visible, col.searchable])));")
+    assert ['プロフィールリンク', False, False] in columns
+    assert all(searchable for title, visible, searchable in columns if visible and title not in ('チェック', 'ギャラリー'))
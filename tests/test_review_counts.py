@@ -0,0 +1,56 @@
+import pytest
+
+from scraper import async_fetch
+from scraper.conditions import build_targets
+from scraper.core import ScrapeRun
+from scraper.review_counts import ReviewCountResolver
+from standin_server import review_count, start_server
+
+SHOP_PAGE = '<select><option value="reviews/?girlid=1">girl1 (3件)</option><option value="reviews/?girlid=2">girl2 (5件)</option></select>'
+
+
+def test_counters_count_each_lookup_once():
+    fetched = []
+    resolver = ReviewCountResolver(lambda url: fetched.append(url) or SHOP_PAGE)
+    for girl_id in (1, 2, 3):
+        resolver.register(f'https://example.com/tokyo/A1/shop/girlid-{girl_id}/')
+    counts = [resolver.count_for(f'https://example.com/tokyo/A1/shop/girlid-{girl_id}/') for girl_id in (1, 2, 3)]
+    assert counts == [3, 5, None]
+    assert fetched == ['https://example.com/tokyo/A1/shop/reviews/']
+    assert (resolver.shop_fetches, resolver.resolved, resolver.fallbacks) == (1, 2, 1)
+    assert resolver.requests_avoided() == 1
+
+
+def test_small_shops_are_not_resolved():
+    resolver = ReviewCountResolver(lambda url: SHOP_PAGE)
+    resolver.register('https://example.com/tokyo/A1/shop/girlid-1/')
+    assert resolver.count_for('https://example.com/tokyo/A1/shop/girlid-1/') is None
+    assert (resolver.shop_fetches, resolver.resolved, resolver.fallbacks) == (0, 0, 0)
+
+
+@pytest.fixture(scope='module')
+def standin():
+    server, base_url = start_server(latency=0.0, pages=1, per_page=40)
+    yield base_url
+    server.shutdown()
+
+
+@pytest.mark.parametrize('engine', ['thread', pytest.param('asyncio', marks=pytest.mark.skipif(not async_fetch.is_available(), reason='aiohttp がない'))])
+def test_scrape_run_resolves_each_person_once(standin, engine):
+    run = ScrapeRun(build_targets(['東京'], [()]), hide_inactive=False, fetch_engine=engine, base_url=standin, shop_review_counts=True)
+    rows = list(run.rows())
+    resolver = run.review_counts
+    # 代替サーバーは 20 店舗に 2 人ずつ (一覧 1 ページなので、詳細の取得前に全員が登録される)。口コミ 0 件の人は店舗一覧に出ないので個別に取得する
+    no_reviews = sum(1 for girl_id in range(40) if review_count(girl_id) == 0)
+    assert len(rows) == 40
+    assert (resolver.shop_fetches, resolver.resolved, resolver.fallbacks) == (20, 40 - no_reviews, no_reviews)
+    assert all(row['口コミ数'] == review_count(int(row['プロフィールリンク'].rsplit('girlid-', 1)[1].strip('/'))) for row in rows)
+
+
+def test_shop_review_counts_are_off_by_default(standin):
+    # 店舗の口コミ一覧のマークアップは実サイトで確かめていないので、既定では 1 人ずつ口コミページを読む
+    run = ScrapeRun(build_targets(['東京'], [()]), hide_inactive=False, base_url=standin)
+    rows = list(run.rows())
+    assert run.review_counts is None
+    assert len(rows) == 40
+    assert all(row['口コミ数'] == review_count(int(row['プロフィールリンク'].rsplit('girlid-', 1)[1].strip('/'))) for row in rows)
@@ -0,0 +1,106 @@
+import asyncio
+import hashlib
+
+import pytest
+import requests
+
+from scraper.http_client import SharedConnectionPool, SharedPoolAdapter
+from scraper.metrics import RunMetrics
+from scraper.parsing import PROFILE_SECTIONS
+from scraper.streaming import DRAIN_MAX_BYTES, read_body, read_body_async
+from standin_server import profile_page, start_server
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+PADDING = 2_000_000
+PAGE = profile_page(1, PADDING).encode('utf-8')
+# 解析に使う部分がページの先頭にある場合と、奥 (padding の 1500 件目の要素) にある場合
+DEEP_ID = hashlib.md5(b'1500').hexdigest()
+SECTIONS = {
+    'head': (PROFILE_SECTIONS.sections, b'girlprofile_diary'),
+    'deep': ((('div', 'data-review', DEEP_ID),), f'data-review="{DEEP_ID}"'.encode()),
+}
+
+
+def section_end(page, marker):
+    return page.index(b'</div>', page.index(marker)) + len(b'</div>')
+
+
+@pytest.fixture(params=[{'gzip': True}, {'chunked': True}, {'gzip': True, 'chunked': True}], ids=['gzip', 'chunked', 'gzip-chunked'])
+def server(request):
+    server, base_url = start_server(latency=0.0, padding=PADDING, **request.param)
+    yield request.param, base_url + 'tokyo/A1/shop1/girlid-1/'
+    server.shutdown()
+
+
+def check(options, body, metrics, marker):
+    assert PAGE.startswith(body) and len(body) >= section_end(PAGE, marker)
+    assert len(body) < len(PAGE) // 2
+    assert (metrics.bodies_streamed, metrics.early_stops) == (1, 1)
+    # 通信量は受け取ったところまで (圧縮されていれば圧縮後の大きさで数える)
+    assert metrics.bytes_downloaded < len(PAGE) // 2
+    if not options.get('chunked'):
+        # 残りは Content-Length と同じく圧縮後のバイト数。読み捨てずに閉じるほど残っている
+        assert metrics.bytes_unread > DRAIN_MAX_BYTES
+
+
+@pytest.mark.parametrize('where', SECTIONS)
+def test_read_body_stops_early(server, where):
+    options, url = server
+    sections, marker = SECTIONS[where]
+    metrics = RunMetrics()
+    with requests.Session() as session, session.get(url, stream=True, timeout=10) as res:
+        assert (res.headers.get('Content-Encoding') == 'gzip') == bool(options.get('gzip'))
+        content_length = int(res.headers.get('Content-Length', 0))
+        body = read_body(res, sections, metrics)
+    check(options, body, metrics, marker)
+    if content_length:
+        assert metrics.bytes_downloaded + metrics.bytes_unread == content_length
+
+
+def test_read_body_without_sections_reads_everything(server):
+    options, url = server
+    metrics = RunMetrics()
+    with requests.Session() as session, session.get(url, stream=True, timeout=10) as res:
+        content_length = int(res.headers.get('Content-Length', 0))
+        assert read_body(res, None, metrics) == PAGE
+    assert (metrics.bodies_streamed, metrics.early_stops, metrics.bytes_unread) == (1, 0, 0)
+    if content_length:
+        assert metrics.bytes_downloaded == content_length
+
+
+def test_read_body_drains_small_gzip_remainder():
+    # 圧縮後は DRAIN_MAX_BYTES より小さいので、途中でやめても残りを読み捨てて接続を使い回す
+    server, base_url = start_server(latency=0.0, padding=200_000, gzip=True)
+    shared, metrics = SharedConnectionPool(), RunMetrics()
+    try:
+        with requests.Session() as session:
+            session.mount('http://', SharedPoolAdapter(shared))
+            with session.get(base_url + 'tokyo/A1/shop1/girlid-1/', stream=True, timeout=10) as res:
+                content_length = int(res.headers['Content-Length'])
+                body = read_body(res, PROFILE_SECTIONS.sections, metrics)
+            assert content_length <= DRAIN_MAX_BYTES
+            assert (metrics.early_stops, metrics.bytes_downloaded, metrics.bytes_unread) == (1, content_length, 0)
+            assert b'girlprofile_diary' in body
+            assert session.get(base_url + 'tokyo/A1/shop1/girlid-2/', timeout=10).status_code == 200
+        stats = shared.stats.snapshot()
+        assert (stats['new_connections'], stats['reused_connections']) == (1, 1)
+    finally:
+        server.shutdown()
+
+
+@pytest.mark.skipif(aiohttp is None, reason='aiohttp が無い')
+@pytest.mark.parametrize('where', SECTIONS)
+def test_read_body_async_stops_early(server, where):
+    options, url = server
+    sections, marker = SECTIONS[where]
+    metrics = RunMetrics()
+
+    async def fetch():
+        async with aiohttp.ClientSession() as session, session.get(url) as res:
+            return await read_body_async(res, sections, metrics)
+
+    check(options, asyncio.run(fetch()), metrics, marker)